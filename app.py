@@ -1,52 +1,143 @@
 """
 Flask API server for the ML-Based Symptom Pattern Classification System.
-Serves API endpoints (predict, diseases, stats, bias, ndcg) and frontend.
+Serves API endpoints (predict, batch predict, diseases, stats, bias, ndcg,
+Prometheus metrics, admin reload) and frontend.
 """
 
+import hmac
 import os
-from flask import Flask, request, jsonify, send_from_directory
+import time
+
+_boot_started = time.perf_counter()
+
+from flask import Flask, Response, abort, g, request, jsonify
 from flask_cors import CORS
-from model import SymptomClassifier
+from model import (SymptomClassifier, COMPILED_BATCH_MAX_ROWS, ENSEMBLE_PROFILES, PREPROCESSING_BACKEND,
+                   NLTK_OFFLINE)
 from dataset import get_disease_info
+from batching import MicroBatcher
+from metrics import PROMETHEUS_CONTENT_TYPE, CounterVec, HistogramVec, sample_lines
+from responses import ResponseCache
+from static_assets import AssetPipeline
 
-app = Flask(__name__, static_folder=".", static_url_path="")
+# No Flask static folder: it would expose the whole working directory. The frontend
+# is served from the allow-listed, pre-compressed AssetPipeline instead.
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
+# "background": answer from the similarity engine while the ensemble trains (only
+# matters when no trained artifacts exist yet); "blocking": train before serving.
+COLD_START_MODE = os.environ.get("COLD_START_MODE", "blocking")
+
 print("Initializing symptom classifier...")
-classifier = SymptomClassifier()
+classifier = SymptomClassifier(background_training=COLD_START_MODE == "background")
 disease_info = get_disease_info()
-print("Classifier ready!")
+STARTUP_SECONDS = round(time.perf_counter() - _boot_started, 3)
+print(f"Classifier ready in {STARTUP_SECONDS:.2f}s "
+      f"(engine: {classifier.engine}, model version: {classifier.version}, "
+      f"training fingerprint: {classifier.active.freshness['status'] if classifier.active else 'n/a'}, "
+      f"preprocessing backend: {PREPROCESSING_BACKEND})")
 
+# Optional micro-batching of concurrent /api/predict calls (disabled when the window is 0)
+BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 0))
+batcher = (
+    MicroBatcher(classifier, window_ms=BATCH_WINDOW_MS,
+                 max_batch_size=int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 32)))
+    if BATCH_WINDOW_MS > 0 else None
+)
 
-# ─── API Routes ──────────────────────────────────────────────────────────────
 
-@app.route("/api/predict", methods=["POST"])
-def predict():
-    """Accept symptom text + optional EHR fields, return ranked disease predictions."""
-    data = request.get_json()
-    if not data or "symptoms" not in data:
-        return jsonify({"error": "Please provide 'symptoms' in the request body."}), 400
+DISCLAIMER = ("This is an AI-based screening tool for informational purposes only. "
+              "It is NOT a substitute for professional medical advice, diagnosis, or treatment.")
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+# Per-request modes, unrelated to the training profile (ENSEMBLE_PROFILE): "fast" answers
+# from the distilled linear model, "accurate" from the calibrated ensemble the active
+# version was trained with (model_info.type in /api/stats)
+PREDICT_MODES = ("fast", "accurate")
+
+
+# ─── Request metrics (exported by /api/metrics) ─────────────────────────────
+
+REQUEST_SECONDS = HistogramVec(
+    "symptom_http_request_seconds", "Request handling time per route, from before_request to after_request.",
+    ("route", "method"), (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+API_STAGE_SECONDS = HistogramVec(
+    "symptom_api_stage_seconds", "Time /api/predict spends enriching predictions and serializing the response.",
+    ("stage",), (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+INPUT_CHARS = HistogramVec(
+    "symptom_input_chars", "Length of the submitted symptom text in characters.",
+    ("route",), (16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+TOP_K_REQUESTS = CounterVec("symptom_top_k_requests_total", "Prediction records by requested top_k.", ("top_k",))
+ERRORS = CounterVec("symptom_http_errors_total", "Responses with a 4xx or 5xx status.", ("route", "status"))
+TOP_K_LABEL_MAX = 10   # larger top_k values share one "gt10" label to keep cardinality bounded
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(route, request.method).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            ERRORS.inc(route, str(response.status_code))
+    return response
+
+
+def observe_record(route, record):
+    INPUT_CHARS.labels(route).observe(len(record["symptoms"]))
+    k = record["top_k"]
+    TOP_K_REQUESTS.inc(str(k) if k <= TOP_K_LABEL_MAX else f"gt{TOP_K_LABEL_MAX}")
+
+
+# Bearer token for /api/admin/*; without one the admin routes only answer loopback clients
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+def parse_record(data):
+    """Validate one symptom record. Returns (record, None) or (None, error message)."""
+    if not isinstance(data, dict) or not isinstance(data.get("symptoms"), str):
+        return None, "Please provide 'symptoms' in the request body."
 
     symptoms = data["symptoms"].strip()
     if len(symptoms) < 3:
-        return jsonify({"error": "Please provide a more detailed symptom description."}), 400
+        return None, "Please provide a more detailed symptom description."
 
     # EHR demographic fields (optional)
     age = data.get("age")
-    sex = data.get("sex")
-    medical_history = data.get("medical_history")
-    top_k = data.get("top_k", 5)
-
     if age:
         try:
             age = int(age)
         except (ValueError, TypeError):
             age = None
 
-    predictions = classifier.predict(
-        symptoms, top_k=top_k, age=age, sex=sex, medical_history=medical_history
-    )
+    top_k = data.get("top_k", 5)
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        return None, "'top_k' must be a positive integer."
 
+    mode = data.get("mode", "accurate")
+    if mode not in PREDICT_MODES:
+        return None, "'mode' must be 'fast' or 'accurate'."
+
+    return {
+        "symptoms": symptoms,
+        "age": age,
+        "sex": data.get("sex"),
+        "medical_history": data.get("medical_history"),
+        "top_k": top_k,
+        "mode": mode,
+    }, None
+
+
+def enrich_predictions(predictions):
+    """Attach disease_info metadata to raw classifier predictions."""
     enriched = []
     for pred in predictions:
         info = disease_info.get(pred["disease"], {})
@@ -58,24 +149,96 @@ def predict():
             "severity": info.get("severity", "Unknown"),
             "seek_care": info.get("seek_care", ""),
         })
+    return enriched
+
 
+def ehr_context_of(record):
     ehr_context = {}
-    if age: ehr_context["age"] = age
-    if sex: ehr_context["sex"] = sex
-    if medical_history: ehr_context["medical_history"] = medical_history
+    if record["age"]: ehr_context["age"] = record["age"]
+    if record["sex"]: ehr_context["sex"] = record["sex"]
+    if record["medical_history"]: ehr_context["medical_history"] = record["medical_history"]
+    return ehr_context if ehr_context else None
 
-    return jsonify({
+
+# ─── API Routes ──────────────────────────────────────────────────────────────
+
+@app.route("/api/predict", methods=["POST"])
+def predict():
+    """Accept symptom text + optional EHR fields, return ranked disease predictions."""
+    record, error = parse_record(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    observe_record("/api/predict", record)
+
+    predictions, mode = (batcher or classifier).predict(
+        record["symptoms"], top_k=record["top_k"], age=record["age"], sex=record["sex"],
+        medical_history=record["medical_history"], mode=record["mode"], with_mode=True,
+    )
+
+    t0 = time.perf_counter()
+    enriched = enrich_predictions(predictions)
+    t1 = time.perf_counter()
+    response = jsonify({
         "predictions": enriched,
-        "input_symptoms": symptoms,
-        "ehr_context": ehr_context if ehr_context else None,
-        "disclaimer": "This is an AI-based screening tool for informational purposes only. "
-                      "It is NOT a substitute for professional medical advice, diagnosis, or treatment.",
+        "input_symptoms": record["symptoms"],
+        "ehr_context": ehr_context_of(record),
+        "engine": "similarity" if mode is None else "ensemble",
+        "mode": mode,
+        "disclaimer": DISCLAIMER,
     })
+    t2 = time.perf_counter()
+    API_STAGE_SECONDS.labels("enrich").observe(t1 - t0)
+    API_STAGE_SECONDS.labels("serialize").observe(t2 - t1)
+    return response
 
 
-@app.route("/api/diseases", methods=["GET"])
-def get_diseases():
-    """Return list of all diseases the model can classify."""
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    """Accept a list of symptom records, return ranked predictions per record in input order.
+    Invalid records are reported individually and never fail the whole batch."""
+    data = request.get_json()
+    records = data.get("records") if isinstance(data, dict) else None
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "Please provide a non-empty 'records' list in the request body."}), 400
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"A batch may contain at most {MAX_BATCH_SIZE} records."}), 400
+
+    parsed, results = [], [None] * len(records)
+    for i, item in enumerate(records):
+        record, error = parse_record(item)
+        if error:
+            results[i] = {"index": i, "error": error}
+        else:
+            parsed.append((i, record))
+            observe_record("/api/predict/batch", record)
+
+    engine = classifier.engine
+    outcomes = classifier.predict_batch([record for _, record in parsed], top_k=5)
+    for (i, record), outcome in zip(parsed, outcomes):
+        if "error" in outcome:
+            results[i] = {"index": i, "error": outcome["error"]}
+        else:
+            results[i] = {
+                "index": i,
+                "predictions": enrich_predictions(outcome["predictions"]),
+                "input_symptoms": record["symptoms"],
+                "ehr_context": ehr_context_of(record),
+                "mode": outcome["mode"],
+            }
+
+    return jsonify({
+        "results": results,
+        "total": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "engine": engine,
+        "disclaimer": DISCLAIMER,
+    })
+
+
+# ─── Model-dependent endpoints (pre-rendered once per model generation) ─────
+
+def diseases_payload():
+    """List of all diseases the model can classify, grouped by category."""
     diseases = classifier.get_all_diseases()
     categorized = {}
     for d in diseases:
@@ -84,14 +247,16 @@ def get_diseases():
         if cat not in categorized:
             categorized[cat] = []
         categorized[cat].append({"name": d, "severity": info.get("severity", "Unknown")})
-    return jsonify({"total": len(diseases), "categories": categorized})
+    return {"total": len(diseases), "categories": categorized}
 
 
-@app.route("/api/stats", methods=["GET"])
-def get_stats():
-    """Return model performance statistics."""
+def stats_payload():
+    """Model performance statistics (runtime counters are added by live_stats)."""
     metrics = classifier.get_metrics()
-    return jsonify({
+    version_info = classifier.version_info()
+    version_info.pop("published")   # both change while a version is live: see live_stats
+    version_info.pop("stale_retrain")
+    return {
         "paper_results": {
             "ml_system": {"m1_accuracy": 91.7, "f1_score": 0.87, "ndcg": 0.93},
             "human_physicians": {"m1_accuracy": 88.2, "f1_score": 0.89, "ndcg": 0.82},
@@ -103,35 +268,72 @@ def get_stats():
             "precision": metrics.get("precision", 0),
             "recall": metrics.get("recall", 0),
             "ndcg": metrics.get("ndcg", 0),
+            "top5_accuracy": metrics.get("top5_accuracy", 0),
+            "mrr": metrics.get("mrr", 0),
             "train_size": metrics.get("train_size", 0),
             "test_size": metrics.get("test_size", 0),
         },
         "model_info": {
-            "type": "Calibrated Ensemble (RF + SVM + GB)",
+            "type": ENSEMBLE_PROFILES.get(metrics.get("ensemble_profile", "full")),
+            "profile": metrics.get("ensemble_profile", "full"),
+            "engine": classifier.engine,
+            "inference": classifier.inference,
+            "compiled_parity_max_abs_diff": classifier.compiled_parity,
+            "compiled_batch_max_rows": COMPILED_BATCH_MAX_ROWS if classifier.inference == "compiled" else None,
+            "version": classifier.version,
             "calibration": "Sigmoid (Platt Scaling)",
             "preprocessing": "TF-IDF with NLP + EHR Context",
             "diseases_covered": len(classifier.get_all_diseases()),
         },
-    })
+        "model_version": version_info,
+        "cross_validation": metrics.get("cross_validation"),
+        "distilled_model": metrics.get("distillation"),
+        "training_profile": metrics.get("training_profile"),
+        "startup": {
+            "import_to_ready_seconds": STARTUP_SECONDS,
+            "preprocessing_backend": PREPROCESSING_BACKEND,
+            "trained_with_backend": metrics.get("preprocessing_backend"),
+            "nltk_offline": NLTK_OFFLINE,
+        },
+    }
 
 
-@app.route("/api/bias", methods=["GET"])
-def get_bias():
-    """Return per-category bias analysis from training evaluation."""
+def live_stats():
+    version_info = classifier.version_info()
+    return {
+        "published_version": version_info["published"],
+        "stale_retrain": version_info["stale_retrain"],
+        "batching": batcher.stats() if batcher else None,
+        "prediction_cache": classifier.get_cache_stats(),
+        "precomputed_responses": {"renders": precomputed.renders},
+    }
+
+
+def bias_payload():
+    """Per-category bias analysis from training evaluation."""
     bias_report = classifier.get_bias_report()
-    return jsonify({
+    payload = {
         "bias_report": bias_report,
         "description": "Accuracy breakdown by disease category on held-out test set. "
                        "Categories with lower accuracy may indicate demographic or data bias.",
         "total_categories": len(bias_report),
-    })
+    }
+    cross_validation = classifier.get_metrics().get("cross_validation")
+    if cross_validation:
+        payload["cross_validated"] = {
+            "bias_report": cross_validation["bias_report"],
+            "description": f"Per-category accuracy over {cross_validation['folds']}-fold x "
+                           f"{cross_validation['repeats']} stratified cross-validation: fold mean and std, "
+                           f"pooled out-of-fold value and its {cross_validation['confidence']:.0%} "
+                           f"bootstrap confidence interval.",
+        }
+    return payload
 
 
-@app.route("/api/ndcg", methods=["GET"])
-def get_ndcg():
-    """Return NDCG evaluation metrics."""
+def ndcg_payload():
+    """NDCG evaluation metrics."""
     metrics = classifier.get_metrics()
-    return jsonify({
+    return {
         "ndcg_score": metrics.get("ndcg", 0),
         "description": "Normalized Discounted Cumulative Gain measures the quality of "
                        "ranked differential diagnoses. A score of 1.0 means perfect ranking.",
@@ -148,18 +350,116 @@ def get_ndcg():
             "0.5-0.7": "Fair — some ranking errors",
             "below_0.5": "Poor — unreliable rankings",
         },
-    })
+    }
+
+
+def model_generation():
+    """Changes whenever anything the pre-rendered payloads depend on does: a swapped-in
+    model version (hot reload or the switch from the similarity engine) or a reload outcome."""
+    return classifier.active, classifier.engine, classifier.reloads, classifier.last_reload_error
+
+
+precomputed = ResponseCache(lambda payload: app.json.response(payload).get_data(), model_generation)
+precomputed.register("diseases", diseases_payload)
+precomputed.register("stats", stats_payload)
+precomputed.register("bias", bias_payload)
+precomputed.register("ndcg", ndcg_payload)
+precomputed.get("stats")    # render now rather than on the first dashboard poll
+
+
+@app.route("/api/diseases", methods=["GET"])
+def get_diseases():
+    """Return list of all diseases the model can classify."""
+    return precomputed.get("diseases").serve(request)
+
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """Return model performance statistics with the runtime counters of live_stats
+    (prediction cache, micro-batching, the manifest's published version) merged into
+    the pre-rendered body. ?live=0 leaves the counters out and serves that body as
+    is, with its ETag, for dashboards that poll and revalidate."""
+    rendered = precomputed.get("stats")
+    if request.args.get("live", "").lower() in ("0", "false", "no"):
+        return rendered.serve(request)
+    body = rendered.merged(app.json.dumps(live_stats()).encode())
+    return Response(body, content_type="application/json", headers={"Cache-Control": "no-store"})
+
+
+@app.route("/api/bias", methods=["GET"])
+def get_bias():
+    """Return per-category bias analysis from training evaluation."""
+    return precomputed.get("bias").serve(request)
+
+
+@app.route("/api/ndcg", methods=["GET"])
+def get_ndcg():
+    """Return NDCG evaluation metrics."""
+    return precomputed.get("ndcg").serve(request)
+
+
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text exposition of request, predict-stage, cache and batching metrics."""
+    info = classifier.version_info()
+    cache = classifier.get_cache_stats()
+    lines = sample_lines("symptom_model_info", "The model currently serving predictions.", "gauge", [
+        ({"engine": classifier.engine, "version": info["active"] or "", "inference": classifier.inference or ""}, 1),
+    ])
+    lines += sample_lines("symptom_model_reloads_total", "Successful hot reloads of a new model version.",
+                          "counter", [({}, info["reloads"])])
+    if info["fingerprint"] is not None:
+        lines += sample_lines("symptom_model_stale", "1 when the serving version's training fingerprint is stale.",
+                              "gauge", [({}, int(info["fingerprint"]["status"] == "stale"))])
+    for family in (REQUEST_SECONDS, API_STAGE_SECONDS, classifier.stage_seconds, INPUT_CHARS, TOP_K_REQUESTS, ERRORS):
+        lines += family.exposition()
+    for counter in ("hits", "misses", "evictions", "expirations"):
+        lines += sample_lines(f"symptom_prediction_cache_{counter}_total", f"Prediction cache {counter}.",
+                              "counter", [({}, cache[counter])])
+    if batcher:
+        lines += ["# HELP symptom_batch_queue_wait_seconds Time /api/predict calls wait for their micro-batch.",
+                  "# TYPE symptom_batch_queue_wait_seconds histogram"]
+        lines += batcher.queue_wait_ms.exposition("symptom_batch_queue_wait_seconds", scale=0.001)
+        lines += ["# HELP symptom_batch_size Records per micro-batch.", "# TYPE symptom_batch_size histogram"]
+        lines += batcher.batch_size.exposition("symptom_batch_size")
+    return Response("\n".join(lines) + "\n", content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def admin_authorized():
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {ADMIN_TOKEN}")
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+
+@app.route("/api/admin/reload", methods=["POST"])
+def reload_model():
+    """Hot-reload the artifact version published in the manifest into this worker.
+    Other gunicorn workers pick it up through their manifest watcher."""
+    if not admin_authorized():
+        return jsonify({"error": "Not authorized."}), 403
+    wait = request.args.get("wait", "").lower() in ("1", "true", "yes")
+    status = classifier.reload(wait=wait)
+    code = {"started": 202, "busy": 409, "failed": 500}.get(status, 200)
+    return jsonify({"status": status, "model_version": classifier.version_info()}), code
 
 
 # ─── Frontend Routes ────────────────────────────────────────────────────────
 
+assets = AssetPipeline()
+print(f"Static assets ready: {assets.summary()}")
+
+
 @app.route("/")
 def serve_index():
-    return send_from_directory(".", "index.html")
+    return assets.serve("index.html", request)
+
 
 @app.route("/<path:path>")
 def serve_static(path):
-    return send_from_directory(".", path)
+    response = assets.serve(path, request)
+    if response is None:
+        abort(404)
+    return response
 
 
 if __name__ == "__main__":
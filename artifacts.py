@@ -0,0 +1,106 @@
+"""
+Versioned model artifacts.
+
+Every training run writes its artifact set into a directory of its own,
+ARTIFACT_DIR/<version>/, and then publishes it by atomically rewriting
+ARTIFACT_DIR/manifest.json, which names the active version and keeps a short
+history. Servers load whatever the manifest points at, so a half-written
+version is never visible, and rolling back is a manifest edit. Artifacts from
+before versioning (trained_model.joblib etc. next to model.py) keep loading as
+version "legacy" until the first versioned run.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.environ.get("MODEL_ARTIFACT_DIR", os.path.join(PACKAGE_DIR, "artifacts"))
+MANIFEST_PATH = os.path.join(ARTIFACT_DIR, "manifest.json")
+# Published versions kept on disk (the active one is never pruned)
+KEEP_VERSIONS = max(1, int(os.environ.get("MODEL_KEEP_VERSIONS", 5)))
+LEGACY_VERSION = "legacy"
+
+ARTIFACT_FILES = {
+    "model": "model.joblib",
+    "vectorizer": "vectorizer.joblib",
+    "metrics": "metrics.joblib",
+    "distilled": "distilled_model.joblib",
+    "compiled": "compiled_model.joblib",
+}
+LEGACY_FILES = {
+    "model": "trained_model.joblib",
+    "vectorizer": "tfidf_vectorizer.joblib",
+    "metrics": "training_metrics.joblib",
+    "distilled": "distilled_model.joblib",
+    "compiled": "compiled_model.joblib",
+}
+
+
+def new_version():
+    """A fresh, lexicographically time-ordered version id (UTC)."""
+    return datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+
+
+def version_dir(version):
+    if version == LEGACY_VERSION:
+        return PACKAGE_DIR
+    return os.path.join(ARTIFACT_DIR, version)
+
+
+def artifact_paths(version):
+    """name -> file path for every artifact of a version."""
+    files = LEGACY_FILES if version == LEGACY_VERSION else ARTIFACT_FILES
+    return {name: os.path.join(version_dir(version), filename) for name, filename in files.items()}
+
+
+def read_manifest():
+    """The parsed manifest, or None when there is none (or it cannot be read)."""
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_mtime():
+    try:
+        return os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return None
+
+
+def active_version():
+    """The version servers should load: the manifest's, else "legacy" if the
+    pre-versioning files exist, else None (nothing trained yet)."""
+    manifest = read_manifest()
+    if manifest and manifest.get("active"):
+        return manifest["active"]
+    legacy = artifact_paths(LEGACY_VERSION)
+    if os.path.exists(legacy["model"]) and os.path.exists(legacy["vectorizer"]):
+        return LEGACY_VERSION
+    return None
+
+
+def publish(version, summary=None):
+    """Make ``version`` (already fully written) the active one, then prune old versions."""
+    manifest = read_manifest() or {}
+    history = [entry for entry in manifest.get("versions", []) if entry["version"] != version]
+    history.append({
+        "version": version,
+        "published_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **(summary or {}),
+    })
+    kept, pruned = history[-KEEP_VERSIONS:], history[:-KEEP_VERSIONS]
+    manifest = {"active": version, "versions": kept}
+
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+    # Workers still serving a pruned version keep its mmapped files alive until they swap
+    for entry in pruned:
+        shutil.rmtree(version_dir(entry["version"]), ignore_errors=True)
+    return manifest
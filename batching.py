@@ -0,0 +1,94 @@
+"""
+Request micro-batching in front of SymptomClassifier.
+
+Concurrent single-record predict calls are queued for a short window (or until
+a maximum batch size is reached) and scored together through one
+predict_batch / predict_proba call. Each caller blocks on its own future and
+receives exactly what SymptomClassifier.predict would have returned.
+
+Coalescing only helps when one process serves requests concurrently, e.g.
+gunicorn with the gthread worker (``--threads N``) or the Flask dev server.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import Histogram
+
+QUEUE_WAIT_BUCKETS_MS = (0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 25, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Coalesces concurrent classifier.predict calls into batched predict_proba calls."""
+
+    def __init__(self, classifier, window_ms=3.0, max_batch_size=32):
+        self.classifier = classifier
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self._start()
+        # Threads do not survive fork (gunicorn preload_app): restart in every worker
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def predict(self, symptom_text: str, top_k: int = 5, age=None, sex=None, medical_history=None,
+                mode: str = "accurate", with_mode=False):
+        """Drop-in replacement for SymptomClassifier.predict that rides a shared batch."""
+        record = {"symptoms": symptom_text, "top_k": top_k, "age": age, "sex": sex,
+                  "medical_history": medical_history, "mode": mode}
+        future = Future()
+        self._queue.put((time.perf_counter(), record, future))
+        predictions, mode_used = future.result()
+        return (predictions, mode_used) if with_mode else predictions
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        deadline = batch[0][0] + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            dispatched = time.perf_counter()
+            for enqueued, _, _ in batch:
+                self.queue_wait_ms.observe((dispatched - enqueued) * 1000.0)
+            self.batch_size.observe(len(batch))
+
+            try:
+                outcomes = self.classifier.predict_batch([record for _, record, _ in batch])
+            except Exception as exc:
+                for _, _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            for (_, _, future), outcome in zip(batch, outcomes):
+                if "error" in outcome:
+                    future.set_exception(RuntimeError(outcome["error"]))
+                else:
+                    future.set_result((outcome["predictions"], outcome["mode"]))
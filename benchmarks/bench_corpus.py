@@ -0,0 +1,198 @@
+"""
+Benchmark: streaming corpus loading vs the in-memory path, as the corpus grows.
+
+Writes synthetic corpora of growing size (vignettes from dataset.py recombined
+within each disease plus filler words from a large pseudo-vocabulary, with a
+small share of unknown labels and empty notes) as CSV, JSONL and, when
+pyarrow is installed, Parquet. Each corpus is prepared in a fresh child
+process, so the peak RSS (Linux VmHWM, reset after imports) belongs to one run:
+
+  in-memory  read every record into lists, preprocess the list,
+             TfidfVectorizer.fit_transform (the previous train_model path)
+  streamed   dataset.open_source() + corpus.prepare(): chunked, n-gram counts,
+             preprocessed rows spilled to disk
+
+It reports records/sec and peak RSS above the RSS after imports. Also
+checks that the streamed vectorizer (vocabulary_, idf_) equals
+TfidfVectorizer.fit on the built-in vignettes and on the smallest corpus, and
+that the streamed matrix equals vectorizer.transform(); exits non-zero
+otherwise.
+
+    python benchmarks/bench_corpus.py [--sizes 10000 40000 160000] [--formats csv jsonl parquet]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+UNKNOWN_LABEL_RATE = 0.005
+EMPTY_RATE = 0.002
+FILLER_WORDS = 5
+FILLER_VOCABULARY = 50_000
+
+
+def vectorizer():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True)
+
+
+def synthetic_records(n, seed=42):
+    from dataset import get_training_data
+
+    rng = random.Random(seed)
+    texts, labels = get_training_data()
+    by_disease = {}
+    for text, label in zip(texts, labels):
+        by_disease.setdefault(label, []).append(text)
+    diseases = sorted(by_disease)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    filler = ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(FILLER_VOCABULARY)]
+    for _ in range(n):
+        disease = rng.choice(diseases)
+        words = " ".join(rng.choice(by_disease[disease]) for _ in range(2)).split()
+        rng.shuffle(words)
+        words += rng.sample(filler, FILLER_WORDS)
+        roll = rng.random()
+        if roll < UNKNOWN_LABEL_RATE:
+            disease = "Unlisted Condition"
+        elif roll < UNKNOWN_LABEL_RATE + EMPTY_RATE:
+            words = []
+        yield " ".join(words), disease
+
+
+def write_corpus(path, fmt, n):
+    if fmt == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["symptoms", "disease"])
+            writer.writerows(synthetic_records(n))
+    elif fmt == "jsonl":
+        with open(path, "w", encoding="utf-8") as f:
+            for text, label in synthetic_records(n):
+                f.write(json.dumps({"symptoms": text, "disease": label}) + "\n")
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        texts, labels = zip(*synthetic_records(n))
+        pq.write_table(pa.table({"symptoms": list(texts), "disease": list(labels)}), path, row_group_size=10_000)
+
+
+def current_rss_bytes():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def child(method, path):
+    """Runs in a subprocess: prepare one corpus, print records/sec and peak RSS as JSON."""
+    import numpy as np
+    import corpus
+    from dataset import open_source
+    from model import preprocess_text
+    from profiling import _reset_peak_rss, peak_rss_bytes
+
+    _reset_peak_rss()
+    baseline = current_rss_bytes()
+    start = time.perf_counter()
+    source = open_source(path)
+    if method == "streamed":
+        X, y, stats = corpus.prepare(source, vectorizer(), preprocess_text)
+    else:
+        texts, labels = [], []
+        for chunk_texts, chunk_labels in source.chunks():
+            texts.extend(chunk_texts)
+            labels.extend(chunk_labels)
+        texts = [preprocess_text(t) for t in texts]
+        X = vectorizer().fit_transform(texts)
+        y = np.array(labels)
+    seconds = time.perf_counter() - start
+    print("RESULT " + json.dumps({
+        "records": int(X.shape[0]), "seconds": seconds, "records_per_second": X.shape[0] / seconds,
+        "peak_mb": peak_rss_bytes() / 2**20, "baseline_mb": baseline / 2**20,
+        "matrix_mb": (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 2**20,
+    }))
+
+
+def run_child(method, path):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", method, path],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    line = next(line for line in proc.stdout.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def check_parity(path):
+    """Streamed fit vs TfidfVectorizer.fit on the built-in vignettes and on path."""
+    import corpus
+    from dataset import BuiltinSource, open_source
+    from model import preprocess_text
+
+    failures = []
+    for source in (BuiltinSource(chunk_rows=50), open_source(path, chunk_rows=1000)):
+        streamed = vectorizer()
+        X, _, _ = corpus.prepare(source, streamed, preprocess_text)
+        texts = [preprocess_text(t) for chunk, _ in source.chunks() for t in chunk]
+        reference = vectorizer().fit(texts)
+        expected = reference.transform(texts)
+        ok = (streamed.vocabulary_ == reference.vocabulary_
+              and streamed.idf_.tobytes() == reference.idf_.tobytes()
+              and all(getattr(X, a).tobytes() == getattr(expected, a).tobytes()
+                      for a in ("data", "indices", "indptr")))
+        print(f"parity on {source.name}: {'ok' if ok else 'MISMATCH'} "
+              f"({len(reference.vocabulary_)} features, {X.shape[0]} rows)")
+        if not ok:
+            failures.append(source.name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 40_000, 160_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "jsonl", "parquet"])
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    formats = list(args.formats)
+    if "parquet" in formats:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow not installed: skipping Parquet\n")
+            formats.remove("parquet")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'records':>9}{'format':>8}{'file MB':>9}{'method':>11}{'rec/s':>9}"
+              f"{'peak MB':>9}{'above base':>12}{'X MB':>7}")
+        smallest = None
+        for n in sorted(args.sizes):
+            for fmt in formats:
+                path = os.path.join(tmp, f"corpus-{n}.{fmt}")
+                write_corpus(path, fmt, n)
+                smallest = smallest or path
+                size_mb = os.path.getsize(path) / 2**20
+                for method in ("in-memory", "streamed"):
+                    r = run_child(method, path)
+                    print(f"{n:>9,}{fmt:>8}{size_mb:>9.1f}{method:>11}{r['records_per_second']:>9,.0f}"
+                          f"{r['peak_mb']:>9.0f}{r['peak_mb'] - r['baseline_mb']:>12.0f}{r['matrix_mb']:>7.1f}")
+        print()
+        failures = check_parity(smallest)
+
+    if failures:
+        print(f"\nFAIL: streamed vectorizer differs from TfidfVectorizer.fit on {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: cross-validated evaluation (evaluation.cross_validate) vs core count.
+
+Prepares the built-in vignettes the way train_model does (corpus.load through
+the feature cache), then runs repeated stratified k-fold of the production
+ensemble with n_jobs = 1, 2, 4, ... up to --jobs and reports the fit wall
+time, the serial sum of the worker fits and the speedup over n_jobs=1,
+followed by the cross-validated metrics with their bootstrap intervals.
+
+Checks that every n_jobs gives the same summary and that the weighted
+scoring of folds and of the pooled out-of-fold predictions equals
+sklearn.metrics / ranking.ranking_metrics on the same predictions; exits
+non-zero otherwise.
+
+    python benchmarks/bench_cv.py [--folds 5] [--repeats 1] [--jobs 4]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score  # noqa: E402
+
+from corpus import load as load_corpus  # noqa: E402
+from dataset import get_disease_info, open_source  # noqa: E402
+from evaluation import METRICS, cross_validate  # noqa: E402
+from feature_cache import FeatureCache  # noqa: E402
+from model import build_ensemble, build_vectorizer, preprocess_text, preprocessing_fingerprint  # noqa: E402
+from ranking import ranking_metrics  # noqa: E402
+
+TOLERANCE = 1e-12
+
+
+def reference_scores(y_true, y_pred, proba, classes):
+    ranking = ranking_metrics(y_true, proba, classes, k=5)
+    return {
+        "m1_accuracy": accuracy_score(y_true, y_pred),
+        "f1_score": f1_score(y_true, y_pred, average="weighted"),
+        "precision": precision_score(y_true, y_pred, average="weighted", zero_division=0),
+        "recall": recall_score(y_true, y_pred, average="weighted", zero_division=0),
+        "ndcg": ranking["ndcg"],
+        "top5_accuracy": ranking["top_k_accuracy"],
+        "mrr": ranking["mrr"],
+    }
+
+
+def check_scoring(predictions):
+    """Weighted scores of each fold and of the pooled predictions vs sklearn.metrics."""
+    y, probas = predictions.y, predictions.probas
+    fold_scores, _, _ = predictions.score(predictions.fold_weights())
+    pooled, _, _ = predictions.score(np.ones((1, len(predictions.rows))))
+    worst = 0.0
+    for i, ((test, predicted, _), proba) in enumerate(zip(predictions.parts, probas)):
+        expected = reference_scores(y[test], predictions.classes[predicted], proba, predictions.classes)
+        worst = max(worst, max(abs(fold_scores[m][i] - expected[m]) for m in METRICS))
+    rows = predictions.rows
+    predicted = np.concatenate([p for _, p, _ in predictions.parts])
+    expected = reference_scores(y[rows], predictions.classes[predicted], np.vstack(probas), predictions.classes)
+    return max(worst, max(abs(pooled[m][0] - expected[m]) for m in METRICS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bootstrap", type=int, default=2000)
+    args = parser.parse_args()
+
+    X, y, _, _ = load_corpus(open_source(), build_vectorizer(), preprocess_text, preprocessing_fingerprint(),
+                             cache=FeatureCache())
+    categories = {disease: info["category"] for disease, info in get_disease_info().items()}
+    levels = sorted({1, args.jobs} | {2 ** i for i in range(1, 8) if 2 ** i < args.jobs})
+
+    print(f"{X.shape[0]} vignettes, {len(set(y))} diseases, {os.cpu_count()} CPU(s)\n")
+    print(f"{'n_jobs':>6}{'fits':>6}{'wall s':>9}{'serial s':>10}{'in-pool':>9}{'vs 1 job':>10}")
+    failed, reference, base_wall = False, None, None
+    for n_jobs in levels:
+        summary, predictions = cross_validate(build_ensemble(), X, y, categories, folds=args.folds,
+                                              repeats=args.repeats, n_jobs=n_jobs,
+                                              bootstrap_samples=args.bootstrap, keep_proba=True)
+        base_wall = base_wall or summary["fit_wall_seconds"]
+        print(f"{n_jobs:>6}{summary['fits']:>6}{summary['fit_wall_seconds']:>9.1f}"
+              f"{summary['fit_serial_seconds']:>10.1f}{summary['speedup']:>8.2f}x"
+              f"{base_wall / summary['fit_wall_seconds']:>9.2f}x")
+        comparable = {k: summary[k] for k in ("metrics", "bias_report")}
+        if reference is None:
+            reference, first = comparable, (summary, predictions)
+        elif comparable != reference:
+            print(f"  MISMATCH: n_jobs={n_jobs} changed the cross-validated results")
+            failed = True
+
+    summary, predictions = first
+    print(f"\n{summary['folds']}-fold x {summary['repeats']} (requested {args.folds}), "
+          f"{summary['bootstrap_samples']} bootstrap replicates scored in {summary['scoring_seconds'] * 1000:.0f} ms")
+    print(f"{'metric':<15}{'mean':>8}{'std':>8}{'pooled':>8}   {summary['confidence']:.0%} CI")
+    for name, m in summary["metrics"].items():
+        print(f"{name:<15}{m['mean']:>8.4f}{m['std']:>8.4f}{m['pooled']:>8.4f}   [{m['ci'][0]:.4f}, {m['ci'][1]:.4f}]")
+    print(f"\n{'category':<20}{'samples':>8}{'per fold':>9}{'accuracy':>10}{'std':>8}   CI")
+    for category, b in sorted(summary["bias_report"].items(), key=lambda item: item[1]["accuracy"]):
+        print(f"{category:<20}{b['samples']:>8}{b['samples_per_fold']:>9.1f}{b['accuracy']:>10.4f}{b['std']:>8.4f}"
+              f"   [{b['ci'][0]:.4f}, {b['ci'][1]:.4f}]")
+
+    diff = check_scoring(predictions)
+    print(f"\nweighted scoring vs sklearn.metrics: max |diff| {diff:.2e} {'ok' if diff <= TOLERANCE else 'MISMATCH'}")
+    failed |= diff > TOLERANCE
+    if failed:
+        print("\nFAIL: cross-validation results are not reproducible or its scoring is wrong")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
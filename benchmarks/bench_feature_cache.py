@@ -0,0 +1,96 @@
+"""
+Benchmark: the feature cache in front of corpus preparation.
+
+On a synthetic corpus (see bench_corpus.py) prepares the training matrix the
+way train_model does (corpus.load with the production TfidfVectorizer) in
+each cache state:
+
+  off           FEATURE_CACHE=0: stream, preprocess, fit (the previous path)
+  miss          empty cache: the same plus storing tokens and features
+  features hit  rerun with nothing changed: vectorizer, X.npz and y.npy loaded
+  tokens hit    vectorizer parameters changed (min_df=2): cached preprocessed
+                rows refitted, preprocess_text not called
+
+and then the miss with the preprocessing pool at 1 and --jobs workers.
+Checks that every cached result equals a cache-off run with the same
+settings (X, y, vocabulary_, idf_); exits non-zero otherwise.
+
+    python benchmarks/bench_feature_cache.py [--records 40000] [--jobs 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+
+import corpus  # noqa: E402
+from bench_corpus import write_corpus  # noqa: E402
+from dataset import open_source  # noqa: E402
+from feature_cache import FeatureCache  # noqa: E402
+from model import preprocess_text, preprocessing_fingerprint  # noqa: E402
+
+
+def vectorizer(**params):
+    return TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True, **params)
+
+
+def run(path, cache, n_jobs=1, **params):
+    start = time.perf_counter()
+    X, y, fitted, stats = corpus.load(open_source(path), vectorizer(**params), preprocess_text,
+                                      preprocessing_fingerprint(), cache=cache, n_jobs=n_jobs)
+    return (X, y, fitted), stats, time.perf_counter() - start
+
+
+def same(a, b):
+    (Xa, ya, va), (Xb, yb, vb) = a, b
+    return (Xa.shape == Xb.shape and (Xa != Xb).nnz == 0 and (ya == yb).all()
+            and va.vocabulary_ == vb.vocabulary_ and va.idf_.tobytes() == vb.idf_.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=40_000)
+    parser.add_argument("--jobs", type=int, default=max(2, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.csv")
+        write_corpus(path, "csv", args.records)
+        cache = FeatureCache(os.path.join(tmp, "cache"))
+
+        reference, _, off = run(path, None)
+        reference_min_df, _, _ = run(path, None, min_df=2)
+        print(f"{args.records:,} records ({os.path.getsize(path) / 2**20:.1f} MB CSV), "
+              f"{os.cpu_count()} CPU(s)\n")
+        print(f"{'state':<16}{'seconds':>9}{'speedup':>9}  check")
+        print(f"{'off':<16}{off:>9.2f}{1:>8.1f}x")
+        for state, params, expected in (("miss", {}, reference), ("features hit", {}, reference),
+                                        ("tokens hit", {"min_df": 2}, reference_min_df)):
+            result, stats, seconds = run(path, cache, **params)
+            ok = same(result, expected) and stats["cache"] == state.split()[0]
+            failed |= not ok
+            print(f"{state:<16}{seconds:>9.2f}{off / seconds:>8.1f}x  {'ok' if ok else 'MISMATCH'} "
+                  f"(cache={stats['cache']})")
+
+        print(f"\npreprocessing pool on a miss:")
+        for n_jobs in (1, args.jobs):
+            miss_cache = FeatureCache(os.path.join(tmp, f"cache-{n_jobs}"))
+            result, stats, seconds = run(path, miss_cache, n_jobs=n_jobs)
+            ok = same(result, reference)
+            failed |= not ok
+            print(f"  n_jobs={n_jobs:<3}{seconds:>8.2f}s  stream {stats['stream_seconds']:.2f}s  "
+                  f"{'ok' if ok else 'MISMATCH'}")
+
+    if failed:
+        print("\nFAIL: cached features differ from a cache-off run")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
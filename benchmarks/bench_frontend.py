@@ -0,0 +1,144 @@
+"""
+Benchmark: browser engine start-up with the precomputed index vs rebuilding it.
+
+Runs ml-engine.js under node (with fetch served from memory) against two
+builds of data.json from frontend_data.build_data():
+
+  rebuilt      training_data and disease_info only: SymptomMLEngine.initialize
+               builds vocabulary, IDF and document matrix itself (the previous
+               behaviour, still the fallback)
+  precomputed  the same plus the index frontend_data.py ships
+
+and reports the median initialize() time (JSON parse included), the data.json
+and index sizes raw and gzip-compressed, and per-query predict() time. Also
+checks that both engines rank every training vignette and a set of queries
+with EHR context identically, with confidences within --tolerance; exits
+non-zero otherwise or if node is not installed.
+
+    python benchmarks/bench_frontend.py [--runs 50] [--tolerance 1e-4]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frontend_data import ENGINE_PATH, build_data, render  # noqa: E402
+
+QUERIES = [
+    {"symptoms": "chest pain radiating to left arm and sweating", "age": 64, "sex": "male", "history": ["smoker"]},
+    {"symptoms": "fever cough runny nose", "age": 6, "sex": "female", "history": []},
+    {"symptoms": "headache stiff neck light sensitivity", "age": 30, "sex": None, "history": ["diabetes"]},
+    {"symptoms": "zzz qqq unknownword", "age": None, "sex": None, "history": []},
+    {"symptoms": "", "age": None, "sex": None, "history": []},
+    {"symptoms": "Itchy RED rash!!! on both arms, after new soap", "age": 70, "sex": "female", "history": []},
+]
+
+HARNESS = r"""
+const fs = require('fs');
+const vm = require('vm');
+const [enginePath, queriesPath, runs, ...dataPaths] = process.argv.slice(2);
+const source = fs.readFileSync(enginePath, 'utf8');
+const queries = JSON.parse(fs.readFileSync(queriesPath, 'utf8'));
+
+(async () => {
+    const out = {};
+    for (const dataPath of dataPaths) {
+        const text = fs.readFileSync(dataPath, 'utf8');
+        const context = vm.createContext({
+            console: { log() {}, error: console.error },
+            performance,
+            fetch: async () => ({ json: async () => JSON.parse(text) }),
+        });
+        const Engine = vm.runInContext(source + '\nSymptomMLEngine;', context);
+        const times = [];
+        let engine;
+        for (let i = 0; i < Number(runs); i++) {
+            engine = new Engine();
+            await engine.initialize();
+            times.push(engine.initMs);
+        }
+        times.sort((a, b) => a - b);
+        const start = performance.now();
+        const predictions = queries.map(q => engine.predict(q.symptoms, 5, q.age, q.sex, q.history));
+        const predictMs = (performance.now() - start) / queries.length;
+        out[dataPath] = {
+            init_ms: times[Math.floor(times.length / 2)],
+            predict_ms: predictMs,
+            features: Object.keys(engine.vocabulary).length,
+            predictions: predictions.map(p => p.map(r => [r.disease, r.confidence])),
+        };
+    }
+    console.log(JSON.stringify(out));
+})();
+"""
+
+
+def agree(a, b, tolerance):
+    return ([d for d, _ in a] == [d for d, _ in b]
+            and all(abs(x - y) <= tolerance for (_, x), (_, y) in zip(a, b)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    node = shutil.which("node") or shutil.which("nodejs")
+    if node is None:
+        sys.exit("node is required to run ml-engine.js")
+
+    data = build_data()
+    legacy = {k: v for k, v in data.items() if k != "index"}
+    queries = [{"symptoms": item["symptoms"], "age": None, "sex": None, "history": []}
+               for item in data["training_data"]] + QUERIES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        sizes = {}
+        for name, payload in (("rebuilt", legacy), ("precomputed", data)):
+            content = render(payload).encode()
+            paths[name] = os.path.join(tmp, f"{name}.json")
+            with open(paths[name], "wb") as f:
+                f.write(content)
+            sizes[name] = (len(content), len(gzip.compress(content, compresslevel=9)))
+        queries_path = os.path.join(tmp, "queries.json")
+        with open(queries_path, "w") as f:
+            json.dump(queries, f)
+        harness = os.path.join(tmp, "harness.js")
+        with open(harness, "w") as f:
+            f.write(HARNESS)
+        proc = subprocess.run([node, harness, ENGINE_PATH, queries_path, str(args.runs),
+                               paths["rebuilt"], paths["precomputed"]],
+                              capture_output=True, text=True, check=True)
+        by_path = json.loads(proc.stdout)
+        results = {name: by_path[path] for name, path in paths.items()}
+
+    index_raw = len(render(data["index"]).encode())
+    index_gz = len(gzip.compress(render(data["index"]).encode(), compresslevel=9))
+    print(f"index: {len(data['index']['vocabulary'])} terms, {len(data['index']['values'])} non-zeros, "
+          f"{index_raw:,} bytes ({index_gz:,} gzip)\n")
+    print(f"{'data.json':<13}{'bytes':>9}{'gzip':>8}{'features':>10}{'init ms':>9}{'predict ms':>12}")
+    for name, r in results.items():
+        print(f"{name:<13}{sizes[name][0]:>9,}{sizes[name][1]:>8,}{r['features']:>10}"
+              f"{r['init_ms']:>9.2f}{r['predict_ms']:>12.3f}")
+
+    rebuilt, precomputed = results["rebuilt"], results["precomputed"]
+    mismatches = [q["symptoms"] for q, a, b in zip(queries, rebuilt["predictions"], precomputed["predictions"])
+                  if not agree(a, b, args.tolerance)]
+    print(f"\nspeedup: {rebuilt['init_ms'] / precomputed['init_ms']:.1f}x; "
+          f"{len(queries) - len(mismatches)}/{len(queries)} queries rank identically")
+    if rebuilt["features"] != precomputed["features"] or mismatches:
+        print(f"\nFAIL: precomputed index disagrees with the rebuilt one: {mismatches[:5]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: sklearn vs compiled numpy predict_proba for the calibrated ensemble.
+
+Loads the trained artifacts, exports the model with compile_model() (or loads
+compiled_model.joblib when present), checks parity against sklearn on the
+training corpus plus the symptom texts with EHR context, and times single-row
+calls and batches. The "served" columns are what predict_batch uses for a
+group of that size: the compiled model up to --max-rows rows
+(COMPILED_BATCH_MAX_ROWS), sklearn above. Exits non-zero if the two disagree
+by more than PARITY_TOLERANCE.
+
+    python benchmarks/bench_inference.py [--repeat 50] [--batch-sizes 1 8 32 262] [--max-rows 64]
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled import PARITY_TOLERANCE, compile_model, parity  # noqa: E402
+from dataset import get_training_data  # noqa: E402
+from artifacts import active_version, artifact_paths  # noqa: E402
+from model import COMPILED_BATCH_MAX_ROWS, preprocess_text  # noqa: E402
+
+
+def per_call_ms(model, X, batch_size, repeat):
+    rows = X.shape[0]
+    start = time.perf_counter()
+    for i in range(repeat):
+        lo = (i * batch_size) % max(1, rows - batch_size + 1)
+        model.predict_proba(X[lo:lo + batch_size])
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64, 128, 262])
+    parser.add_argument("--max-rows", type=int, default=COMPILED_BATCH_MAX_ROWS,
+                        help="largest batch served compiled (0: every batch)")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    paths = artifact_paths(active_version())
+    model = joblib.load(paths["model"])
+    vectorizer = joblib.load(paths["vectorizer"])
+    start = time.perf_counter()
+    if os.path.exists(paths["compiled"]):
+        compiled, source = joblib.load(paths["compiled"], mmap_mode="r"), "exported artifact"
+    else:
+        compiled, source = compile_model(model), "compile_model()"
+    print(f"compiled model from {source} in {time.perf_counter() - start:.2f}s")
+
+    texts, _ = get_training_data()
+    probe = vectorizer.transform([preprocess_text(t) for t in texts] +
+                                 [preprocess_text(t, age=60, sex="female", medical_history=["diabetes"])
+                                  for t in texts])
+    diff = parity(compiled, model, probe)
+    print(f"parity on {probe.shape[0]} rows: max |compiled - sklearn| = {diff:.2e} "
+          f"(tolerance {PARITY_TOLERANCE:.0e})")
+
+    print(f"\n{'batch':>8}{'sklearn ms':>14}{'compiled ms':>14}{'speedup':>10}   {'served':<9}{'vs sklearn':>10}")
+    for batch_size in args.batch_sizes:
+        repeat = max(3, args.repeat // batch_size)
+        sk = per_call_ms(model, probe, batch_size, repeat)
+        co = per_call_ms(compiled, probe, batch_size, repeat)
+        served, ms = ("sklearn", sk) if 0 < args.max_rows < batch_size else ("compiled", co)
+        print(f"{batch_size:>8}{sk:>14.2f}{co:>14.2f}{sk / co:>9.1f}x   {served:<9}{sk / ms:>9.1f}x")
+
+    if diff > PARITY_TOLERANCE:
+        print("\nFAIL: compiled model does not reproduce sklearn")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Per-worker memory report for gunicorn deployments (Linux only).
+
+Starts gunicorn with gunicorn.conf.py under two configurations, sends some
+prediction traffic, then reads /proc/<pid>/smaps_rollup for every worker:
+
+  baseline  : no preload, no mmap (every worker joblib.loads its own copy)
+  shared    : preload_app + gc.freeze + MODEL_MMAP (the shipped defaults)
+
+USS (Private_Clean + Private_Dirty) is the memory a worker would free if it
+exited, i.e. what each additional worker really costs; PSS splits shared
+pages fairly between the processes using them.
+
+    python benchmarks/bench_memory.py [--workers 4] [--requests 200]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    "baseline": {"GUNICORN_PRELOAD": "0", "MODEL_MMAP": "0"},
+    "shared": {"GUNICORN_PRELOAD": "1", "MODEL_MMAP": "1"},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def smaps_rollup(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "uss_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def children_of(pid):
+    kids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        kids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return kids
+
+
+def wait_ready(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not become ready in {timeout}s")
+
+
+def run_config(name, env_overrides, workers, n_requests):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), **env_overrides)
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        wait_ready(f"{base}/api/diseases", timeout=300)
+        body = json.dumps({"symptoms": "chest pain sweating shortness of breath", "age": 55}).encode()
+        for i in range(n_requests):
+            req = urllib.request.Request(f"{base}/api/predict", data=body,
+                                         headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(req, timeout=60).read()
+        time.sleep(1)
+        rows = [smaps_rollup(pid) for pid in children_of(master.pid)]
+        return {"config": name, "master": smaps_rollup(master.pid), "workers": rows}
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'config':<10}{'process':<10}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}")
+    for name, overrides in CONFIGS.items():
+        result = run_config(name, overrides, args.workers, args.requests)
+        m = result["master"]
+        print(f"{name:<10}{'master':<10}{m['rss_mb']:>10.1f}{m['pss_mb']:>10.1f}{m['uss_mb']:>10.1f}")
+        for i, w in enumerate(result["workers"]):
+            print(f"{'':<10}{f'worker {i}':<10}{w['rss_mb']:>10.1f}{w['pss_mb']:>10.1f}{w['uss_mb']:>10.1f}")
+        if result["workers"]:
+            uss = sum(w["uss_mb"] for w in result["workers"]) / len(result["workers"])
+            pss = sum(w["pss_mb"] for w in result["workers"]) + m["pss_mb"]
+            print(f"{'':<10}{'mean USS':<10}{uss:>30.1f}   total PSS {pss:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
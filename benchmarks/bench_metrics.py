@@ -0,0 +1,133 @@
+"""
+Benchmark: overhead of the /api/metrics instrumentation on the predict path.
+
+Two measurements:
+
+  micro  the cost of one HistogramVec.labels(...).observe() and CounterVec.inc()
+         call, enabled and disabled, times the number of metric operations one
+         /api/predict request performs
+  A/B    /api/predict latency (accurate and fast mode, prediction cache off)
+         in child processes started with API_METRICS=1 and API_METRICS=0,
+         alternated over several rounds so drift affects both sides equally
+
+The A/B difference is reported but is within run-to-run noise; the exit code
+uses the micro estimate: non-zero if it exceeds --max-overhead (default 2%) of
+the fast-mode request latency, the cheapest predict path.
+
+    python benchmarks/bench_metrics.py [--rounds 3] [--passes 2] [--max-overhead 0.02]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Metric operations per single-record /api/predict on a cache miss: request histogram,
+# input length, top_k counter, enrich + serialize stages, and four classifier stages
+OBSERVES_PER_REQUEST = 8
+INCS_PER_REQUEST = 1
+PERF_COUNTERS_PER_REQUEST = 2 + 3 + 6   # request hooks, enrich/serialize, classifier stages
+
+
+def ns_per_call(fn, n=200_000):
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter_ns() - start) / n
+
+
+def micro():
+    import metrics
+    from metrics import CounterVec, HistogramVec
+
+    hist = HistogramVec("h", "", ("stage", "mode", "call"), (0.001, 0.01, 0.1))
+    counter = CounterVec("c", "", ("top_k",))
+    results = {}
+    for enabled in (True, False):
+        metrics.ENABLED = enabled
+        results["enabled" if enabled else "disabled"] = {
+            "observe_ns": ns_per_call(lambda: hist.labels("predict_proba", "fast", "single").observe(0.0004)),
+            "inc_ns": ns_per_call(lambda: counter.inc("5")),
+        }
+    perf_ns = ns_per_call(time.perf_counter)
+    on = results["enabled"]
+    per_request_us = (OBSERVES_PER_REQUEST * on["observe_ns"] + INCS_PER_REQUEST * on["inc_ns"]
+                      + PERF_COUNTERS_PER_REQUEST * perf_ns) / 1000.0
+    return results, perf_ns, per_request_us
+
+
+def child(passes):
+    """Runs in a subprocess: /api/predict latencies per mode, printed as JSON."""
+    import app as server
+    from dataset import get_training_data
+
+    client = server.app.test_client()
+    texts, _ = get_training_data()
+    out = {}
+    for mode in ("fast", "accurate"):
+        for text in texts[:20]:     # warm-up
+            client.post("/api/predict", json={"symptoms": text, "mode": mode})
+        samples = []
+        for _ in range(passes):
+            for text in texts:
+                start = time.perf_counter()
+                client.post("/api/predict", json={"symptoms": text, "mode": mode})
+                samples.append((time.perf_counter() - start) * 1e6)
+        out[mode] = float(np.median(samples))
+    print("RESULT " + json.dumps(out))
+
+
+def run_child(enabled, passes):
+    env = dict(os.environ, API_METRICS="1" if enabled else "0", PREDICTION_CACHE_SIZE="0",
+               MODEL_WATCH_SECONDS="0", PREDICT_BATCH_WINDOW_MS="0")
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--passes", str(passes)],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    line = next(line for line in proc.stdout.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--passes", type=int, default=2, help="passes over the vignettes per child")
+    parser.add_argument("--max-overhead", type=float, default=0.02)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.passes)
+
+    results, perf_ns, per_request_us = micro()
+    print(f"{'':<10}{'observe ns':>12}{'inc ns':>10}")
+    for state, r in results.items():
+        print(f"{state:<10}{r['observe_ns']:>12.0f}{r['inc_ns']:>10.0f}")
+    print(f"perf_counter {perf_ns:.0f} ns; instrumentation per /api/predict request ~{per_request_us:.1f} us "
+          f"({OBSERVES_PER_REQUEST} observes, {INCS_PER_REQUEST} inc, {PERF_COUNTERS_PER_REQUEST} clock reads)")
+
+    medians = {True: [], False: []}
+    for _ in range(args.rounds):
+        for enabled in (True, False):
+            medians[enabled].append(run_child(enabled, args.passes))
+
+    print(f"\n{'mode':<10}{'metrics on us':>15}{'metrics off us':>16}{'A/B overhead':>14}{'micro estimate':>16}")
+    failed = False
+    for mode in ("fast", "accurate"):
+        on = min(r[mode] for r in medians[True])      # best-of-rounds median: least disturbed run
+        off = min(r[mode] for r in medians[False])
+        estimate = per_request_us / off
+        print(f"{mode:<10}{on:>15.1f}{off:>16.1f}{(on - off) / off:>+13.2%}{estimate:>15.2%}")
+        if mode == "fast":
+            failed = estimate > args.max_overhead
+    if failed:
+        print(f"\nFAIL: instrumentation costs more than {args.max_overhead:.0%} of a fast-mode request")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Equivalence check + throughput benchmark for Stage 2 preprocessing.
+
+Runs the original per-call NLTK pipeline (reference_preprocess below) and the
+compiled model.preprocess_text over the whole get_training_data() corpus,
+with and without EHR context, and exits non-zero if any token stream differs.
+Then reports tokens/sec for both.
+
+    python benchmarks/bench_preprocess.py [--repeat 20]
+"""
+
+import argparse
+import os
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model  # noqa: E402
+from dataset import get_training_data  # noqa: E402
+
+
+def reference_preprocess(text, age=None, sex=None, medical_history=None):
+    """preprocess_text as it was before the compiled pipeline (rebuilds tables, calls NLTK per token)."""
+    context_parts = []
+    if age:
+        if isinstance(age, (int, float)):
+            if age < 18: context_parts.append("pediatric child")
+            elif age < 40: context_parts.append("young adult")
+            elif age < 60: context_parts.append("middle aged")
+            else: context_parts.append("elderly geriatric")
+    if sex:
+        context_parts.append(sex.lower())
+    if medical_history:
+        if isinstance(medical_history, list):
+            context_parts.extend(medical_history)
+        else:
+            context_parts.append(str(medical_history))
+
+    full_text = " ".join(context_parts) + " " + text if context_parts else text
+    full_text = full_text.lower()
+    full_text = re.sub(r"\d+", "", full_text)
+    full_text = full_text.translate(str.maketrans("", "", string.punctuation))
+    full_text = re.sub(r"\s+", " ", full_text).strip()
+
+    if model.NLTK_AVAILABLE:
+        tokens = model.word_tokenize(full_text)
+        tokens = [model.LEMMATIZER.lemmatize(t) for t in tokens if t not in model.STOP_WORDS and len(t) > 2]
+    else:
+        tokens = full_text.split()
+        tokens = [t for t in tokens if t not in model.STOP_WORDS and len(t) > 2]
+    return " ".join(tokens)
+
+
+EXTRA_CASES = [
+    ("I cannot breathe, gonna faint -- wanna lie down; lemme sit (gimme water) gotta go", None, None, None),
+    ("Fever 39.5°C… “stiff” neck – can’t bend it; naïve café patient ½ dose ٣ days", 30, "Female", "asthma"),
+    ("  tabs\tand\nnewlines\x0bvertical\x1cfile-sep  ", 70, "MALE", ["diabetes", "smoker"]),
+    ("", 5, None, None),
+    ("!!!???...", None, None, None),
+]
+
+
+def workload():
+    texts, _ = get_training_data()
+    cases = [(t, None, None, None) for t in texts]
+    cases += [(t, 20 + i % 60, ("male", "female")[i % 2], ["hypertension"] if i % 3 == 0 else None)
+              for i, t in enumerate(texts)]
+    return cases + EXTRA_CASES
+
+
+def check_equivalence(cases):
+    mismatches = 0
+    for text, age, sex, history in cases:
+        expected = reference_preprocess(text, age, sex, history)
+        actual = model.preprocess_text(text, age=age, sex=sex, medical_history=history)
+        if expected != actual:
+            mismatches += 1
+            print(f"  MISMATCH {text!r}\n    reference: {expected!r}\n    compiled : {actual!r}")
+    return mismatches
+
+
+def throughput(fn, cases, repeat):
+    tokens = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, age, sex, history in cases:
+            tokens += len(fn(text, age, sex, history).split())
+    elapsed = time.perf_counter() - start
+    return tokens / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = workload()
+    backend = "nltk" if model.NLTK_AVAILABLE else "fallback STOP_WORDS"
+    print(f"Backend: {backend} | {len(cases)} inputs")
+
+    mismatches = check_equivalence(cases)
+    if mismatches:
+        print(f"FAIL: {mismatches} token streams differ")
+        sys.exit(1)
+    print("Token streams identical on the full corpus")
+
+    compiled = lambda t, a, s, h: model.preprocess_text(t, age=a, sex=s, medical_history=h)  # noqa: E731
+    ref_rate, ref_time = throughput(reference_preprocess, cases, args.repeat)
+    new_rate, new_time = throughput(compiled, cases, args.repeat)
+    print(f"{'pipeline':<12}{'tokens/sec':>14}{'seconds':>10}")
+    print(f"{'reference':<12}{ref_rate:>14,.0f}{ref_time:>10.3f}")
+    print(f"{'compiled':<12}{new_rate:>14,.0f}{new_time:>10.3f}")
+    print(f"Speedup: {new_rate / ref_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: the ensemble profiles of train_model side by side.
+
+For each profile (model.ENSEMBLE_PROFILES) trains and publishes a version in
+a fresh process, with its own scratch MODEL_ARTIFACT_DIR and a shared
+FEATURE_CACHE_DIR, then loads it with SymptomClassifier and reports:
+
+  train s      train_model wall time (evaluation + production ensembles,
+               calibration, distillation, export)
+  fit s        the ensemble fit + calibration pool wall time within it
+  model MB     model.joblib on disk; artifacts MB is the whole version
+  predict ms   median SymptomClassifier.predict per vignette (cache disabled),
+               served by the engine in the "inference" column
+  M1 / F1 / NDCG@5  the holdout metrics train_model reports
+
+--records N trains on a synthetic corpus of N records (see bench_corpus.py)
+instead of the built-in vignettes, to show how each profile grows with rows.
+Exits non-zero if a profile fails to train or load, if lite is not faster to
+train than full, or if its NDCG@5 is more than --max-ndcg-drop below full's.
+
+    python benchmarks/bench_profiles.py [--profiles full lite] [--records 2000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(profile):
+    """Runs in a subprocess: train one profile, load it, print RESULT json."""
+    import numpy as np
+    import model
+    from artifacts import artifact_paths, version_dir
+    from dataset import get_training_data
+
+    started = time.perf_counter()
+    metrics = model.train_model(profile=profile)
+    train_seconds = time.perf_counter() - started
+    stages = {s["stage"]: s["seconds"] for s in metrics["training_profile"]["stages"]}
+
+    classifier = model.SymptomClassifier(watch_seconds=0)
+    timings = []
+    for text in get_training_data()[0]:
+        start = time.perf_counter()
+        classifier.predict(text)
+        timings.append(time.perf_counter() - start)
+    directory = version_dir(metrics["version"])
+    print("RESULT " + json.dumps({
+        "train_seconds": train_seconds,
+        "fit_seconds": stages["ensemble_fit (pool wall)"] + stages["calibration (pool wall)"],
+        "model_mb": os.path.getsize(artifact_paths(metrics["version"])["model"]) / 2**20,
+        "artifacts_mb": sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2**20,
+        "predict_ms": float(np.median(timings) * 1000),
+        "inference": classifier.inference,
+        "records": metrics["corpus"]["records"],
+        **{name: metrics[name] for name in ("m1_accuracy", "f1_score", "ndcg")},
+    }))
+
+
+def run_child(profile, env):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", profile],
+                          cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    if proc.returncode or not lines:
+        print(proc.stdout[-3000:], proc.stderr[-3000:])
+        return None
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+def main():
+    from model import ENSEMBLE_PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(ENSEMBLE_PROFILES), choices=list(ENSEMBLE_PROFILES))
+    parser.add_argument("--records", type=int, help="train on a synthetic corpus of this many records")
+    parser.add_argument("--max-ndcg-drop", type=float, default=0.05)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"FEATURE_CACHE_DIR": os.path.join(tmp, "cache"), "PREDICTION_CACHE_SIZE": "0",
+               "MODEL_WATCH_SECONDS": "0"}
+        if args.records:
+            from bench_corpus import write_corpus
+            env["TRAINING_DATA"] = os.path.join(tmp, "corpus.csv")
+            write_corpus(env["TRAINING_DATA"], "csv", args.records)
+        for profile in args.profiles:
+            results[profile] = run_child(profile, {**env, "MODEL_ARTIFACT_DIR": os.path.join(tmp, profile)})
+            if results[profile] is None:
+                failures.append(f"{profile} failed")
+
+    print(f"{'profile':<8}{'records':>8}{'train s':>9}{'fit s':>8}{'model MB':>10}{'artifacts MB':>14}"
+          f"{'predict ms':>12}  {'inference':<10}{'M1':>7}{'F1':>7}{'NDCG@5':>8}")
+    for profile, r in results.items():
+        if r is not None:
+            print(f"{profile:<8}{r['records']:>8}{r['train_seconds']:>9.1f}{r['fit_seconds']:>8.1f}"
+                  f"{r['model_mb']:>10.2f}{r['artifacts_mb']:>14.2f}{r['predict_ms']:>12.2f}  {r['inference']:<10}"
+                  f"{r['m1_accuracy']:>7.3f}{r['f1_score']:>7.3f}{r['ndcg']:>8.3f}")
+
+    full, lite = results.get("full"), results.get("lite")
+    if full and lite:
+        print(f"\nlite vs full: {full['train_seconds'] / lite['train_seconds']:.1f}x faster to train, "
+              f"{full['model_mb'] / lite['model_mb']:.1f}x smaller model, "
+              f"{full['predict_ms'] / lite['predict_ms']:.1f}x predict speed, NDCG@5 {lite['ndcg'] - full['ndcg']:+.3f}")
+        if lite["train_seconds"] >= full["train_seconds"]:
+            failures.append("lite profile is not faster to train")
+        if lite["ndcg"] < full["ndcg"] - args.max_ndcg_drop:
+            failures.append(f"lite profile NDCG@5 more than {args.max_ndcg_drop} below full")
+    if failures:
+        print(f"\nFAIL: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: vectorized ranking metrics vs the per-sample compute_ndcg loop.
+
+Synthetic Dirichlet probability rows over the real class list are generated
+chunk by chunk, so even the 1M-row case stays within bounded memory. The
+legacy loop (copied below) is timed where it finishes in reasonable time.
+Dirichlet rows have no tied probabilities, so its NDCG must match the
+vectorized result exactly. On ties the two differ by design: ranking.py
+ranks the true label below every class tied with it.
+
+    python benchmarks/bench_ranking.py [--sizes 10000 100000 1000000] [--legacy-max 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import get_disease_info  # noqa: E402
+from ranking import RankingAccumulator  # noqa: E402
+
+
+def legacy_compute_ndcg(y_true, y_pred_proba, classes, k=5):
+    """compute_ndcg as it was before ranking.py (per-sample argsort + generator sum)."""
+    def compute_dcg(relevances, k=None):
+        if k: relevances = relevances[:k]
+        return sum(rel / np.log2(i + 2) for i, rel in enumerate(relevances))
+
+    ndcg_scores = []
+    for i in range(len(y_true)):
+        ranked_indices = np.argsort(y_pred_proba[i])[::-1][:k]
+        relevances = [1.0 if classes[j] == y_true[i] else 0.0 for j in ranked_indices]
+        ideal = sorted(relevances, reverse=True)
+        dcg, idcg = compute_dcg(relevances, k), compute_dcg(ideal, k)
+        ndcg_scores.append(dcg / idcg if idcg > 0 else 0.0)
+    return np.mean(ndcg_scores)
+
+
+def synthetic_chunks(n_rows, classes, chunk_size, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        n = min(chunk_size, n_rows - start)
+        proba = rng.dirichlet(np.full(len(classes), 0.3), size=n)
+        y_true = classes[rng.integers(0, len(classes), size=n)]
+        yield y_true, proba
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=65_536)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    classes = np.array(sorted(get_disease_info()))
+    print(f"{len(classes)} classes, k={args.k}, chunk={args.chunk_size}")
+    print(f"{'rows':>10}{'legacy s':>12}{'vector s':>12}{'speedup':>10}{'ndcg':>10}{'top-k':>8}{'mrr':>8}  match")
+
+    for n_rows in args.sizes:
+        acc, vector_time = RankingAccumulator(classes, k=args.k), 0.0
+        for y_true, proba in synthetic_chunks(n_rows, classes, args.chunk_size):
+            t = time.perf_counter()     # time the metric only, not data generation
+            acc.update(y_true, proba)
+            vector_time += time.perf_counter() - t
+        result = acc.result()
+
+        legacy_time, match = None, "-"
+        if n_rows <= args.legacy_max:
+            y_true, proba = map(np.concatenate, zip(*synthetic_chunks(n_rows, classes, args.chunk_size)))
+            t = time.perf_counter()
+            legacy = legacy_compute_ndcg(y_true, proba, classes, k=args.k)
+            legacy_time = time.perf_counter() - t
+            match = "exact" if legacy == result["ndcg"] else f"diff {abs(legacy - result['ndcg']):.2e}"
+
+        legacy_col = f"{legacy_time:>12.3f}" if legacy_time is not None else f"{'skipped':>12}"
+        speedup = f"{legacy_time / vector_time:>9.0f}x" if legacy_time is not None else f"{'':>10}"
+        print(f"{n_rows:>10,}{legacy_col}{vector_time:>12.3f}{speedup}"
+              f"{result['ndcg']:>10.4f}{result['top_k_accuracy']:>8.4f}{result['mrr']:>8.4f}  {match}")
+
+
+if __name__ == "__main__":
+    main()
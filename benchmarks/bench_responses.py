@@ -0,0 +1,104 @@
+"""
+Benchmark: pre-rendered, ETag-cached responses for the model-dependent endpoints.
+
+For /api/diseases, /api/stats, /api/bias and /api/ndcg, times through Flask's
+test client:
+
+  render   building the payload and jsonify-ing it on every hit (the previous
+           behaviour, served from a temporary route)
+  cached   the pre-rendered bytes, identity and gzip
+  304      a poll carrying the current ETag in If-None-Match
+
+and reports body sizes. /api/stats is cached as served with ?live=0; its
+default response ("stats+live") merges the runtime counters into the cached
+body per request, timed against rendering payload and counters together.
+Also checks the gzip body decompresses to the identity body, that the cached
+body equals a fresh render and that the merged body parses to the same
+object as the full render; exits non-zero otherwise.
+
+    python benchmarks/bench_responses.py [--requests 2000]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+
+import app as server  # noqa: E402
+
+ENDPOINTS = {
+    "diseases": server.diseases_payload,
+    "stats": server.stats_payload,
+    "bias": server.bias_payload,
+    "ndcg": server.ndcg_payload,
+}
+PATHS = {"stats": "/api/stats?live=0"}
+
+
+def without_counters(body):
+    """The parsed stats body minus the counters that move between two requests."""
+    payload = json.loads(body)
+    for name in ("prediction_cache", "batching", "precomputed_responses"):
+        assert name in payload, name
+        payload[name] = None
+    return payload
+
+
+def per_request_us(client, path, headers, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = server.app
+    app.add_url_rule("/bench/render/<name>", "bench_render", lambda name: server.jsonify(ENDPOINTS[name]()))
+    app.add_url_rule("/bench/render-live", "bench_render_live",
+                     lambda: server.jsonify({**server.stats_payload(), **server.live_stats()}))
+    client = app.test_client()
+
+    failed = False
+    print(f"{'endpoint':<10}{'render us':>11}{'cached us':>11}{'gzip us':>9}{'304 us':>8}"
+          f"{'bytes':>8}{'gzip bytes':>12}  check")
+    for name in ENDPOINTS:
+        path = PATHS.get(name, f"/api/{name}")
+        plain = client.get(path)
+        zipped = client.get(path, headers={"Accept-Encoding": "gzip"})
+        fresh = client.get(f"/bench/render/{name}")
+        ok = (gzip.decompress(zipped.data) == plain.data == fresh.data
+              and client.get(path, headers={"If-None-Match": plain.headers["ETag"]}).status_code == 304)
+        failed |= not ok
+
+        n = args.requests
+        render = per_request_us(client, f"/bench/render/{name}", {}, n)
+        cached = per_request_us(client, path, {}, n)
+        cached_gz = per_request_us(client, path, {"Accept-Encoding": "gzip"}, n)
+        not_modified = per_request_us(client, path, {"If-None-Match": plain.headers["ETag"]}, n)
+        print(f"{name:<10}{render:>11.1f}{cached:>11.1f}{cached_gz:>9.1f}{not_modified:>8.1f}"
+              f"{len(plain.data):>8}{len(zipped.data):>12}  {'ok' if ok else 'MISMATCH'}")
+
+    merged, fresh = client.get("/api/stats"), client.get("/bench/render-live")
+    ok = without_counters(merged.data) == without_counters(fresh.data)
+    failed |= not ok
+    render = per_request_us(client, "/bench/render-live", {}, args.requests)
+    live = per_request_us(client, "/api/stats", {}, args.requests)
+    print(f"{'stats+live':<10}{render:>11.1f}{live:>11.1f}{'-':>9}{'-':>8}{len(merged.data):>8}{'-':>12}"
+          f"  {'ok' if ok else 'MISMATCH'}")
+
+    if failed:
+        print("\nFAIL: pre-rendered responses differ from a fresh render")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: server startup against fingerprinted artifacts, current and stale.
+
+In a scratch MODEL_ARTIFACT_DIR and FEATURE_CACHE_DIR, trains one version on
+the built-in vignettes, then times SymptomClassifier() in fresh processes:
+
+  current          nothing changed: the version is loaded as is
+  stale (warn)     TRAINING_DATA adds vignettes; the version is flagged and served
+  data (retrain)   the same with MODEL_STALE_POLICY=retrain: still only flagged, as
+                   servers never retrain for a dataset change
+  no corpus        TRAINING_DATA names a missing file: fingerprint unknown, served
+  config (retrain) ENSEMBLE_CONFIG changes an ensemble hyperparameter: served at once
+                   while a new version trains in the background from the cached
+                   feature matrix, then hot-reloaded
+  other profile    a lite version (trained in between) loaded by a server whose
+                   ENSEMBLE_PROFILE is full: checked under its own profile
+
+Startup is the SymptomClassifier() wall time, including the fingerprint
+check. Checks each run's fingerprint status and changed components, that only
+the config change retrains, and that its version is current and hit the
+features cache; exits non-zero otherwise.
+
+    python benchmarks/bench_startup.py [--extra 20]
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RETRAIN_TIMEOUT_SECONDS = 1800
+
+
+def write_extended_corpus(path, extra):
+    """The built-in vignettes plus ``extra`` new ones (existing ones reworded)."""
+    from dataset import get_training_data
+    texts, labels = get_training_data()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symptoms", "disease"])
+        writer.writerows(zip(texts, labels))
+        writer.writerows((f"{text} for several days", label) for text, label in list(zip(texts, labels))[:extra])
+
+
+def child(scenario):
+    """Runs in a subprocess with the scenario's environment; prints RESULT json."""
+    import model
+
+    if scenario.startswith("train"):
+        started = time.perf_counter()
+        metrics = model.train_model(profile=scenario.partition(":")[2] or None)
+        result = {"seconds": time.perf_counter() - started, "cache": metrics["corpus"]["cache"]}
+    else:
+        started = time.perf_counter()
+        classifier = model.SymptomClassifier(watch_seconds=0)
+        result = {"seconds": time.perf_counter() - started, "version": classifier.version,
+                  "freshness": classifier.active.freshness, "retrained": classifier.stale_retrain is not None}
+        classifier.predict("fever cough sore throat")
+        result["first_prediction_seconds"] = time.perf_counter() - started
+        if classifier.stale_retrain is not None:
+            first = classifier.version
+            while classifier.version == first and time.perf_counter() - started < RETRAIN_TIMEOUT_SECONDS:
+                time.sleep(0.5)
+            result.update(fresh_seconds=time.perf_counter() - started, fresh_version=classifier.version,
+                          fresh_freshness=classifier.active.freshness,
+                          fresh_cache=classifier.metrics.get("corpus", {}).get("cache"))
+    print("RESULT " + json.dumps(result))
+
+
+def run_child(scenario, env):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scenario],
+                          cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    if proc.returncode or not lines:
+        print(proc.stdout[-3000:], proc.stderr[-3000:])
+        raise SystemExit(f"{scenario}: child failed")
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--extra", type=int, default=20, help="vignettes added for the stale-data runs")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    failures = []
+
+    def check(name, ok):
+        if not ok:
+            failures.append(name)
+        return "ok" if ok else "FAIL"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"MODEL_ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+               "FEATURE_CACHE_DIR": os.path.join(tmp, "cache"), "MODEL_WATCH_SECONDS": "0"}
+        extended = os.path.join(tmp, "extended.csv")
+        write_extended_corpus(extended, args.extra)
+        stale_env = {**env, "TRAINING_DATA": extended}
+        config = os.path.join(tmp, "ensemble_config.json")
+        with open(config, "w") as f:
+            json.dump({"profile": "full", "ensemble": {"gb__n_estimators": 150}}, f)
+
+        trained = run_child("train", env)
+        print(f"initial training: {trained['seconds']:.1f}s (feature cache: {trained['cache']})\n")
+
+        print(f"{'scenario':<18}{'startup s':>10}{'1st pred s':>11}  fingerprint")
+        retrain = {"MODEL_STALE_POLICY": "retrain"}
+        runs = [("current", env, "current", [], False),
+                ("stale (warn)", {**stale_env, "MODEL_STALE_POLICY": "warn"}, "stale", ["dataset"], False),
+                ("data (retrain)", {**stale_env, **retrain}, "stale", ["dataset"], False),
+                ("no corpus", {**env, **retrain, "TRAINING_DATA": os.path.join(tmp, "missing.csv")},
+                 "unknown", [], False),
+                ("config (retrain)", {**env, **retrain, "ENSEMBLE_CONFIG": config}, "stale", ["ensemble"], True),
+                ("other profile", None, "current", [], False)]
+        for name, run_env, status, changed, retrains in runs:
+            if run_env is None:
+                run_child("train:lite", env)
+                run_env = {**env, **retrain, "ENSEMBLE_PROFILE": "full"}
+            r = run_child("startup", run_env)
+            f = r["freshness"]
+            ok = check(name, f["status"] == status and f["changed"] == changed and r["retrained"] == retrains)
+            print(f"{name:<18}{r['seconds']:>10.2f}{r['first_prediction_seconds']:>11.2f}  {f['status']} "
+                  f"(changed: {', '.join(f['changed']) or '-'}; check {f['check_seconds'] * 1000:.0f} ms"
+                  f"{'; rebuild: ' + f['rebuild'] if 'rebuild' in f else ''}"
+                  f"; {'retrained' if r['retrained'] else 'served as is'}) {ok}")
+            if r["retrained"]:
+                ok = check("retrained version", r["fresh_freshness"]["status"] == "current"
+                           and r["fresh_cache"] == "features")
+                print(f"{'':<18}retrained version {r['fresh_version']} live after {r['fresh_seconds']:.1f}s "
+                      f"(feature cache: {r['fresh_cache']}), fingerprint {r['fresh_freshness']['status']} {ok}")
+
+    if failures:
+        print(f"\nFAIL: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
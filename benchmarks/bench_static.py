@@ -0,0 +1,131 @@
+"""
+Benchmark: frontend bytes on the wire and time to first byte, before and after
+the static asset pipeline.
+
+Serves app.py with a real (threaded werkzeug) HTTP server and fetches the
+frontend with http.client as a browser would:
+
+  before  send_from_directory on the plain file names (the previous handler,
+          mounted on a temporary route)
+  after   static_assets.AssetPipeline: "/" plus the hashed names index.html
+          references, negotiated with the given Accept-Encoding
+
+For each file it reports the median time to first byte (request sent ->
+status line and headers read) and total time, and body bytes. The totals
+include a repeat visit: before, every file is revalidated (a request each);
+after, only index.html is, since the hashed assets are cached as immutable.
+Exits non-zero if a file outside the allow-list (source, models, the backlog)
+is served.
+
+    python benchmarks/bench_static.py [--requests 50] [--accept-encoding "gzip, deflate, br"]
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+
+from flask import send_from_directory  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+import app as server  # noqa: E402
+from static_assets import ENTRY_POINT, STATIC_DIR  # noqa: E402
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def fetch(port, path, headers):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    start = time.perf_counter()
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    ttfb = time.perf_counter() - start
+    body = response.read()
+    total = time.perf_counter() - start
+    conn.close()
+    return response, body, ttfb * 1000, total * 1000
+
+
+def measure(port, path, headers, n):
+    response, body, _, _ = fetch(port, path, headers)
+    samples = [fetch(port, path, headers)[2:] for _ in range(n)]
+    return {
+        "status": response.status,
+        "bytes": len(body),
+        "encoding": response.getheader("Content-Encoding") or "identity",
+        "etag": response.getheader("ETag"),
+        "cache": response.getheader("Cache-Control") or "-",
+        "ttfb_ms": statistics.median(s[0] for s in samples),
+        "total_ms": statistics.median(s[1] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--accept-encoding", default="gzip, deflate, br")
+    args = parser.parse_args()
+
+    app = server.app
+    app.add_url_rule("/bench/legacy/<path:path>", "bench_legacy",
+                     lambda path: send_from_directory(STATIC_DIR, path))
+    httpd = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    port = httpd.server_port
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    headers = {"Accept-Encoding": args.accept_encoding}
+    pipeline = server.assets
+    files = [ENTRY_POINT] + list(pipeline.hashed)
+    print(f"Accept-Encoding: {args.accept_encoding!r}; median of {args.requests} requests per file\n")
+    print(f"{'file':<14}{'before B':>10}{'after B':>9}{'enc':>6}{'TTFB before':>13}{'TTFB after':>12}"
+          f"{'total before':>14}{'total after':>13}  after Cache-Control")
+
+    totals = {"before": 0, "after": 0}
+    repeat = {"before": [0, 0], "after": [0, 0]}     # [requests, bytes]
+    for name in files:
+        before = measure(port, f"/bench/legacy/{name}", headers, args.requests)
+        after_path = "/" if name == ENTRY_POINT else f"/{pipeline.hashed[name]}"
+        after = measure(port, after_path, headers, args.requests)
+        totals["before"] += before["bytes"]
+        totals["after"] += after["bytes"]
+        print(f"{name:<14}{before['bytes']:>10,}{after['bytes']:>9,}{after['encoding']:>6}"
+              f"{before['ttfb_ms']:>11.2f}ms{after['ttfb_ms']:>10.2f}ms"
+              f"{before['total_ms']:>12.2f}ms{after['total_ms']:>11.2f}ms  {after['cache']}")
+
+        # Repeat visit: conditional requests for everything the browser must revalidate
+        revalidate = dict(headers, **{"If-None-Match": before["etag"]})
+        response, body, _, _ = fetch(port, f"/bench/legacy/{name}", revalidate)
+        repeat["before"][0] += 1
+        repeat["before"][1] += len(body)
+        if name == ENTRY_POINT:
+            response, body, _, _ = fetch(port, after_path, dict(headers, **{"If-None-Match": after["etag"]}))
+            repeat["after"][0] += 1
+            repeat["after"][1] += len(body)
+
+    print(f"\nfirst visit : {totals['before']:,} -> {totals['after']:,} body bytes "
+          f"({1 - totals['after'] / totals['before']:.0%} less)")
+    print(f"repeat visit: {repeat['before'][0]} -> {repeat['after'][0]} requests, "
+          f"{repeat['before'][1]:,} -> {repeat['after'][1]:,} body bytes")
+    exposed = []
+    for path in ("/model.py", "/requests.jsonl", "/tfidf_vectorizer.joblib", "/static/model.py"):
+        status = fetch(port, path, headers)[0].status
+        print(f"GET {path}: {status}")
+        if status != 404:
+            exposed.append(path)
+    httpd.shutdown()
+    if exposed:
+        print(f"\nFAIL: served outside the allow-list: {', '.join(exposed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
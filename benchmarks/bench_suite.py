@@ -0,0 +1,262 @@
+"""
+Benchmark suite: predict-path stages, every API endpoint, concurrency and memory.
+
+Imports app.py (so the classifier loads exactly as it serves) and replays the
+get_training_data() vignettes, with and without EHR context, through:
+
+  stages     preprocess_text, vectorizer transform, predict_proba (accurate and
+             fast), top-k ranking, and SymptomClassifier.predict end to end
+  endpoints  /api/predict (both modes), /api/diseases, /api/stats, /api/bias and
+             /api/ndcg via Flask's test client
+  throughput /api/predict requests/sec at several concurrency levels (threads)
+  memory     peak RSS after startup and after the run
+
+Latencies are reported as p50/p95/p99. The prediction cache is disabled unless
+--with-cache is given, so repeated vignettes measure the model. Results go to
+--output as JSON; with --baseline the run is compared against an earlier
+output file and the script exits non-zero if any p50/p95 latency or peak RSS
+grew, or any throughput dropped, by more than --threshold (latency increases
+under --min-delta-ms are treated as noise).
+
+    python benchmarks/bench_suite.py [--output bench.json] [--baseline baseline.json] [--threshold 0.15]
+    python benchmarks/bench_suite.py --output benchmarks/baseline.json   # record a baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Compared against a baseline; everything else in the output is informational
+COMPARED_LATENCIES = ("p50_ms", "p95_ms")
+GET_ENDPOINTS = ("/api/diseases", "/api/stats", "/api/bias", "/api/ndcg")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024   # bytes on macOS, KiB on Linux
+
+
+def summarize(samples_ms):
+    a = np.asarray(samples_ms)
+    return {
+        "n": int(a.size),
+        "mean_ms": round(float(a.mean()), 4),
+        "p50_ms": round(float(np.percentile(a, 50)), 4),
+        "p95_ms": round(float(np.percentile(a, 95)), 4),
+        "p99_ms": round(float(np.percentile(a, 99)), 4),
+        "max_ms": round(float(a.max()), 4),
+    }
+
+
+def timed(fn, inputs, repeat=1):
+    """Call fn on every input ``repeat`` times; per-call latencies in ms."""
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def workload():
+    """Every training vignette, bare and with an EHR context, as /api/predict bodies."""
+    from dataset import get_training_data
+    texts, _ = get_training_data()
+    contexts = [{}, {"age": 67, "sex": "female", "medical_history": ["diabetes", "hypertension"]},
+                {"age": 8, "sex": "male"}]
+    return [dict(symptoms=t, **contexts[i % len(contexts)]) for i, t in enumerate(texts)]
+
+
+def bench_stages(classifier, bodies, repeat):
+    from model import preprocess_text
+    active = classifier.active
+    args = [(b["symptoms"], b.get("age"), b.get("sex"), b.get("medical_history")) for b in bodies]
+    processed = [preprocess_text(*a) for a in args]
+    rows = [active.transformer.transform([p]) for p in processed]
+    probas = [active.model.predict_proba(X)[0] for X in rows]
+
+    stages = {
+        "preprocess_text": timed(lambda a: preprocess_text(*a), args, repeat),
+        "vectorize": timed(lambda p: active.transformer.transform([p]), processed, repeat),
+        "predict_proba_accurate": timed(active.model.predict_proba, rows, repeat),
+    }
+    if active.fast_model is not None:
+        stages["predict_proba_fast"] = timed(active.fast_model.predict_proba, rows, repeat)
+    stages["rank_top_k"] = timed(lambda p: classifier._rank(p, 5, active.classes), probas, repeat)
+    stages["classifier_predict"] = timed(
+        lambda a: classifier.predict(a[0], age=a[1], sex=a[2], medical_history=a[3]), args, repeat)
+    return {name: summarize(samples) for name, samples in stages.items()}
+
+
+def bench_endpoints(client, bodies, repeat, get_repeat):
+    endpoints = {}
+    for mode in ("accurate", "fast"):
+        endpoints[f"POST /api/predict ({mode})"] = timed(
+            lambda body: expect_ok(client.post("/api/predict", json=dict(body, mode=mode))), bodies, repeat)
+    for path in GET_ENDPOINTS:
+        endpoints[f"GET {path}"] = timed(lambda p: expect_ok(client.get(p)), [path] * get_repeat)
+    return {name: summarize(samples) for name, samples in endpoints.items()}
+
+
+def bench_throughput(app, bodies, levels, requests_per_level):
+    """/api/predict throughput with ``level`` threads, each with its own test client."""
+    results = {}
+    for level in levels:
+        latencies, errors = [[] for _ in range(level)], []
+        share = [bodies[i % len(bodies)] for i in range(requests_per_level)]
+
+        def worker(slot):
+            client = app.test_client()
+            for body in share[slot::level]:
+                start = time.perf_counter()
+                if client.post("/api/predict", json=body).status_code != 200:
+                    errors.append(body["symptoms"])
+                latencies[slot].append((time.perf_counter() - start) * 1000.0)
+
+        threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(level)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+        results[str(level)] = {
+            "requests": requests_per_level,
+            "errors": len(errors),
+            "wall_seconds": round(wall, 3),
+            "rps": round(requests_per_level / wall, 2),
+            **summarize([ms for slot in latencies for ms in slot]),
+        }
+    return results
+
+
+def expect_ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}: "
+                           f"{response.get_data(as_text=True)}")
+    return response
+
+
+def comparable(results):
+    """Flatten a result file into {metric: (value, higher_is_worse)} for baseline comparison."""
+    flat = {}
+    for group in ("stages", "endpoints"):
+        for name, stats in results.get(group, {}).items():
+            for key in COMPARED_LATENCIES:
+                flat[f"{group}/{name}/{key}"] = (stats[key], True)
+    for level, stats in results.get("throughput", {}).items():
+        flat[f"throughput/{level} threads/rps"] = (stats["rps"], False)
+    flat["memory/peak_rss_mb"] = (results["memory"]["peak_rss_mb"], True)
+    return flat
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Print a comparison table; return the metrics that regressed by more than
+    threshold (and, for latencies, by more than min_delta_ms in absolute terms)."""
+    current, previous = comparable(results), comparable(baseline)
+    regressions = []
+    print(f"\n{'metric':<58}{'baseline':>12}{'current':>12}{'change':>9}")
+    for metric, (value, higher_is_worse) in current.items():
+        if metric not in previous or not previous[metric][0]:
+            continue
+        before = previous[metric][0]
+        change = (value - before) / before
+        worse = change > threshold if higher_is_worse else change < -threshold
+        if metric.endswith("_ms") and value - before <= min_delta_ms:
+            worse = False   # sub-noise-floor jitter on very fast calls
+        if worse:
+            regressions.append(metric)
+        print(f"{metric:<58}{before:>12.3f}{value:>12.3f}{change:>+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def print_table(title, rows):
+    print(f"\n{title:<34}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in rows.items():
+        print(f"{name:<34}{stats['n']:>7}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the workload per stage/endpoint")
+    parser.add_argument("--get-repeat", type=int, default=200, help="calls per GET endpoint")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=400, help="/api/predict calls per concurrency level")
+    parser.add_argument("--with-cache", action="store_true", help="keep the prediction cache enabled")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="latency increases below this many ms never count as regressions")
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+
+    started = time.perf_counter()
+    import app as server    # loads the classifier, as at server start
+    startup_seconds = time.perf_counter() - started
+    rss_after_startup = peak_rss_mb()
+    classifier = server.classifier
+    if classifier.engine != "ensemble":
+        sys.exit("No trained ensemble is loaded; run `python model.py` first.")
+
+    bodies = workload()
+    client = server.app.test_client()
+    print(f"model version {classifier.version} ({classifier.inference} inference), {len(bodies)} vignettes, "
+          f"startup {startup_seconds:.1f}s")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_version": classifier.version,
+            "inference": classifier.inference,
+            "prediction_cache": args.with_cache,
+            "workload_size": len(bodies),
+        },
+        "startup_seconds": round(startup_seconds, 3),
+        "stages": bench_stages(classifier, bodies, args.repeat),
+        "endpoints": bench_endpoints(client, bodies, args.repeat, args.get_repeat),
+        "throughput": bench_throughput(server.app, bodies, args.concurrency, args.requests),
+    }
+    results["memory"] = {"rss_after_startup_mb": round(rss_after_startup, 1), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+    print_table("stage", results["stages"])
+    print_table("endpoint", results["endpoints"])
+    print(f"\n{'threads':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for level, stats in results["throughput"].items():
+        print(f"{level:>8}{stats['rps']:>10.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+    print(f"\npeak RSS {results['memory']['peak_rss_mb']:.1f} MB "
+          f"(after startup {results['memory']['rss_after_startup_mb']:.1f} MB)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
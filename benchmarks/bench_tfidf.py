@@ -0,0 +1,83 @@
+"""
+Benchmark: TfidfVectorizer.transform vs tfidf.DirectTfidf.
+
+Checks that DirectTfidf output is bit-identical to the fitted vectorizer (CSR
+structure and the raw float64 bits of every value) on the preprocessed
+training corpus, the same texts with EHR context, raw unpreprocessed text and
+a few edge cases, then times single-row calls and batches. Exits non-zero on
+any mismatch.
+
+    python benchmarks/bench_tfidf.py [--repeat 2000] [--batch-sizes 1 8 32 262 2620]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import get_training_data  # noqa: E402
+from artifacts import active_version, artifact_paths  # noqa: E402
+from model import preprocess_text  # noqa: E402
+from tfidf import DirectTfidf, identical  # noqa: E402
+
+EDGE_CASES = [
+    "",
+    "zzz qqq unknownword",
+    "chest chest chest pain pain pain pain",
+    "Chest PAIN Naïve CAFÉ 12 ab x",
+    "pain " * 300,                                   # count beyond the precomputed tf table
+]
+
+
+def per_call_us(transform, texts, batch_size, repeat):
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts) - batch_size + 1, batch_size)] or [texts]
+    start = time.perf_counter()
+    for i in range(repeat):
+        transform(batches[i % len(batches)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 262, 2620])
+    args = parser.parse_args()
+
+    vectorizer = joblib.load(artifact_paths(active_version())["vectorizer"])
+    start = time.perf_counter()
+    direct = DirectTfidf(vectorizer)
+    print(f"DirectTfidf built in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({len(vectorizer.vocabulary_)} features, {direct.n_tokens} tokens)")
+
+    raw, _ = get_training_data()
+    corpus = [preprocess_text(t) for t in raw]
+    ehr = [preprocess_text(t, age=70, sex="female", medical_history=["diabetes", "smoker"]) for t in raw]
+    suites = {"corpus": corpus, "corpus+EHR": ehr, "raw text": list(raw), "edge cases": EDGE_CASES}
+
+    failed = False
+    for name, texts in suites.items():
+        batch_ok = identical(direct.transform(texts), vectorizer.transform(texts))
+        rows_ok = sum(identical(direct.transform([t]), vectorizer.transform([t])) for t in texts)
+        failed |= not batch_ok or rows_ok != len(texts)
+        print(f"  {name:<12} batch {'identical' if batch_ok else 'MISMATCH'}, "
+              f"rows {rows_ok}/{len(texts)} identical")
+
+    texts = corpus * 10
+    print(f"\n{'batch':>8}{'sklearn us':>14}{'direct us':>12}{'speedup':>10}{'us/row direct':>16}")
+    for batch_size in args.batch_sizes:
+        repeat = max(5, args.repeat // batch_size)
+        sk = per_call_us(vectorizer.transform, texts, batch_size, repeat)
+        dt = per_call_us(direct.transform, texts, batch_size, repeat)
+        print(f"{batch_size:>8}{sk:>14.1f}{dt:>12.1f}{sk / dt:>9.1f}x{dt / batch_size:>16.1f}")
+
+    if failed:
+        print("\nFAIL: DirectTfidf output differs from TfidfVectorizer.transform")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: serial vs parallel fitting of the evaluation + production ensembles.
+
+Fits the same work train_model does (both ensembles and their calibration)
+once with n_jobs=1 and once per requested core budget, reports wall-clock and
+speedup, and checks that every budget produces identical predict_proba output.
+No artifacts are written.
+
+    python benchmarks/bench_training.py [--jobs 2 4 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.model_selection import train_test_split  # noqa: E402
+
+from dataset import get_training_data  # noqa: E402
+from model import build_ensemble, preprocess_text  # noqa: E402
+from training import calibrate_all, fit_ensembles  # noqa: E402
+
+
+def fit_all(X, y, n_jobs):
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    start = time.perf_counter()
+    (eval_model, full_model), timings = fit_ensembles(build_ensemble(), [(X_train, y_train), (X, y)], n_jobs=n_jobs)
+    calibrated, _ = calibrate_all([(eval_model, X_train, y_train), (full_model, X, y)], n_jobs=n_jobs)
+    return calibrated, time.perf_counter() - start, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    texts, labels = get_training_data()
+    X = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True).fit_transform(
+        [preprocess_text(t) for t in texts])
+    y = np.array(labels)
+
+    baseline, serial_time, timings = fit_all(X, y, n_jobs=1)
+    print(f"cores available: {os.cpu_count()}")
+    print("serial per-task seconds: " + ", ".join(
+        f"{('eval', 'full')[t['ensemble']]}/{t['estimator']}={t['seconds']:.1f}" for t in timings))
+    print(f"{'n_jobs':>8}{'wall s':>10}{'speedup':>10}  identical")
+    print(f"{1:>8}{serial_time:>10.1f}{1.0:>9.2f}x  -")
+
+    for n_jobs in args.jobs:
+        if n_jobs == 1:
+            continue
+        models, wall, _ = fit_all(X, y, n_jobs=n_jobs)
+        identical = all(np.array_equal(a.predict_proba(X), b.predict_proba(X)) for a, b in zip(baseline, models))
+        print(f"{n_jobs:>8}{wall:>10.1f}{serial_time / wall:>9.2f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Bounded prediction cache for SymptomClassifier.
+
+Keys are the preprocess_text output (which already folds age bucket, sex and
+medical history into tokens) plus top_k, so two requests that differ only in
+punctuation, casing, digits or stopwords share an entry.
+
+PredictionCache is an in-process LRU with a TTL. When a file path is given,
+entries are also written through to a small SQLite store so gunicorn workers
+on the same host can reuse each other's results.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=1024, ttl=300.0, shared_path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self._entries = OrderedDict()   # key -> (expires_at, predictions)
+        self._lock = threading.Lock()
+        self._shared = SharedCacheStore(shared_path, maxsize * 4) if shared_path and maxsize > 0 else None
+        self._namespace = ""
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key):
+        """Return a copy of the cached predictions for key, or None."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(p) for p in entry[1]]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self._shared is not None:
+            value = self._shared.get(self._namespace, key)
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return [dict(p) for p in value]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, predictions):
+        if not self.enabled:
+            return
+        self._store(key, predictions, time.monotonic())
+        if self._shared is not None:
+            self._shared.put(self._namespace, key, predictions, self.ttl)
+
+    def _store(self, key, predictions, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, [dict(p) for p in predictions])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, namespace=""):
+        """Drop every entry. namespace identifies the loaded model so that workers
+        sharing the SQLite store never serve results from a different artifact."""
+        with self._lock:
+            self._entries.clear()
+            self._namespace = namespace
+        if self._shared is not None:
+            self._shared.purge_other(namespace)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared": self._shared is not None,
+                "shared_hits": self.shared_hits,
+            }
+
+
+class SharedCacheStore:
+    """SQLite-backed cache tier shared by processes on one host (WAL mode, wall-clock TTL)."""
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " namespace TEXT, key TEXT, value TEXT, expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM predictions WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, json.dumps(key), time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace, key, predictions, ttl):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                (namespace, json.dumps(key), json.dumps(predictions), time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._trim(conn)
+        except sqlite3.Error:
+            pass   # the shared tier is best-effort; the local LRU still works
+
+    def _trim(self, conn):
+        conn.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM predictions WHERE rowid NOT IN "
+            "(SELECT rowid FROM predictions ORDER BY expires_at DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+
+    def purge_other(self, namespace):
+        try:
+            self._connect().execute("DELETE FROM predictions WHERE namespace != ?", (namespace,))
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,505 @@
+"""
+Compiled numpy inference for the calibrated soft-voting ensembles of
+model.build_ensemble: RF + SVC + GB ("full") and calibrated LinearSVC + SGD +
+HistGradientBoosting ("lite").
+
+At serving time sklearn's predict_proba goes CalibratedClassifierCV ->
+FrozenEstimator -> VotingClassifier -> three estimators, and every layer
+re-validates its input. compile_model() exports the fitted model into plain
+arrays instead:
+
+  forests / boosting : all trees' nodes concatenated into contiguous feature,
+                       threshold and child arrays (leaves point at themselves),
+                       so every (row, tree) pair descends one level per numpy step;
+                       histogram boosting's predictor nodes are flattened the same way
+  SVC                : support vectors, a (n_SV, n_pairs) matrix of one-vs-one
+                       dual coefficients, intercepts and libsvm's pairwise Platt
+                       parameters
+  linear models      : coefficient matrices and intercepts (one per calibration
+                       fold for a calibrated LinearSVC)
+  pipelines          : feature selection as a column index; to_dense steps vanish
+  calibrators        : one sigmoid (a, b) coefficient vector per class
+
+CompiledEnsemble.predict_proba evaluates that with numpy alone and follows
+sklearn's arithmetic (float32 feature comparisons in trees, libsvm's pairwise
+coupling with its own stopping rule), so results agree with sklearn to well
+within PARITY_TOLERANCE. Anything else raises UnsupportedModel and the caller
+keeps the sklearn model.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import (
+    GradientBoostingClassifier,
+    HistGradientBoostingClassifier,
+    RandomForestClassifier,
+    VotingClassifier,
+)
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.svm import SVC, LinearSVC
+
+PARITY_TOLERANCE = 1e-9
+CHUNK_ROWS = 256          # bounds the (rows x trees) work arrays for large batches
+DESCENT_STEPS = 6         # tree levels between retiring (row, tree) pairs that reached a leaf
+SVM_MIN_PROB = 1e-7       # libsvm clips pairwise probabilities to [min_prob, 1 - min_prob]
+
+
+class UnsupportedModel(ValueError):
+    """The fitted model has a shape compile_model() does not know how to export."""
+
+
+def to_dense(X):
+    """Pipeline step (in a FunctionTransformer) densifying sparse input for estimators
+    that need it; compiled models already see dense rows and drop it."""
+    return X.toarray() if sp.issparse(X) else X
+
+
+# ─── Trees ────────────────────────────────────────────────────────────────────
+
+class FlatTrees:
+    """Many decision trees flattened into one set of contiguous node arrays."""
+
+    def __init__(self, trees, leaf_values):
+        """``leaf_values(tree_)`` returns one row of output values per node; only
+        the leaf rows are kept."""
+        features, thresholds, children, slots, values, roots = [], [], [], [], [], []
+        offset = n_leaves = self.max_depth = 0
+        for tree in trees:
+            t = tree.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            ids = np.arange(n) + offset
+            # Leaves loop back onto themselves so extra descent steps are harmless
+            left = np.where(is_leaf, ids, t.children_left + offset)
+            right = np.where(is_leaf, ids, t.children_right + offset)
+            children.append(np.column_stack([left, right]).ravel())
+            features.append(np.where(is_leaf, 0, t.feature))
+            thresholds.append(np.where(is_leaf, 0.0, t.threshold))
+            slot = np.full(n, -1)
+            slot[is_leaf] = np.arange(is_leaf.sum()) + n_leaves
+            slots.append(slot)
+            values.append(leaf_values(t)[is_leaf])
+            roots.append(offset)
+            offset += n
+            n_leaves += int(is_leaf.sum())
+            self.max_depth = max(self.max_depth, t.max_depth)
+
+        self.feature = np.concatenate(features).astype(np.int32)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.children = np.concatenate(children).astype(np.int32)   # [2*node] left, [2*node + 1] right
+        self.leaf_slot = np.concatenate(slots).astype(np.int32)
+        self.values = np.ascontiguousarray(np.concatenate(values))
+        self.roots = np.asarray(roots, dtype=np.int32)
+
+    def leaf_values(self, X):
+        """Values of the leaf every row of X lands in, shape (n_rows, n_trees, width).
+        Pass the float32 copy for sklearn's trees and the float64 one for
+        histogram boosting, matching what each compares against its thresholds.
+
+        All (row, tree) pairs descend together, one level per step; every
+        DESCENT_STEPS steps the pairs that reached a leaf are retired, since
+        paths are usually far shorter than the deepest tree."""
+        n_rows, n_features = X.shape
+        x = X.ravel()
+        node = np.tile(self.roots, n_rows)
+        row_base = np.repeat(np.arange(n_rows, dtype=np.int32) * n_features, self.roots.size)
+        position = np.arange(node.size)
+        leaf = np.empty_like(node)
+        depth = 0
+        while node.size:
+            steps = min(DESCENT_STEPS, self.max_depth - depth)
+            for _ in range(steps):
+                # Right when the feature value exceeds the (float64) threshold, as in sklearn
+                go_right = x.take(row_base + self.feature.take(node)) > self.threshold.take(node)
+                node = self.children.take(2 * node + go_right)
+            depth += steps
+            if depth == self.max_depth:
+                leaf[position] = node
+                break
+            done = self.leaf_slot.take(node) >= 0
+            leaf[position[done]] = node[done]
+            pending = ~done
+            node, row_base, position = node[pending], row_base[pending], position[pending]
+        return self.values[self.leaf_slot[leaf]].reshape(n_rows, self.roots.size, -1)
+
+
+def _tree_proba(tree_):
+    """DecisionTreeClassifier.predict_proba for every node: normalized class weights."""
+    value = tree_.value[:, 0, :]
+    normalizer = value.sum(axis=1)
+    normalizer[normalizer == 0.0] = 1.0
+    return value / normalizer[:, None]
+
+
+class CompiledForest:
+    """RandomForestClassifier.predict_proba: mean of the trees' leaf distributions."""
+
+    def __init__(self, forest):
+        self.trees = FlatTrees(forest.estimators_, _tree_proba)
+        self.n_trees = len(forest.estimators_)
+
+    def predict_proba(self, X, X32):
+        return self.trees.leaf_values(X32).sum(axis=1) / self.n_trees
+
+
+class CompiledBoosting:
+    """Multinomial GradientBoostingClassifier.predict_proba: softmax of the prior's raw
+    score plus learning_rate times one leaf value per (stage, class) tree."""
+
+    def __init__(self, gb):
+        if gb.n_trees_per_iteration_ < 3:
+            raise UnsupportedModel("only multinomial gradient boosting is supported")
+        lr = gb.learning_rate
+        n_classes = gb.n_trees_per_iteration_
+        # The init estimator predicts the class prior regardless of X, and single-leaf
+        # trees (common once a class is fitted) add a constant: fold both into one vector
+        self.init = gb._raw_predict_init(np.zeros((1, gb.n_features_in_)))[0].copy()
+        trees, tree_class = [], []
+        for stage in gb.estimators_:
+            for k, tree in enumerate(stage):
+                if tree.tree_.node_count == 1:
+                    self.init[k] += lr * tree.tree_.value[0, 0, 0]
+                else:
+                    trees.append(tree)
+                    tree_class.append(k)
+        self.trees = FlatTrees(trees, lambda t: lr * t.value[:, 0, 0])
+        self.class_of_tree = np.eye(n_classes)[tree_class]     # (n_trees, n_classes) one-hot
+
+    def predict_proba(self, X, X32):
+        raw = self.init + self.trees.leaf_values(X32)[:, :, 0] @ self.class_of_tree
+        raw -= raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+
+class _HistTree:
+    """A HistGradientBoosting TreePredictor's nodes in the layout FlatTrees reads
+    from a fitted tree's ``tree_``. Without categorical splits the predictor goes
+    left when X <= num_threshold; missing_go_to_left only matters for NaNs,
+    which TF-IDF features never hold."""
+
+    def __init__(self, predictor):
+        nodes = predictor.nodes
+        if nodes["is_categorical"].any():
+            raise UnsupportedModel("categorical histogram boosting splits are not supported")
+        is_leaf = nodes["is_leaf"].astype(bool)
+        self.tree_ = self
+        self.node_count = len(nodes)
+        self.children_left = np.where(is_leaf, -1, nodes["left"].astype(np.intp))
+        self.children_right = np.where(is_leaf, -1, nodes["right"].astype(np.intp))
+        self.feature = nodes["feature_idx"]
+        self.threshold = nodes["num_threshold"]
+        self.value = nodes["value"]
+        self.max_depth = int(nodes["depth"].max())
+
+
+class CompiledHistBoosting:
+    """Multiclass HistGradientBoostingClassifier.predict_proba: softmax of the baseline
+    plus one leaf value (learning rate included) per (iteration, class) predictor."""
+
+    def __init__(self, hgb):
+        if hgb.n_trees_per_iteration_ < 3:
+            raise UnsupportedModel("only multiclass histogram boosting is supported")
+        n_classes = hgb.n_trees_per_iteration_
+        # Single-leaf predictors add a constant: fold them into the baseline, as for GB
+        self.init = np.asarray(hgb._baseline_prediction, dtype=np.float64).ravel().copy()
+        trees, tree_class = [], []
+        for predictors in hgb._predictors:
+            for k, predictor in enumerate(predictors):
+                if len(predictor.nodes) == 1:
+                    self.init[k] += predictor.nodes["value"][0]
+                else:
+                    trees.append(_HistTree(predictor))
+                    tree_class.append(k)
+        self.trees = FlatTrees(trees, lambda t: t.value) if trees else None
+        self.class_of_tree = np.eye(n_classes)[tree_class]
+
+    def predict_proba(self, X, X32):
+        raw = np.tile(self.init, (X.shape[0], 1))
+        if self.trees is not None:
+            raw += self.trees.leaf_values(X)[:, :, 0] @ self.class_of_tree
+        raw -= raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+
+# ─── SVC ──────────────────────────────────────────────────────────────────────
+
+class CompiledSVC:
+    """SVC(kernel='rbf', probability=True).predict_proba as libsvm computes it."""
+
+    def __init__(self, svc):
+        if svc.kernel != "rbf" or not svc.probability:
+            raise UnsupportedModel("only probability=True RBF SVCs are supported")
+        sv = sp.csr_matrix(svc.support_vectors_, dtype=np.float64)
+        dual = svc._dual_coef_.toarray() if sp.issparse(svc._dual_coef_) else np.asarray(svc._dual_coef_)
+        k = len(svc.classes_)
+        start = np.concatenate([[0], np.cumsum(svc.n_support_)])
+        pairs = [(i, j) for i in range(k) for j in range(i + 1, k)]
+
+        # One column per one-vs-one pair: class i's SVs weighted by dual row j-1,
+        # class j's SVs by dual row i (libsvm's sv_coef layout)
+        coef = np.zeros((sv.shape[0], len(pairs)))
+        for p, (i, j) in enumerate(pairs):
+            coef[start[i]:start[i + 1], p] = dual[j - 1, start[i]:start[i + 1]]
+            coef[start[j]:start[j + 1], p] = dual[i, start[j]:start[j + 1]]
+
+        self.support_vectors = sv
+        self.sv_sq_norms = np.asarray(sv.multiply(sv).sum(axis=1)).ravel()
+        self.pair_coef = coef
+        self.intercept = np.asarray(svc._intercept_, dtype=np.float64)
+        self.prob_a = np.asarray(svc.probA_, dtype=np.float64)
+        self.prob_b = np.asarray(svc.probB_, dtype=np.float64)
+        self.gamma = float(svc._gamma)
+        self.pair_i = np.array([i for i, _ in pairs], dtype=np.intp)
+        self.pair_j = np.array([j for _, j in pairs], dtype=np.intp)
+        self.n_classes = k
+
+    def predict_proba(self, X, X32):
+        x_sq = np.einsum("ij,ij->i", X, X)
+        cross = (self.support_vectors @ X.T).T
+        sq_dist = np.maximum(x_sq[:, None] + self.sv_sq_norms[None, :] - 2.0 * cross, 0.0)
+        kernel = np.exp(-self.gamma * sq_dist)
+        decision = kernel @ self.pair_coef + self.intercept
+
+        # libsvm's sigmoid_predict, written to avoid cancellation in 1 - p
+        f = decision * self.prob_a + self.prob_b
+        e = np.exp(-np.abs(f))
+        pairwise = np.where(f >= 0, e / (1.0 + e), 1.0 / (1.0 + e))
+        pairwise = np.minimum(np.maximum(pairwise, SVM_MIN_PROB), 1 - SVM_MIN_PROB)
+
+        r = np.zeros((X.shape[0], self.n_classes, self.n_classes))
+        r[:, self.pair_i, self.pair_j] = pairwise
+        r[:, self.pair_j, self.pair_i] = 1 - pairwise
+        return _couple_pairwise(r)
+
+
+def _couple_pairwise(r):
+    """libsvm's multiclass_probability (Wu, Lin & Weng, method 2) for many rows at once.
+
+    r[n, i, j] is the pairwise probability of class i over class j. Every row
+    runs the same fixed-point iteration and stops where libsvm would, since the
+    result is only converged to eps = 0.005 / k."""
+    n, k = r.shape[:2]
+    rt = r.transpose(0, 2, 1)
+    Q = -rt * r
+    diag = (rt * rt).sum(axis=2)        # Q[t][t] = sum over j != t of r[j][t]^2 (r's diagonal is 0)
+    Q[:, np.arange(k), np.arange(k)] = diag
+
+    p = np.full((n, k), 1.0 / k)
+    eps = 0.005 / k
+    active = np.arange(n)
+    for _ in range(max(100, k)):
+        Qa, pa = Q[active], p[active]
+        Qp = np.einsum("ntj,nj->nt", Qa, pa)
+        pQp = (pa * Qp).sum(axis=1)
+        keep = np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not keep.any():
+            break
+        active, Qa, pa, Qp, pQp = active[keep], Qa[keep], pa[keep], Qp[keep], pQp[keep]
+        if active.size == 1:
+            _sweep_row(Qa[0], diag[active[0]].tolist(), pa[0], Qp[0], float(pQp[0]))
+        else:
+            _sweep(Qa, diag[active], pa, Qp, pQp)
+        p[active] = pa
+    return p
+
+
+def _sweep(Q, Qtt, p, Qp, pQp):
+    """One pass of coordinate updates over t, in place on p, for every row."""
+    for t in range(p.shape[1]):
+        Qp_t, Qtt_t = Qp[:, t].copy(), Qtt[:, t]
+        diff = (pQp - Qp_t) / Qtt_t
+        p[:, t] += diff
+        scale = 1 + diff
+        pQp = (pQp + diff * (diff * Qtt_t + 2 * Qp_t)) / scale / scale
+        Qp += diff[:, None] * Q[:, t, :]
+        Qp /= scale[:, None]
+        p /= scale[:, None]
+
+
+def _sweep_row(Q, Qtt, p, Qp, pQp):
+    """_sweep for a single row, with the per-row scalars as Python floats."""
+    for t in range(p.size):
+        Qp_t = Qp.item(t)
+        diff = (pQp - Qp_t) / Qtt[t]
+        p[t] += diff
+        scale = 1 + diff
+        pQp = (pQp + diff * (diff * Qtt[t] + 2 * Qp_t)) / scale / scale
+        Qp += diff * Q[t]
+        Qp /= scale
+        p /= scale
+
+
+# ─── Linear models ────────────────────────────────────────────────────────────
+
+def _linear_params(est):
+    """coef_ and intercept_ of a fitted multiclass linear model as float64 arrays."""
+    coef = np.asarray(est.coef_, dtype=np.float64)
+    if coef.shape[0] < 3:
+        raise UnsupportedModel(f"only multiclass {type(est).__name__} models are supported")
+    return coef, np.asarray(est.intercept_, dtype=np.float64)
+
+
+class CompiledSGD:
+    """SGDClassifier(loss='log_loss').predict_proba: one-vs-rest logistic
+    probabilities normalized over the classes."""
+
+    def __init__(self, sgd):
+        if sgd.loss != "log_loss":
+            raise UnsupportedModel("only log_loss SGD classifiers are supported")
+        self.coef, self.intercept = _linear_params(sgd)
+
+    def predict_proba(self, X, X32):
+        proba = expit(X @ self.coef.T + self.intercept)
+        total = proba.sum(axis=1)
+        proba[total == 0] = 1.0
+        total[total == 0] = proba.shape[1]
+        return proba / total[:, None]
+
+
+class CompiledCalibratedLinear:
+    """A sigmoid CalibratedClassifierCV over LinearSVC: every fold's margins
+    through its per-class calibrators, averaged over folds."""
+
+    def __init__(self, model):
+        if model.method != "sigmoid":
+            raise UnsupportedModel("only sigmoid calibration is supported")
+        self.n_classes = len(model.classes_)
+        self.folds = []
+        for est, class_idx, a, b in _calibrators(model):
+            if not isinstance(est, LinearSVC):
+                raise UnsupportedModel(f"no compiled form for calibrated {type(est).__name__}")
+            coef, intercept = _linear_params(est)
+            self.folds.append((coef, intercept, (class_idx, a, b)))
+
+    def predict_proba(self, X, X32):
+        return np.mean([_calibrated(X @ coef.T + intercept, [calibrator], self.n_classes)
+                        for coef, intercept, calibrator in self.folds], axis=0)
+
+
+class CompiledPipeline:
+    """A Pipeline of column selectors and to_dense steps ending in a compiled estimator."""
+
+    def __init__(self, pipeline):
+        columns = None
+        for name, step in pipeline.steps[:-1]:
+            if isinstance(step, FunctionTransformer) and step.func is to_dense:
+                continue
+            if not hasattr(step, "get_support"):
+                raise UnsupportedModel(f"no compiled form for pipeline step {name!r}")
+            support = np.flatnonzero(step.get_support())
+            columns = support if columns is None else columns[support]
+        self.columns = columns
+        self.final = _compile_estimator(pipeline.steps[-1][1])
+
+    def predict_proba(self, X, X32):
+        if self.columns is not None:
+            X, X32 = X[:, self.columns], X32[:, self.columns]
+        return self.final.predict_proba(X, X32)
+
+
+# ─── Ensemble + calibration ───────────────────────────────────────────────────
+
+def _compile_estimator(est):
+    if isinstance(est, RandomForestClassifier):
+        return CompiledForest(est)
+    if isinstance(est, GradientBoostingClassifier):
+        return CompiledBoosting(est)
+    if isinstance(est, HistGradientBoostingClassifier):
+        return CompiledHistBoosting(est)
+    if isinstance(est, SVC):
+        return CompiledSVC(est)
+    if isinstance(est, SGDClassifier):
+        return CompiledSGD(est)
+    if isinstance(est, CalibratedClassifierCV):
+        return CompiledCalibratedLinear(est)
+    if isinstance(est, Pipeline):
+        return CompiledPipeline(est)
+    raise UnsupportedModel(f"no compiled form for {type(est).__name__}")
+
+
+def _calibrators(model):
+    """(fitted estimator, class indices, a, b) per calibrated classifier of a
+    sigmoid CalibratedClassifierCV, FrozenEstimator wrappers removed."""
+    result = []
+    for cc in model.calibrated_classifiers_:
+        est = getattr(cc.estimator, "estimator", cc.estimator)
+        result.append((est, np.searchsorted(model.classes_, est.classes_),
+                       np.array([c.a_ for c in cc.calibrators], dtype=np.float64),
+                       np.array([c.b_ for c in cc.calibrators], dtype=np.float64)))
+    return result
+
+
+def _calibrated(scores, calibrators, n_classes):
+    """CalibratedClassifierCV.predict_proba from each calibrated classifier's scores
+    (the columns of its classes): sigmoid per class, normalized, averaged."""
+    mean_proba = np.zeros((scores.shape[0], n_classes))
+    for class_idx, a, b in calibrators:
+        proba = np.zeros((scores.shape[0], n_classes))
+        proba[:, class_idx] = expit(-(a * scores + b))
+        denominator = np.sum(proba, axis=1)[:, np.newaxis]
+        uniform_proba = np.full_like(proba, 1 / n_classes)
+        proba = np.divide(proba, denominator, out=uniform_proba, where=denominator != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        mean_proba += proba
+    mean_proba /= len(calibrators)
+    return mean_proba
+
+
+class CompiledEnsemble:
+    """Drop-in for the calibrated ensemble's predict_proba / classes_."""
+
+    def __init__(self, classes, estimators, weights, calibrators):
+        self.classes_ = classes
+        self.estimators = estimators
+        self.weights = weights
+        self.calibrators = calibrators     # [(class indices, a, b)], one per calibrated classifier
+
+    def predict_proba(self, X):
+        if X.shape[0] > CHUNK_ROWS:
+            return np.vstack([self.predict_proba(X[i:i + CHUNK_ROWS])
+                              for i in range(0, X.shape[0], CHUNK_ROWS)])
+        X = X.toarray() if sp.issparse(X) else np.asarray(X, dtype=np.float64)
+        X32 = X.astype(np.float32)         # trees see the float32 copy, as in sklearn
+        votes = np.average([est.predict_proba(X, X32) for est in self.estimators],
+                           axis=0, weights=self.weights)
+        return _calibrated(votes, self.calibrators, len(self.classes_))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def compile_model(model):
+    """Export a fitted sigmoid-calibrated soft VotingClassifier into a CompiledEnsemble."""
+    if not isinstance(model, CalibratedClassifierCV) or model.method != "sigmoid":
+        raise UnsupportedModel("expected a sigmoid CalibratedClassifierCV")
+    if len(model.classes_) < 3:
+        raise UnsupportedModel("binary calibration is not supported")
+
+    calibrators, voting = [], None
+    for est, class_idx, a, b in _calibrators(model):
+        if voting is not None and est is not voting:
+            raise UnsupportedModel("calibrated classifiers wrap different estimators")
+        voting = est
+        calibrators.append((class_idx, a, b))
+
+    if not isinstance(voting, VotingClassifier) or voting.voting != "soft":
+        raise UnsupportedModel("expected a soft VotingClassifier")
+    for est in voting.estimators_:
+        if len(est.classes_) != len(voting.classes_):
+            raise UnsupportedModel(f"{type(est).__name__} was fitted on a subset of the classes")
+    estimators = [_compile_estimator(est) for est in voting.estimators_]
+    weights = None if voting.weights is None else np.asarray(voting._weights_not_none, dtype=np.float64)
+    return CompiledEnsemble(np.asarray(model.classes_), estimators, weights, calibrators)
+
+
+def parity(compiled, model, X):
+    """Largest absolute predict_proba difference between the compiled and sklearn models on X."""
+    return float(np.max(np.abs(compiled.predict_proba(X) - model.predict_proba(X))))
@@ -0,0 +1,284 @@
+"""
+Streaming corpus preparation for train_model.
+
+prepare() turns a dataset.DatasetSource into the TF-IDF training matrix in two
+passes over chunks, so the raw and preprocessed texts are never all in memory:
+
+  1. stream     each chunk is preprocessed, its n-grams (from the vectorizer's
+                own analyzer) are counted into corpus-wide term and document
+                frequencies, and the preprocessed rows are spilled to a
+                temporary file
+  2. transform  vocabulary_ and idf_ are chosen from those counts the way
+                TfidfVectorizer.fit does (alphabetical columns, the same
+                max_features cut and min_df/max_df bounds, the same idf
+                arithmetic), then the spilled rows are transformed chunk by
+                chunk into the CSR matrix
+
+What stays resident is the n-gram count table, one chunk, the labels and the
+output matrix. For the same documents the fitted vectorizer equals
+TfidfVectorizer.fit's. The count table grows with the number of distinct
+n-grams; past max_terms entries the rarest are pruned, which bounds it at the
+cost of a possibly different vocabulary (reported as pruned_terms).
+
+Chunks of at least PARALLEL_MIN_ROWS rows are preprocessed in a process pool
+(PREPROCESS_N_JOBS workers, two chunks in flight). load() puts a
+feature_cache.FeatureCache in front of all of this.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from itertools import islice
+from numbers import Integral
+
+import numpy as np
+import scipy.sparse as sp
+
+from feature_cache import LABELS_FILE, TOKENS_FILE, TokenSource
+from training import TRAIN_N_JOBS
+
+CORPUS_MAX_TERMS = int(os.environ.get("CORPUS_MAX_TERMS", 5_000_000))
+# Worker processes for preprocess_text on large chunks; 1 preprocesses inline
+PREPROCESS_N_JOBS = int(os.environ.get("PREPROCESS_N_JOBS", TRAIN_N_JOBS))
+PARALLEL_MIN_ROWS = 2000        # smaller chunks are not worth shipping to a pool
+CHUNKS_IN_FLIGHT = 2
+
+
+class NgramCounts:
+    """Corpus-wide term and document frequencies of a vectorizer's analyzer output."""
+
+    def __init__(self, analyzer, max_terms=CORPUS_MAX_TERMS):
+        self.analyze = analyzer
+        self.max_terms = max_terms
+        self.term_counts = Counter()     # insertion order = first appearance, as in sklearn's vocabulary
+        self.doc_counts = Counter()
+        self.n_docs = 0
+        self.pruned_terms = 0
+
+    def add(self, docs):
+        term_counts, doc_counts, analyze = self.term_counts, self.doc_counts, self.analyze
+        for doc in docs:
+            features = analyze(doc)
+            term_counts.update(features)
+            doc_counts.update(set(features))
+        self.n_docs += len(docs)
+        if len(term_counts) > self.max_terms:
+            self._prune()
+
+    def _prune(self):
+        """Drop the rarest terms (total count 1, then 2, ...) until half the budget is free."""
+        floor = 1
+        while len(self.term_counts) > self.max_terms // 2:
+            rare = [term for term, count in self.term_counts.items() if count <= floor]
+            for term in rare:
+                del self.term_counts[term]
+                del self.doc_counts[term]
+            self.pruned_terms += len(rare)
+            floor += 1
+
+
+def fit_vocabulary(vectorizer, counts):
+    """Set vocabulary_ and idf_ on an unfitted TfidfVectorizer from NgramCounts,
+    replicating CountVectorizer._limit_features and TfidfTransformer.fit."""
+    p = vectorizer.get_params()
+    if p["vocabulary"] is not None or not p["use_idf"]:
+        raise ValueError("streaming fit needs a learned vocabulary and use_idf=True")
+    n_docs = counts.n_docs
+    high = p["max_df"] if isinstance(p["max_df"], Integral) else p["max_df"] * n_docs
+    low = p["min_df"] if isinstance(p["min_df"], Integral) else p["min_df"] * n_docs
+    if high < low:
+        raise ValueError("max_df corresponds to < documents than min_df")
+
+    terms = sorted(counts.term_counts)
+    dfs = np.array([counts.doc_counts[t] for t in terms], dtype=np.int64)
+    mask = (dfs <= high) & (dfs >= low)
+    limit = p["max_features"]
+    if limit is not None and mask.sum() > limit:
+        # Same dtype and argsort call as sklearn, so ties are broken identically
+        tfs = np.array([counts.term_counts[t] for t in terms], dtype=p["dtype"])
+        mask_inds = (-tfs[mask]).argsort()[:limit]
+        new_mask = np.zeros(len(dfs), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+    kept = np.where(mask)[0]
+    if len(kept) == 0:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+    column = np.cumsum(mask) - 1
+    position = {terms[i]: i for i in kept}
+    vectorizer.vocabulary_ = {t: column[position[t]] for t in counts.term_counts if t in position}
+
+    df = dfs[kept].astype(p["dtype"])
+    df += float(p["smooth_idf"])
+    idf = np.full_like(df, fill_value=n_docs + int(p["smooth_idf"]), dtype=p["dtype"])
+    idf /= df
+    np.log(idf, out=idf)
+    idf += 1.0
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def _read_chunks(f, chunk_rows):
+    while True:
+        lines = list(islice(f, chunk_rows))
+        if not lines:
+            return
+        yield [line[:-1] for line in lines]
+
+
+def preprocessed_chunks(chunks, preprocess, n_jobs=PREPROCESS_N_JOBS):
+    """Yield (preprocessed texts, labels) per chunk, in order. The pool is only
+    started for a chunk of PARALLEL_MIN_ROWS or more; at most CHUNKS_IN_FLIGHT
+    chunks are held, so memory stays bounded however fast the source reads."""
+    if preprocess is None:
+        yield from chunks
+        return
+    pool = None
+    pending = deque()
+    try:
+        for texts, labels in chunks:
+            if n_jobs > 1 and len(texts) >= PARALLEL_MIN_ROWS:
+                if pool is None:
+                    pool = multiprocessing.Pool(n_jobs)
+                result = pool.map_async(preprocess, texts, chunksize=max(1, len(texts) // (4 * n_jobs)))
+                pending.append((result.get, labels))
+            else:
+                processed = [preprocess(t) for t in texts]
+                pending.append((lambda processed=processed: processed, labels))
+            while len(pending) >= CHUNKS_IN_FLIGHT:
+                get, labels = pending.popleft()
+                yield get(), labels
+        while pending:
+            get, labels = pending.popleft()
+            yield get(), labels
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+class StreamedCorpus:
+    """Pass 1 of prepare(): the n-gram counts, the labels and the spilled
+    preprocessed rows of a source, ready for fit_transform()."""
+
+    def __init__(self, source, vectorizer, preprocess, max_terms=CORPUS_MAX_TERMS,
+                 n_jobs=PREPROCESS_N_JOBS, spill_path=None):
+        """preprocess=None takes the source's texts as already preprocessed;
+        spill_path keeps the preprocessed rows in that file instead of a temporary one."""
+        self.source = source
+        self.vectorizer = vectorizer
+        self.counts = NgramCounts(vectorizer.build_analyzer(), max_terms)
+        self.labels = []
+        self.spill = (open(spill_path, "w+", encoding="utf-8") if spill_path
+                      else tempfile.TemporaryFile("w+", encoding="utf-8"))
+        started = time.perf_counter()
+        try:
+            for processed, labels in preprocessed_chunks(source.chunks(), preprocess, n_jobs):
+                self.counts.add(processed)
+                self.labels.extend(labels)
+                self.spill.writelines(f"{text}\n" for text in processed)
+            if not self.labels:
+                raise ValueError(f"{source.name}: no valid training records ({source.describe()})")
+            self.spill.flush()
+        except BaseException:
+            self.spill.close()
+            raise
+        self.stats = {
+            **source.describe(),
+            "unknown_labels": dict(source.unknown_labels.most_common(10)),
+            "chunk_rows": source.chunk_rows,
+            "stream_seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def write_labels(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{label}\n" for label in self.labels)
+
+    def fit_transform(self):
+        """Pass 2: fit the vectorizer from the counts, then transform the spilled rows.
+        Returns (X, y); X equals vectorizer.transform() of the whole corpus."""
+        started = time.perf_counter()
+        fit_vocabulary(self.vectorizer, self.counts)
+        self.stats["ngrams_seen"] = len(self.counts.term_counts)
+        self.stats["pruned_terms"] = self.counts.pruned_terms
+        self.counts = None
+        with self.spill:
+            self.spill.seek(0)
+            blocks = [self.vectorizer.transform(chunk) for chunk in _read_chunks(self.spill, self.source.chunk_rows)]
+        X = sp.vstack(blocks, format="csr") if len(blocks) > 1 else blocks[0]
+        y = np.array(self.labels)
+        self.labels = None
+        self.stats["transform_seconds"] = round(time.perf_counter() - started, 3)
+        seconds = self.stats["stream_seconds"] + self.stats["transform_seconds"]
+        self.stats["records_per_second"] = round(len(y) / seconds, 1) if seconds else None
+        return X, y
+
+
+def prepare(source, vectorizer, preprocess, max_terms=CORPUS_MAX_TERMS):
+    """Stream source through preprocess, fit vectorizer and build the matrix.
+    Returns (X, y, stats)."""
+    corpus = StreamedCorpus(source, vectorizer, preprocess, max_terms)
+    X, y = corpus.fit_transform()
+    return X, y, corpus.stats
+
+
+def load(source, vectorizer, preprocess, preprocessing, cache=None, n_jobs=PREPROCESS_N_JOBS, stage=None):
+    """(X, y, vectorizer, stats) for source, through cache when one is given:
+
+      features hit  the stored vectorizer, X and y are loaded; nothing is
+                    preprocessed or fitted (the passed vectorizer is unused)
+      tokens hit    the stored preprocessed rows are replayed into a fresh fit
+      miss          source is streamed and preprocessed and both entries stored
+
+    preprocessing is preprocess's fingerprint (part of the key); stage, e.g.
+    StageProfiler.stage, wraps each step for timing."""
+    stage = stage or (lambda name: nullcontext())
+    if cache is None:
+        with stage("load + preprocess (streamed)"):
+            corpus = StreamedCorpus(source, vectorizer, preprocess, n_jobs=n_jobs)
+        with stage("tfidf_fit"):
+            X, y = corpus.fit_transform()
+        return X, y, vectorizer, {**corpus.stats, "cache": "off"}
+
+    started = time.perf_counter()
+    with stage("feature cache lookup"):
+        dataset_fingerprint = source.fingerprint()
+        tokens_key = cache.tokens_key(dataset_fingerprint, preprocessing)
+        features_key = cache.features_key(tokens_key, vectorizer)
+        hit = cache.load_features(features_key)
+    lookup_seconds = round(time.perf_counter() - started, 3)
+    if hit is not None:
+        vectorizer, X, y, meta = hit
+        return X, y, vectorizer, {**meta["stats"], "cache": "features", "cache_key": features_key,
+                                  "cache_load_seconds": lookup_seconds}
+
+    tokens = cache.lookup("tokens", tokens_key)
+    if tokens is not None:
+        status = "tokens"
+        with stage("load cached tokens"):
+            corpus = StreamedCorpus(TokenSource(tokens, source.chunk_rows, cache.meta(tokens)), vectorizer, None)
+    else:
+        status = "miss"
+        meta = {"dataset": dataset_fingerprint, "preprocessing": preprocessing}
+        with stage("load + preprocess (streamed)"), cache.entry("tokens", tokens_key, meta) as tmp:
+            corpus = StreamedCorpus(source, vectorizer, preprocess, n_jobs=n_jobs,
+                                    spill_path=os.path.join(tmp, TOKENS_FILE))
+            corpus.write_labels(os.path.join(tmp, LABELS_FILE))
+            meta["stats"] = corpus.stats
+    with stage("tfidf_fit"):
+        X, y = corpus.fit_transform()
+    stats = {**corpus.stats, "cache": status, "cache_key": features_key, "cache_lookup_seconds": lookup_seconds}
+    with stage("feature cache store"):
+        cache.store_features(features_key, vectorizer, X, y, {"stats": stats, "tokens_key": tokens_key})
+    return X, y, vectorizer, stats
+
+
+def cache_state(source, vectorizer, preprocessing, cache):
+    """What load() would reuse from cache right now: 'features', 'tokens' or 'miss'."""
+    tokens_key = cache.tokens_key(source.fingerprint(), preprocessing)
+    if cache.lookup("features", cache.features_key(tokens_key, vectorizer)) is not None:
+        return "features"
+    return "tokens" if cache.lookup("tokens", tokens_key) is not None else "miss"
@@ -3,8 +3,32 @@ Comprehensive symptom-to-disease training dataset.
 ~40+ diseases across cardiovascular, respiratory, dermatological, neurological,
 gastrointestinal, musculoskeletal, endocrine, and infectious disease categories.
 800+ realistic clinical vignettes with demographic/context variations.
+
+Training can also read external corpora (de-identified notes) through the
+dataset sources at the end of this module: each streams (text, label) records
+from CSV, JSONL or Parquet in chunks of bounded size and validates labels
+against get_disease_info(). open_source() picks one from the TRAINING_DATA
+path, or the built-in vignettes when it is unset.
 """
 
+import csv
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+
+# CSV/JSONL/Parquet file (optionally .gz for CSV/JSONL) to train on; unset = the built-in vignettes
+TRAINING_DATA = os.environ.get("TRAINING_DATA")
+TRAINING_TEXT_COLUMN = os.environ.get("TRAINING_TEXT_COLUMN", "symptoms")
+TRAINING_LABEL_COLUMN = os.environ.get("TRAINING_LABEL_COLUMN", "disease")
+# Records with a label outside get_disease_info(): "skip" (counted) or "error"
+TRAINING_LABEL_POLICY = os.environ.get("TRAINING_LABEL_POLICY", "skip")
+DATASET_CHUNK_ROWS = int(os.environ.get("DATASET_CHUNK_ROWS", 10000))
+
+# DatasetSource.state() -> fingerprint, so a process hashes each version of a file once
+_FINGERPRINTS = {}
+
 
 def get_training_data():
     """Return (texts, labels) for training the symptom classifier."""
@@ -581,3 +605,180 @@ def get_disease_info():
             "seek_care": "See a hepatologist or gastroenterologist"
         },
     }
+
+
+# ─── Streaming dataset sources ───────────────────────────────────────────────
+
+class InvalidLabel(ValueError):
+    pass
+
+
+class DatasetSource:
+    """Streams validated (texts, labels) chunks. Subclasses implement _records(),
+    a generator of raw (text, label) pairs; nothing else is held in memory."""
+
+    name = "source"
+
+    def __init__(self, chunk_rows=DATASET_CHUNK_ROWS, label_policy=TRAINING_LABEL_POLICY):
+        if label_policy not in ("skip", "error"):
+            raise ValueError(f"label_policy must be 'skip' or 'error', not {label_policy!r}")
+        self.chunk_rows = max(1, chunk_rows)
+        self.label_policy = label_policy
+        # Labels match case- and whitespace-insensitively and are returned in canonical form
+        self.labels = {name.casefold(): name for name in get_disease_info()}
+        self._fingerprint = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"records": 0, "skipped_empty": 0, "skipped_label": 0}
+        self.unknown_labels = Counter()
+
+    def _records(self):
+        raise NotImplementedError
+
+    def chunks(self):
+        """Yield (texts, labels) lists of at most chunk_rows valid records."""
+        self.reset_stats()
+        texts, labels = [], []
+        for text, raw_label in self._records():
+            label = self.labels.get(str(raw_label).strip().casefold())
+            if label is None:
+                if self.label_policy == "error":
+                    raise InvalidLabel(f"{self.name}: unknown label {raw_label!r}")
+                self.stats["skipped_label"] += 1
+                self.unknown_labels[str(raw_label)] += 1
+                continue
+            if not text or not str(text).strip():
+                self.stats["skipped_empty"] += 1
+                continue
+            texts.append(str(text))
+            labels.append(label)
+            self.stats["records"] += 1
+            if len(texts) == self.chunk_rows:
+                yield texts, labels
+                texts, labels = [], []
+        if texts:
+            yield texts, labels
+
+    def describe(self):
+        return {"source": self.name, **self.stats}
+
+    def fingerprint(self):
+        """Hash of the raw contents plus everything chunks() depends on (columns,
+        label policy, known labels); chunk size does not change the records.
+        Computed once per process for each state()."""
+        if self._fingerprint is None:
+            state = self.state()
+            key = json.dumps(state) if state is not None else None
+            self._fingerprint = _FINGERPRINTS.get(key)
+            if self._fingerprint is None:
+                h = hashlib.sha256(repr((type(self).__name__, self._settings(), self.label_policy,
+                                         sorted(self.labels.values()))).encode())
+                self._hash_contents(h)
+                self._fingerprint = h.hexdigest()
+                if key is not None:
+                    _FINGERPRINTS[key] = self._fingerprint
+        return self._fingerprint
+
+    def state(self):
+        """A cheap JSON-friendly stand-in for what fingerprint() hashes, taken to mean
+        the same fingerprint whenever it is equal; None when only hashing can tell."""
+        return None
+
+    def _settings(self):
+        return ()
+
+    def _hash_contents(self, h):
+        for record in self._records():
+            h.update(repr(record).encode())
+
+
+class BuiltinSource(DatasetSource):
+    name = "builtin"
+
+    def _records(self):
+        return zip(*get_training_data())
+
+
+class FileSource(DatasetSource):
+    def __init__(self, path, text_column=TRAINING_TEXT_COLUMN, label_column=TRAINING_LABEL_COLUMN, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.text_column = text_column
+        self.label_column = label_column
+
+    def _settings(self):
+        return (self.text_column, self.label_column)
+
+    def state(self):
+        """Reader settings, labels and the file's path, size and mtime_ns (as make
+        or rsync judge a file unchanged)."""
+        st = os.stat(self.path)
+        labels = hashlib.sha256(repr(sorted(self.labels.values())).encode()).hexdigest()[:16]
+        return [type(self).__name__, *self._settings(), self.label_policy, labels,
+                os.path.abspath(self.path), st.st_size, st.st_mtime_ns]
+
+    def _hash_contents(self, h):
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+
+    def _open(self):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, "rt", encoding="utf-8", newline="")
+        return open(self.path, encoding="utf-8", newline="")
+
+
+class CSVSource(FileSource):
+    def _records(self):
+        with self._open() as f:
+            reader = csv.DictReader(f)
+            missing = {self.text_column, self.label_column} - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"{self.name}: missing column(s) {sorted(missing)}")
+            for row in reader:
+                yield row[self.text_column], row[self.label_column]
+
+
+class JSONLSource(FileSource):
+    def _records(self):
+        with self._open() as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"{self.name}:{lineno}:{exc.colno}: invalid JSON: {exc.msg}") from exc
+                if not isinstance(record, dict):
+                    raise ValueError(f"{self.name}:{lineno}: expected a JSON object, got {type(record).__name__}")
+                yield record.get(self.text_column), record.get(self.label_column)
+
+
+class ParquetSource(FileSource):
+    """Reads row-group batches of the two columns only; needs the optional pyarrow package."""
+
+    def _records(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("Parquet training data needs pyarrow (pip install pyarrow)") from exc
+        columns = [self.text_column, self.label_column]
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=self.chunk_rows, columns=columns):
+            yield from zip(batch.column(0).to_pylist(), batch.column(1).to_pylist())
+
+
+SOURCE_TYPES = {".csv": CSVSource, ".jsonl": JSONLSource, ".ndjson": JSONLSource, ".parquet": ParquetSource}
+
+
+def open_source(path=TRAINING_DATA, **kwargs):
+    """The dataset source for a CSV/JSONL/Parquet path (by extension), or the built-in vignettes."""
+    if not path:
+        return BuiltinSource(**{k: v for k, v in kwargs.items() if k not in ("text_column", "label_column")})
+    stem = path[:-3] if path.endswith(".gz") else path
+    source_type = SOURCE_TYPES.get(os.path.splitext(stem)[1].lower())
+    if source_type is None or (source_type is ParquetSource and stem != path):
+        raise ValueError(f"Unsupported training data file {path!r}; expected one of "
+                         f"{', '.join(SOURCE_TYPES)} (CSV/JSONL may be gzipped)")
+    return source_type(path, **kwargs)
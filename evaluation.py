@@ -0,0 +1,223 @@
+"""
+Cross-validated evaluation for train_model.
+
+The holdout metrics come from one stratified 80/20 split; with ~260 vignettes
+over 46 diseases some categories of the bias report have only a few test
+samples. cross_validate() runs repeated stratified k-fold over the already
+vectorized corpus (the matrix train_model gets from the feature cache) and
+fits every fold the way train_model fits its evaluation model: all folds' base
+estimators share one process pool (training.fit_ensembles), then each fold is
+sigmoid-calibrated (training.calibrate_all) and scored on its held-out rows.
+
+Every metric, and the per-category accuracy of the bias report, is reported
+as the mean and standard deviation over folds, its value on the pooled
+out-of-fold predictions, and a percentile bootstrap confidence interval
+around that pooled value, drawn by resampling vignettes (each resampled
+vignette brings its prediction from every repeat). Weighted F1/precision are
+not averages of per-row terms, so their fold mean sits below the pooled
+value on small folds. Folds and bootstrap replicates are scored with one weighted-sum
+formulation over per-prediction indicators, so a replicate costs a few matrix
+products instead of a pass through sklearn.metrics.
+
+As with the holdout split, the TF-IDF vocabulary and idf are fitted on the
+whole corpus before it is split.
+"""
+
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.model_selection import RepeatedStratifiedKFold
+
+from ranking import true_label_ranks
+from training import TRAIN_N_JOBS, calibrate_all, fit_ensembles
+
+# "cv" makes train_model add cross_validate() to the holdout evaluation
+EVALUATION_MODE = os.environ.get("EVALUATION_MODE", "holdout")
+CV_FOLDS = int(os.environ.get("CV_FOLDS", 5))
+CV_REPEATS = int(os.environ.get("CV_REPEATS", 1))
+BOOTSTRAP_SAMPLES = int(os.environ.get("BOOTSTRAP_SAMPLES", 2000))
+CV_CONFIDENCE = float(os.environ.get("CV_CONFIDENCE", 0.95))
+RANK_K = 5
+BOOTSTRAP_BLOCK = 1 << 22       # weight-matrix entries per block of bootstrap replicates
+
+METRICS = ("m1_accuracy", "f1_score", "precision", "recall", "ndcg", "top5_accuracy", "mrr")
+
+
+def fold_splits(y, folds=CV_FOLDS, repeats=CV_REPEATS, seed=42):
+    """(train, test) index pairs of repeated stratified k-fold, repeat-major.
+    Folds are capped at the smallest class size so every training fold holds
+    every class."""
+    smallest = np.unique(y, return_counts=True)[1].min()
+    folds = max(2, min(folds, int(smallest)))
+    splitter = RepeatedStratifiedKFold(n_splits=folds, n_repeats=repeats, random_state=seed)
+    return folds, list(splitter.split(np.zeros(len(y)), y))
+
+
+class Predictions:
+    """Per-prediction indicators of out-of-fold results, one row per
+    (repeat, vignette), from which any weighting of the rows is scored.
+    keep_proba also keeps each fold's predict_proba matrix (``probas``)."""
+
+    def __init__(self, y, categories, classes, k=RANK_K, keep_proba=False):
+        self.n = len(y)
+        self.classes = np.asarray(classes)
+        self.category_names = sorted(set(categories.get(label, "Other") for label in y))
+        self.y = np.asarray(y)
+        self.label_index = np.searchsorted(self.classes, self.y)
+        category_index = {name: i for i, name in enumerate(self.category_names)}
+        self.category = np.array([category_index[categories.get(label, "Other")] for label in y])
+        self.k = k
+        self.parts = []
+        self.probas = [] if keep_proba else None
+
+    def add(self, test, proba):
+        """Record one fold's predict_proba rows for vignettes ``test``."""
+        predicted = proba.argmax(axis=1)        # CalibratedClassifierCV.predict
+        ranks = true_label_ranks(self.y[test], proba, self.classes)
+        self.parts.append((np.asarray(test), predicted, ranks))
+        if self.probas is not None:
+            self.probas.append(proba)
+
+    def finish(self):
+        rows = np.concatenate([test for test, _, _ in self.parts])
+        predicted = np.concatenate([p for _, p, _ in self.parts])
+        ranks = np.concatenate([r for _, _, r in self.parts])
+        self.rows = rows
+        n_rows, n_classes = len(rows), len(self.classes)
+        true = self.label_index[rows]
+        ones = np.ones(n_rows)
+        self.correct = (predicted == true).astype(float)
+        self.gain = np.where(ranks < self.k, 1.0 / np.log2(ranks + 2), 0.0)
+        self.top_k = (ranks < self.k).astype(float)
+        self.rr = 1.0 / (ranks + 1)
+        self.true_onehot = sp.csr_matrix((ones, (np.arange(n_rows), true)), shape=(n_rows, n_classes))
+        self.pred_onehot = sp.csr_matrix((ones, (np.arange(n_rows), predicted)), shape=(n_rows, n_classes))
+        self.hit_onehot = self.true_onehot.multiply(self.correct[:, None]).tocsr()
+        self.category_onehot = sp.csr_matrix(
+            (ones, (np.arange(n_rows), self.category[rows])), shape=(n_rows, len(self.category_names)))
+        return self
+
+    def score(self, W):
+        """Metrics for each row of the (replicates x predictions) weight matrix W."""
+        total = W.sum(axis=1)
+        tp = (self.hit_onehot.T @ W.T).T
+        predicted = (self.pred_onehot.T @ W.T).T
+        support = (self.true_onehot.T @ W.T).T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(predicted > 0, tp / predicted, 0.0)
+            recall = np.where(support > 0, tp / support, 0.0)
+            f1 = np.where(predicted + support > 0, 2 * tp / (predicted + support), 0.0)
+            weights = support / support.sum(axis=1, keepdims=True)
+            category_total = (self.category_onehot.T @ W.T).T
+            category_correct = (self.category_onehot.T @ (W * self.correct).T).T
+            category_accuracy = np.where(category_total > 0, category_correct / category_total, np.nan)
+        return {
+            "m1_accuracy": W @ self.correct / total,
+            "f1_score": (f1 * weights).sum(axis=1),
+            "precision": (precision * weights).sum(axis=1),
+            "recall": (recall * weights).sum(axis=1),
+            "ndcg": W @ self.gain / total,
+            "top5_accuracy": W @ self.top_k / total,
+            "mrr": W @ self.rr / total,
+        }, category_accuracy, category_total
+
+    def fold_weights(self):
+        """One indicator row per fold over the predictions."""
+        W = np.zeros((len(self.parts), len(self.rows)))
+        start = 0
+        for i, (test, _, _) in enumerate(self.parts):
+            W[i, start:start + len(test)] = 1.0
+            start += len(test)
+        return W
+
+    def bootstrap(self, samples, seed=42):
+        """Yield weight-matrix blocks of ``samples`` replicates in total. Each
+        replicate resamples the vignettes with replacement; a vignette's weight
+        applies to all of its predictions."""
+        rng = np.random.default_rng(seed)
+        block = max(1, BOOTSTRAP_BLOCK // len(self.rows))
+        for start in range(0, samples, block):
+            b = min(block, samples - start)
+            draws = rng.integers(0, self.n, size=(b, self.n)) + (np.arange(b) * self.n)[:, None]
+            counts = np.bincount(draws.ravel(), minlength=b * self.n).reshape(b, self.n)
+            yield counts[:, self.rows].astype(float)
+
+
+def _interval(values, confidence):
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(values, [tail, 100 - tail])
+    return [round(float(low), 4), round(float(high), 4)]
+
+
+def cross_validate(template, X, y, categories, folds=CV_FOLDS, repeats=CV_REPEATS, n_jobs=None,
+                   bootstrap_samples=BOOTSTRAP_SAMPLES, confidence=CV_CONFIDENCE, seed=42, keep_proba=False):
+    """Repeated stratified k-fold of ``template`` (an unfitted VotingClassifier)
+    on the vectorized corpus. ``categories`` maps disease -> category for the
+    bias breakdown. Returns (summary, predictions): the JSON-friendly summary
+    stored in the training metrics and the out-of-fold Predictions."""
+    n_jobs = n_jobs or TRAIN_N_JOBS
+    y = np.asarray(y)
+    folds, splits = fold_splits(y, folds, repeats, seed)
+
+    started = time.perf_counter()
+    datasets = [(X[train], y[train]) for train, _ in splits]
+    ensembles, fit_timings = fit_ensembles(template, datasets, n_jobs=n_jobs)
+    calibrated, calibration_timings = calibrate_all(
+        [(model, X_train, y_train) for model, (X_train, y_train) in zip(ensembles, datasets)], n_jobs=n_jobs)
+    fit_wall = time.perf_counter() - started
+
+    predictions = Predictions(y, categories, calibrated[0].classes_, keep_proba=keep_proba)
+    for model, (_, test) in zip(calibrated, splits):
+        predictions.add(test, model.predict_proba(X[test]))
+    predictions.finish()
+
+    scoring_started = time.perf_counter()
+    fold_scores, fold_category, fold_category_total = predictions.score(predictions.fold_weights())
+    pooled, pooled_category, _ = predictions.score(np.ones((1, len(predictions.rows))))
+    replicates = {name: [] for name in METRICS}
+    replicate_category = []
+    for W in predictions.bootstrap(bootstrap_samples, seed):
+        scores, category_accuracy, _ = predictions.score(W)
+        for name in METRICS:
+            replicates[name].append(scores[name])
+        replicate_category.append(category_accuracy)
+    replicates = {name: np.concatenate(values) for name, values in replicates.items()}
+    replicate_category = np.vstack(replicate_category)
+
+    summary = {}
+    for name in METRICS:
+        summary[name] = {
+            "mean": round(float(fold_scores[name].mean()), 4),
+            "std": round(float(fold_scores[name].std(ddof=1)), 4) if len(splits) > 1 else 0.0,
+            "pooled": round(float(pooled[name][0]), 4),
+            "ci": _interval(replicates[name], confidence),
+        }
+    bias_report = {}
+    for i, category in enumerate(predictions.category_names):
+        accuracy = fold_category[:, i]
+        bias_report[category] = {
+            "accuracy": round(float(np.nanmean(accuracy)), 4),
+            "std": round(float(np.nanstd(accuracy, ddof=1)), 4) if np.isfinite(accuracy).sum() > 1 else 0.0,
+            "pooled": round(float(pooled_category[0, i]), 4),
+            "ci": _interval(replicate_category[:, i], confidence),
+            "samples": int(np.count_nonzero(predictions.category == i)),
+            "samples_per_fold": round(float(fold_category_total[:, i].mean()), 1),
+        }
+
+    fit_serial = sum(t["seconds"] for t in fit_timings + calibration_timings)
+    return {
+        "folds": folds,
+        "repeats": repeats,
+        "fits": len(splits),
+        "bootstrap_samples": bootstrap_samples,
+        "confidence": confidence,
+        "metrics": summary,
+        "bias_report": bias_report,
+        "n_jobs": n_jobs,
+        "fit_wall_seconds": round(fit_wall, 3),
+        "fit_serial_seconds": round(fit_serial, 3),
+        "speedup": round(fit_serial / fit_wall, 2) if fit_wall else None,
+        "scoring_seconds": round(time.perf_counter() - scoring_started, 3),
+    }, predictions
@@ -0,0 +1,149 @@
+"""
+On-disk, content-addressed cache of training features.
+
+Two levels, each entry a directory named by a hash of what produced it:
+
+  tokens-<key>    the preprocessed strings (one per line) and labels of a
+                  corpus, keyed by the dataset fingerprint (raw contents,
+                  columns, label policy) and the preprocessing fingerprint
+                  (backend, stopwords, NLTK/WordNet versions)
+  features-<key>  the fitted vectorizer (joblib), its matrix (X.npz) and the
+                  labels (y.npy), keyed by the tokens key, the vectorizer's
+                  parameters and the scikit-learn version
+
+Retraining on unchanged data (e.g. a sweep over the estimators) loads a
+features entry and skips preprocessing and TF-IDF entirely; changing only the
+vectorizer reuses the tokens entry and refits from it. Entries are written to
+a temporary directory and renamed into place, so a concurrent trainer never
+reads a partial one, and all but the FEATURE_CACHE_KEEP most recently used of
+each kind are removed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+import sklearn
+
+FEATURE_CACHE_DIR = os.environ.get(
+    "FEATURE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".feature_cache"))
+# "0" disables the cache: every train_model run preprocesses and fits from scratch
+FEATURE_CACHE = os.environ.get("FEATURE_CACHE", "1") != "0"
+FEATURE_CACHE_KEEP = max(1, int(os.environ.get("FEATURE_CACHE_KEEP", 8)))
+
+TOKENS_FILE = "tokens.txt"
+LABELS_FILE = "labels.txt"
+META_FILE = "meta.json"
+
+
+def digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+class FeatureCache:
+    def __init__(self, directory=FEATURE_CACHE_DIR, keep=FEATURE_CACHE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    @staticmethod
+    def tokens_key(source_fingerprint, preprocessing):
+        return digest("tokens", source_fingerprint, preprocessing)
+
+    @staticmethod
+    def features_key(tokens_key, vectorizer):
+        return digest("features", tokens_key, vectorizer.get_params(), sklearn.__version__)
+
+    def path(self, kind, key):
+        return os.path.join(self.directory, f"{kind}-{key}")
+
+    def lookup(self, kind, key):
+        """The entry's directory if it exists (marking it recently used), else None."""
+        path = self.path(kind, key)
+        if not os.path.isfile(os.path.join(path, META_FILE)):
+            return None
+        os.utime(path)
+        return path
+
+    def meta(self, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+
+    @contextmanager
+    def entry(self, kind, key, meta):
+        """Yield a temporary directory to fill; it becomes the entry on success."""
+        final = self.path(kind, key)
+        tmp = f"{final}.{os.getpid()}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            yield tmp
+            with open(os.path.join(tmp, META_FILE), "w") as f:
+                json.dump({**meta, "created": time.time()}, f, default=str)
+            try:
+                os.rename(tmp, final)
+            except OSError:     # another trainer stored the same entry first
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.prune(kind)
+
+    def load_features(self, key):
+        """(vectorizer, X, y, meta) for a features entry, or None."""
+        path = self.lookup("features", key)
+        if path is None:
+            return None
+        vectorizer = joblib.load(os.path.join(path, "vectorizer.joblib"))
+        X = sp.load_npz(os.path.join(path, "X.npz"))
+        y = np.load(os.path.join(path, "y.npy"))
+        return vectorizer, X, y, self.meta(path)
+
+    def store_features(self, key, vectorizer, X, y, meta):
+        with self.entry("features", key, meta) as tmp:
+            joblib.dump(vectorizer, os.path.join(tmp, "vectorizer.joblib"))
+            sp.save_npz(os.path.join(tmp, "X.npz"), X, compressed=False)
+            np.save(os.path.join(tmp, "y.npy"), y, allow_pickle=False)
+
+    def prune(self, kind):
+        """Keep the self.keep most recently used entries of one kind."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith(f"{kind}-") and not n.endswith(".tmp")]
+        except FileNotFoundError:
+            return
+        paths = sorted((os.path.join(self.directory, n) for n in names), key=os.path.getmtime, reverse=True)
+        for path in paths[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class TokenSource:
+    """Replays a tokens entry as a corpus source: chunks of already preprocessed
+    rows and their labels, with the original source's statistics."""
+
+    def __init__(self, path, chunk_rows, meta):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.name = meta["stats"]["source"]
+        self.stats = {k: meta["stats"][k] for k in ("records", "skipped_empty", "skipped_label")}
+        self.unknown_labels = Counter(meta["stats"].get("unknown_labels", {}))
+
+    def chunks(self):
+        with open(os.path.join(self.path, TOKENS_FILE), encoding="utf-8") as tokens, \
+                open(os.path.join(self.path, LABELS_FILE), encoding="utf-8") as labels:
+            texts, chunk_labels = [], []
+            for text, label in zip(tokens, labels):
+                texts.append(text[:-1])
+                chunk_labels.append(label[:-1])
+                if len(texts) == self.chunk_rows:
+                    yield texts, chunk_labels
+                    texts, chunk_labels = [], []
+            if texts:
+                yield texts, chunk_labels
+
+    def describe(self):
+        return {"source": self.name, **self.stats}
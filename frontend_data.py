@@ -0,0 +1,143 @@
+"""
+Builds data.json for the browser engine (ml-engine.js) from dataset.py.
+
+data.json carries the training vignettes and disease info the page shows,
+regenerated from get_training_data() / get_disease_info() so the browser and
+the Python model read the same data, plus a precomputed TF-IDF index in the
+engine's own weighting (augmented term frequency 0.5 + 0.5 * tf / max_tf,
+smoothed IDF, terms in at least two vignettes):
+
+  vocabulary   terms, in column order
+  idf          one weight per column
+  indptr, indices, values
+               the document matrix in CSR form, rows L2-normalized, so a
+               cosine similarity is one sparse dot product divided by the
+               query norm
+
+SymptomMLEngine.initialize loads the index instead of rebuilding it on every
+page load; without it (an older data.json) the engine still builds it itself.
+The stopword list is read from ml-engine.js so the two tokenizers cannot
+drift apart.
+
+    python frontend_data.py            # rewrite data.json
+    python frontend_data.py --check    # exit non-zero if data.json is stale
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+from dataset import get_disease_info, get_training_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_DIR, "data.json")
+ENGINE_PATH = os.path.join(BASE_DIR, "ml-engine.js")
+INDEX_FORMAT = 1        # bump together with INDEX_FORMAT in ml-engine.js
+MIN_DOC_FREQ = 2
+WEIGHT_DIGITS = 6       # rounding of idf and matrix values; keeps data.json compact
+
+
+def engine_stopwords(path=ENGINE_PATH):
+    """The stopword set literal of SymptomMLEngine."""
+    with open(path, encoding="utf-8") as f:
+        match = re.search(r"this\.stopwords = new Set\(\[(.*?)\]\)", f.read(), re.S)
+    if match is None:
+        raise ValueError(f"No stopword list found in {path}")
+    return frozenset(re.findall(r"'([^']*)'", match.group(1)))
+
+
+def tokenize(text, stopwords):
+    """Same tokens as SymptomMLEngine.tokenize."""
+    words = re.sub(r"[^a-z0-9\s]", " ", text.lower()).split()
+    return [w for w in words if len(w) > 1 and w not in stopwords]
+
+
+def build_index(texts, stopwords):
+    """Vocabulary, IDF and the L2-normalized CSR document matrix for texts."""
+    docs = [tokenize(text, stopwords) for text in texts]
+    doc_freq = {}
+    for tokens in docs:
+        for token in dict.fromkeys(tokens):
+            doc_freq[token] = doc_freq.get(token, 0) + 1
+    vocabulary = [term for term, df in doc_freq.items() if df >= MIN_DOC_FREQ]
+    column = {term: j for j, term in enumerate(vocabulary)}
+    n = len(texts)
+    idf = [math.log((n + 1) / (doc_freq[term] + 1)) + 1 for term in vocabulary]
+
+    indptr, indices, values = [0], [], []
+    for tokens in docs:
+        tf = {}
+        for token in tokens:
+            tf[token] = tf.get(token, 0) + 1
+        max_tf = max(tf.values(), default=1)
+        row = sorted((column[t], (0.5 + 0.5 * count / max_tf) * idf[column[t]])
+                     for t, count in tf.items() if t in column)
+        norm = math.sqrt(sum(w * w for _, w in row))
+        indices.extend(j for j, _ in row)
+        values.extend(round(w / norm, WEIGHT_DIGITS) for _, w in row)
+        indptr.append(len(indices))
+
+    return {
+        "format": INDEX_FORMAT,
+        "n_docs": n,
+        "vocabulary": vocabulary,
+        "idf": [round(w, WEIGHT_DIGITS) for w in idf],
+        "indptr": indptr,
+        "indices": indices,
+        "values": values,
+    }
+
+
+def build_data():
+    texts, labels = get_training_data()
+    return {
+        "training_data": [{"symptoms": t, "disease": d} for t, d in zip(texts, labels)],
+        "disease_info": get_disease_info(),
+        "index": build_index(texts, engine_stopwords()),
+    }
+
+
+def render(data):
+    return json.dumps(data, separators=(",", ":"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=DATA_PATH)
+    parser.add_argument("--check", action="store_true", help="compare with --output instead of writing it")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = build_data()
+    content = render(data)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    index = data["index"]
+    index_bytes = len(render(index))
+
+    if args.check:
+        try:
+            with open(args.output, encoding="utf-8") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != content:
+            print(f"{args.output} is out of date; run python frontend_data.py")
+            sys.exit(1)
+        print(f"{args.output} is up to date")
+        return
+
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, args.output)
+    print(f"Wrote {args.output}: {len(data['training_data'])} vignettes, {len(data['disease_info'])} diseases, "
+          f"{len(content):,} bytes ({elapsed_ms:.0f} ms)")
+    print(f"  index: {len(index['vocabulary'])} terms, {len(index['values'])} non-zeros, {index_bytes:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the symptom classifier API.
+
+The app (and with it the trained model) is loaded once in the master and the
+workers are forked from it, so the model's memory is shared copy-on-write.
+Numpy arrays in the joblib artifacts are additionally memory-mapped read-only
+(MODEL_MMAP, see model.py). gc.freeze() moves everything loaded so far out of
+the garbage collector's reach so collections in the workers don't write to
+(and thereby un-share) those pages.
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5050)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+timeout = 120
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
@@ -0,0 +1,162 @@
+"""
+Lightweight in-process metrics used to tune and monitor the serving path.
+
+Histogram is a single fixed-bucket histogram; HistogramVec and CounterVec are
+labelled families of them, rendered in the Prometheus text exposition format
+for /api/metrics. With API_METRICS=0 the families hand out a no-op histogram
+so the predict path skips the bookkeeping (used to measure its overhead).
+"""
+
+import bisect
+import os
+import threading
+
+ENABLED = os.environ.get("API_METRICS", "1") != "0"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style) that is safe to observe from many threads."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q):
+        """Estimate the q-th quantile by linear interpolation inside the matching bucket."""
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if total == 0:
+            return 0.0
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """Cumulative [le, count] bucket pairs plus count, sum and p50/p95/p99 estimates."""
+        with self._lock:
+            counts, total, sum_ = list(self._counts), self._count, self._sum
+        cumulative, running = [], 0
+        for le, c in zip(self.buckets + ("+Inf",), counts):
+            running += c
+            cumulative.append([le, running])
+        return {
+            "buckets": cumulative,
+            "count": total,
+            "sum": round(sum_, 6),
+            "p50": round(self.quantile(0.50), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+        }
+
+    def exposition(self, name, labels="", scale=1.0):
+        """Prometheus _bucket/_sum/_count lines; ``scale`` converts bucket bounds and
+        the sum into the exposed unit (e.g. 0.001 for ms -> seconds)."""
+        with self._lock:
+            counts, total, sum_ = list(self._counts), self._count, self._sum
+        sep = "," if labels else ""
+        lines, running = [], 0
+        for le, c in zip(self.buckets + (None,), counts):
+            running += c
+            bound = "+Inf" if le is None else _number(le * scale)
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {running}')
+        braces = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{braces} {_number(sum_ * scale)}")
+        lines.append(f"{name}_count{braces} {total}")
+        return lines
+
+
+class _NullHistogram:
+    def observe(self, value):
+        pass
+
+
+NULL_HISTOGRAM = _NullHistogram()
+
+
+class HistogramVec:
+    """A family of Histograms with shared buckets, one per combination of label values."""
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        if not ENABLED:
+            return NULL_HISTOGRAM
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            lines += child.exposition(self.name, _labels(self.label_names, values))
+        return lines
+
+
+class CounterVec:
+    """A family of monotonically increasing counters keyed by label values."""
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        if ENABLED:
+            with self._lock:
+                self._values[values] = self._values.get(values, 0) + amount
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, count in items:
+            lines.append(f"{self.name}{{{_labels(self.label_names, values)}}} {_number(count)}")
+        return lines
+
+
+def sample_lines(name, documentation, kind, samples):
+    """Exposition for values computed at scrape time: samples is [(labels dict, value)]."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        rendered = _labels(labels.keys(), labels.values())
+        lines.append(f"{name}{{{rendered}}} {_number(value)}" if rendered else f"{name} {_number(value)}")
+    return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -2,16 +2,24 @@
  * Client-Side ML Engine for SymptomAI
  * Implements TF-IDF + Cosine Similarity for symptom classification
  * entirely in the browser — no backend required.
+ *
+ * data.json ships a precomputed index (built by frontend_data.py); the engine
+ * only rebuilds vocabulary, IDF and document matrix when it is missing.
  */
 
+// Must match INDEX_FORMAT in frontend_data.py
+const INDEX_FORMAT = 1;
+
 class SymptomMLEngine {
     constructor() {
         this.trainingData = [];
         this.diseaseInfo = {};
         this.vocabulary = {};
         this.idf = {};
-        this.tfidfMatrix = [];
+        // Document matrix in CSR form, rows L2-normalized
+        this.docMatrix = { indptr: new Int32Array(1), indices: new Int32Array(0), values: new Float64Array(0) };
         this.ready = false;
+        this.initMs = null;
         this.stopwords = new Set([
             'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you',
             'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his',
@@ -34,20 +42,43 @@ class SymptomMLEngine {
 
     async initialize() {
         try {
+            const start = performance.now();
             const response = await fetch('data.json');
             const data = await response.json();
             this.trainingData = data.training_data;
             this.diseaseInfo = data.disease_info;
-            this._buildVocabulary();
-            this._computeIDF();
-            this._buildTFIDFMatrix();
+            const index = data.index;
+            const precomputed = index && index.format === INDEX_FORMAT && index.n_docs === this.trainingData.length;
+            if (precomputed) {
+                this._loadIndex(index);
+            } else {
+                this._buildVocabulary();
+                this._computeIDF();
+                this._buildTFIDFMatrix();
+            }
             this.ready = true;
-            console.log(`ML Engine ready: ${this.trainingData.length} samples, ${Object.keys(this.vocabulary).length} features`);
+            this.initMs = performance.now() - start;
+            console.log(`ML Engine ready: ${this.trainingData.length} samples, ${Object.keys(this.vocabulary).length} features, ` +
+                `${precomputed ? 'precomputed' : 'rebuilt'} index in ${this.initMs.toFixed(1)} ms`);
         } catch (err) {
             console.error('Failed to initialize ML engine:', err);
         }
     }
 
+    _loadIndex(index) {
+        this.vocabulary = {};
+        this.idf = {};
+        index.vocabulary.forEach((term, j) => {
+            this.vocabulary[term] = j;
+            this.idf[term] = index.idf[j];
+        });
+        this.docMatrix = {
+            indptr: Int32Array.from(index.indptr),
+            indices: Int32Array.from(index.indices),
+            values: Float64Array.from(index.values),
+        };
+    }
+
     tokenize(text) {
         return text.toLowerCase()
             .replace(/[^a-z0-9\s]/g, ' ')
@@ -118,32 +149,43 @@ class SymptomMLEngine {
     }
 
     _buildTFIDFMatrix() {
-        this.tfidfMatrix = this.trainingData.map(item =>
-            this._computeTFIDF(item.symptoms)
-        );
-    }
-
-    _cosineSimilarity(a, b) {
-        let dot = 0, normA = 0, normB = 0;
-        for (let i = 0; i < a.length; i++) {
-            dot += a[i] * b[i];
-            normA += a[i] * a[i];
-            normB += b[i] * b[i];
-        }
-        const denom = Math.sqrt(normA) * Math.sqrt(normB);
-        return denom === 0 ? 0 : dot / denom;
+        const indptr = [0], indices = [], values = [];
+        this.trainingData.forEach(item => {
+            const vec = this._computeTFIDF(item.symptoms);
+            let norm = 0;
+            for (let j = 0; j < vec.length; j++) norm += vec[j] * vec[j];
+            norm = Math.sqrt(norm);
+            for (let j = 0; j < vec.length; j++) {
+                if (vec[j] !== 0) {
+                    indices.push(j);
+                    values.push(vec[j] / norm);
+                }
+            }
+            indptr.push(indices.length);
+        });
+        this.docMatrix = {
+            indptr: Int32Array.from(indptr),
+            indices: Int32Array.from(indices),
+            values: Float64Array.from(values),
+        };
     }
 
     predict(symptoms, topK = 5, age = null, sex = null, medHistory = null) {
         if (!this.ready) return [];
 
         const queryVec = this._computeTFIDF(symptoms, age, sex, medHistory);
-
-        // Compute similarity to all training samples
-        const scores = this.tfidfMatrix.map((vec, i) => ({
-            similarity: this._cosineSimilarity(queryVec, vec),
-            disease: this.trainingData[i].disease,
-        }));
+        let queryNorm = 0;
+        for (let j = 0; j < queryVec.length; j++) queryNorm += queryVec[j] * queryVec[j];
+        queryNorm = Math.sqrt(queryNorm);
+
+        // Cosine similarity to all training samples: rows are unit length, so
+        // one sparse dot product each
+        const { indptr, indices, values } = this.docMatrix;
+        const scores = this.trainingData.map((item, i) => {
+            let dot = 0;
+            for (let p = indptr[i]; p < indptr[i + 1]; p++) dot += queryVec[indices[p]] * values[p];
+            return { similarity: queryNorm === 0 ? 0 : dot / queryNorm, disease: item.disease };
+        });
 
         // Aggregate scores per disease (average of top-K similar samples)
         const diseaseScores = {};
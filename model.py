@@ -10,35 +10,80 @@ ML-Based Symptom Pattern Classification System
 
 import os
 import re
+import json
+import sys
+import time
 import string
+import hashlib
+import platform
+import functools
+import threading
+import subprocess
 import joblib
 import numpy as np
+import scipy
+import sklearn
 from collections import defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import (
     RandomForestClassifier,
     GradientBoostingClassifier,
+    HistGradientBoostingClassifier,
     VotingClassifier,
 )
-from sklearn.svm import SVC
+from sklearn.svm import SVC, LinearSVC
+from sklearn.linear_model import SGDClassifier
 from sklearn.calibration import CalibratedClassifierCV
-try:
-    from sklearn.frozen import FrozenEstimator
-    HAS_FROZEN = True
-except ImportError:
-    HAS_FROZEN = False
+from sklearn.feature_selection import SelectKBest, chi2
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
 
+from cache import PredictionCache
+from metrics import HistogramVec
+from ranking import ranking_metrics
+from training import TRAIN_N_JOBS, calibrate_all, fit_ensembles
+from profiling import StageProfiler, format_profile
+from evaluation import EVALUATION_MODE, cross_validate
+from distill import agreement, distill, single_row_latency_ms
+from compiled import PARITY_TOLERANCE, UnsupportedModel, compile_model, parity, to_dense
+from tfidf import DirectTfidf, identical
+from corpus import cache_state, load as load_corpus
+from feature_cache import FEATURE_CACHE, FeatureCache, digest
+from artifacts import active_version, artifact_paths, manifest_mtime, new_version, publish, version_dir
+
+# NLTK resources are looked up locally first (NLTK_DATA_DIR, then NLTK's default
+# search path) and only missing ones are downloaded. With NLTK_OFFLINE=1 the
+# network is never touched; provision the directory ahead of time with
+#   python -m nltk.downloader -d $NLTK_DATA_DIR punkt_tab stopwords wordnet
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA_DIR")
+NLTK_OFFLINE = os.environ.get("NLTK_OFFLINE", "").lower() in ("1", "true", "yes")
+NLTK_RESOURCES = {
+    "punkt_tab": "tokenizers/punkt_tab/english/",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+# What to do when serving with a different preprocessing backend than training: "warn" or "refuse"
+BACKEND_MISMATCH_POLICY = os.environ.get("PREPROCESSING_MISMATCH", "warn")
+
 try:
     import nltk
     from nltk.corpus import stopwords
     from nltk.tokenize import word_tokenize
     from nltk.stem import WordNetLemmatizer
-    for resource in ["punkt", "punkt_tab", "stopwords", "wordnet"]:
-        nltk.download(resource, quiet=True)
+    if NLTK_DATA_DIR:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    for resource, resource_path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            if NLTK_OFFLINE:
+                raise
+            nltk.download(resource, quiet=True, download_dir=NLTK_DATA_DIR)
     STOP_WORDS = set(stopwords.words("english"))
     LEMMATIZER = WordNetLemmatizer()
+    LEMMATIZER.lemmatize("warmup")   # load WordNet now rather than on the first request
     NLTK_AVAILABLE = True
 except Exception:
     STOP_WORDS = {
@@ -62,14 +107,105 @@ except Exception:
     LEMMATIZER = None
     NLTK_AVAILABLE = False
 
+# Recorded in the training metrics so serving can detect a tokenization mismatch
+PREPROCESSING_BACKEND = "nltk" if NLTK_AVAILABLE else "fallback"
+# Bump whenever preprocess_text's output changes for the same backend and stopwords:
+# it is part of the key of cached preprocessed corpora (feature_cache.py)
+PREPROCESSING_VERSION = 1
+# Bump whenever train_model turns the same features and ensemble into different artifacts
+# (split, calibration, distillation): it is part of the training fingerprint
+TRAINING_PIPELINE_VERSION = 1
+# What a loaded version whose training fingerprint no longer matches (new data, changed
+# hyperparameters, another scikit-learn) does: "warn" only flags it, "refuse" fails the
+# load, "retrain" serves it while a new version trains in the background and is
+# hot-reloaded, but only for changes this server can reproduce (see RETRAIN_NEEDS_CORPUS)
+STALE_MODEL_POLICY = os.environ.get("MODEL_STALE_POLICY", "warn")
+# Changed fingerprint components a server never retrains for on its own: its training
+# data (TRAINING_DATA, else the built-in vignettes) is not the corpus the version was
+# trained on, and a retrain would publish a worse model over it
+RETRAIN_NEEDS_CORPUS = ("dataset", "unstamped")
+# Library drift that does not need a retrain: the load-time parity checks of DirectTfidf
+# and the compiled export already verify the artifacts under the installed versions
+VERIFIED_AT_LOAD = ("python", "numpy", "scipy", "joblib")
+
+# Trained artifacts live in versioned directories published through a manifest (artifacts.py)
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(MODEL_DIR, "trained_model.joblib")
-VECTORIZER_PATH = os.path.join(MODEL_DIR, "tfidf_vectorizer.joblib")
-METRICS_PATH = os.path.join(MODEL_DIR, "training_metrics.joblib")
+TRAINING_LOCK_PATH = os.path.join(MODEL_DIR, ".training.lock")
+# Which ensemble build_ensemble trains: "full" (RF + SVC + GB) or "lite", which replaces
+# SVC's internal 5-fold Platt CV and GB's sequential per-class trees with a calibrated
+# LinearSVC, an SGD logistic model and histogram gradient boosting. Independent of
+# predict(mode="fast"), which answers from the distilled student of either profile
+ENSEMBLE_PROFILE = os.environ.get("ENSEMBLE_PROFILE", "full")
+ENSEMBLE_PROFILES = {
+    "full": "Calibrated Ensemble (RF + SVM + GB)",
+    "lite": "Calibrated Ensemble (Linear SVM + SGD + HistGB)",
+}
+LITE_HGB_FEATURES = 500     # chi2-selected TF-IDF columns given (densely) to HistGradientBoosting
+# Hyperparameters chosen by search.py --apply (for the profile it searched); without
+# the file build_ensemble and build_vectorizer use their built-in settings
+ENSEMBLE_CONFIG_PATH = os.environ.get("ENSEMBLE_CONFIG", os.path.join(MODEL_DIR, "ensemble_config.json"))
+
+# Memory-map numpy arrays inside the (uncompressed) joblib artifacts read-only, so
+# every worker on a host shares one page-cache copy of them.
+ARTIFACT_MMAP = os.environ.get("MODEL_MMAP", "1") != "0"
+# Serve predict_proba from the numpy export of the ensemble (compiled.py) once it
+# has been checked against sklearn at load; "0" keeps the sklearn objects
+COMPILED_INFERENCE = os.environ.get("COMPILED_INFERENCE", "1") != "0"
+# predict_batch groups of more rows than this are scored by the sklearn ensemble, which
+# is cheaper per row on large batches (benchmarks/bench_inference.py --repeat 100, 3 runs
+# on 1 CPU: compiled is 1.2-1.5x faster at 64 rows, 1.0-1.1x at 96, 0.9-1.0x at 128 and
+# 0.7-0.9x at 256); "0" scores every group with the compiled export
+COMPILED_BATCH_MAX_ROWS = int(os.environ.get("COMPILED_BATCH_MAX_ROWS", 64))
+# Vectorize requests with tfidf.DirectTfidf (checked bit-identical at load); "0" keeps TfidfVectorizer
+DIRECT_TFIDF = os.environ.get("DIRECT_TFIDF", "1") != "0"
+WARMUP_ROWS = 32            # rows pushed through a freshly loaded version before it goes live
+# Seconds between checks of the artifact manifest for a newly published version
+# (hot reload without a restart); "0" disables the watcher
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", 5))
+
+# Per-stage latency histograms of the predict path, exported by /api/metrics
+STAGE_BUCKETS_SECONDS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 1024))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 300))
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH")  # optional SQLite file shared by workers
 
 
 # ─── Stage 2: NLP Preprocessing ─────────────────────────────────────────────
 
+# Built once at import: preprocess_text runs on every request and every training row
+_DIGITS_RE = re.compile(r"\d+")
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+_ASCII_STRIP_TABLE = str.maketrans("", "", string.punctuation + string.digits)
+
+# Treebank contractions that word_tokenize still splits once apostrophes are gone
+_CONTRACTIONS = {
+    "cannot": ("can", "not"), "gimme": ("gim", "me"), "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"), "lemme": ("lem", "me"), "wanna": ("wan", "na"),
+}
+
+
+def _tokenize(text):
+    """word_tokenize with a fast path: on lowercase ASCII letters and single spaces
+    the Treebank tokenizer reduces to a split plus the contraction table above."""
+    if not text:
+        return []
+    if text.isascii() and text.replace(" ", "").isalpha():
+        tokens = []
+        for token in text.split(" "):
+            tokens.extend(_CONTRACTIONS.get(token, (token,)))
+        return tokens
+    return word_tokenize(text)
+
+
+@functools.lru_cache(maxsize=65536)
+def _normalize_token(token):
+    """Stopword/length filter and lemma lookup for one token (None = dropped), memoized."""
+    if token in STOP_WORDS or len(token) <= 2:
+        return None
+    return LEMMATIZER.lemmatize(token) if NLTK_AVAILABLE else token
+
+
 def preprocess_text(text: str, age=None, sex=None, medical_history=None) -> str:
     """Stage 2 — Tokenization, stopword removal, lemmatization.
     Optionally prepend demographic/EHR context to enrich features."""
@@ -91,18 +227,28 @@ def preprocess_text(text: str, age=None, sex=None, medical_history=None) -> str:
 
     full_text = " ".join(context_parts) + " " + text if context_parts else text
     full_text = full_text.lower()
-    full_text = re.sub(r"\d+", "", full_text)
-    full_text = full_text.translate(str.maketrans("", "", string.punctuation))
-    full_text = re.sub(r"\s+", " ", full_text).strip()
-
-    if NLTK_AVAILABLE:
-        tokens = word_tokenize(full_text)
-        tokens = [LEMMATIZER.lemmatize(t) for t in tokens if t not in STOP_WORDS and len(t) > 2]
+    if full_text.isascii():
+        full_text = full_text.translate(_ASCII_STRIP_TABLE)
     else:
-        tokens = full_text.split()
-        tokens = [t for t in tokens if t not in STOP_WORDS and len(t) > 2]
+        full_text = _DIGITS_RE.sub("", full_text).translate(_PUNCT_TABLE)
+    full_text = " ".join(full_text.split())
 
-    return " ".join(tokens)
+    tokens = _tokenize(full_text) if NLTK_AVAILABLE else full_text.split()
+    tokens = [_normalize_token(t) for t in tokens]
+    return " ".join(t for t in tokens if t is not None)
+
+
+def preprocessing_fingerprint():
+    """Everything preprocess_text's output depends on besides the text."""
+    fingerprint = {
+        "backend": PREPROCESSING_BACKEND,
+        "version": PREPROCESSING_VERSION,
+        "stop_words": hashlib.sha256(" ".join(sorted(STOP_WORDS)).encode()).hexdigest()[:16],
+    }
+    if NLTK_AVAILABLE:
+        from nltk.corpus import wordnet
+        fingerprint.update(nltk=nltk.__version__, wordnet=wordnet.get_version())
+    return fingerprint
 
 
 # ─── NDCG Computation ────────────────────────────────────────────────────────
@@ -114,90 +260,254 @@ def compute_dcg(relevances, k=None):
 
 def compute_ndcg(y_true, y_pred_proba, classes, k=5):
     """Compute NDCG for ranked differential diagnosis evaluation.
-    For each sample, measures how well the true label is ranked in predictions."""
-    ndcg_scores = []
-    for i in range(len(y_true)):
-        true_label = y_true[i]
-        probas = y_pred_proba[i]
-        ranked_indices = np.argsort(probas)[::-1][:k]
-        ranked_classes = [classes[j] for j in ranked_indices]
+    For each sample, measures how well the true label is ranked in predictions.
+    Vectorized over the whole probability matrix; see ranking.ranking_metrics."""
+    return ranking_metrics(y_true, y_pred_proba, classes, k=k)["ndcg"]
 
-        # Relevance: 1 if matches true label, 0 otherwise
-        relevances = [1.0 if c == true_label else 0.0 for c in ranked_classes]
-        ideal_relevances = sorted(relevances, reverse=True)
 
-        dcg = compute_dcg(relevances, k)
-        idcg = compute_dcg(ideal_relevances, k)
-        ndcg_scores.append(dcg / idcg if idcg > 0 else 0.0)
+# ─── Stage 3: Ensemble ML Classification ────────────────────────────────────
 
-    return np.mean(ndcg_scores)
+def load_ensemble_config(profile=None):
+    """The persisted {"vectorizer": {...}, "ensemble": {...}} overrides (set_params
+    names) for ``profile`` (default ENSEMBLE_PROFILE); empty when
+    ENSEMBLE_CONFIG_PATH does not exist or was searched for another profile."""
+    try:
+        with open(ENSEMBLE_CONFIG_PATH) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    if config.get("profile", "full") != (profile or ENSEMBLE_PROFILE):
+        config = {}
+    return {"vectorizer": config.get("vectorizer", {}), "ensemble": config.get("ensemble", {})}
 
 
-# ─── Stage 3: Ensemble ML Classification ────────────────────────────────────
+def build_ensemble(params=None, profile=None):
+    """Build the ensemble classifier with soft voting for ``profile`` (default
+    ENSEMBLE_PROFILE). ``params`` override the settings below (e.g.
+    {"rf__n_estimators": 100}); None applies the persisted ENSEMBLE_CONFIG."""
+    profile = profile or ENSEMBLE_PROFILE
+    if profile == "full":
+        rf = RandomForestClassifier(n_estimators=300, max_depth=None, min_samples_split=2, random_state=42, n_jobs=-1)
+        svm = SVC(kernel="rbf", C=10, gamma="scale", probability=True, random_state=42)
+        gb = GradientBoostingClassifier(n_estimators=200, learning_rate=0.1, max_depth=5, random_state=42)
+        ensemble = VotingClassifier(estimators=[("rf", rf), ("svm", svm), ("gb", gb)], voting="soft", weights=[2, 3, 2])
+    elif profile == "lite":
+        # Margin model with its own 3-fold Platt scaling; one liblinear fit per class and fold
+        svm = CalibratedClassifierCV(LinearSVC(C=0.1, random_state=42), method="sigmoid", cv=3)
+        sgd = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)
+        # Binned boosting needs dense input: a chi2 selection keeps it to LITE_HGB_FEATURES columns.
+        # Leaves of 2 rows, as the built-in vignettes have 3-4 training rows per disease
+        hgb = make_pipeline(
+            SelectKBest(chi2, k=LITE_HGB_FEATURES), FunctionTransformer(to_dense),
+            HistGradientBoostingClassifier(max_iter=50, learning_rate=0.2, max_leaf_nodes=15, min_samples_leaf=2,
+                                           max_bins=32, early_stopping=False, random_state=42),
+        )
+        ensemble = VotingClassifier(estimators=[("svm", svm), ("sgd", sgd), ("hgb", hgb)], voting="soft",
+                                    weights=[2, 2, 1])
+    else:
+        raise ValueError(f"unknown ensemble profile {profile!r}; expected one of {', '.join(ENSEMBLE_PROFILES)}")
+    return ensemble.set_params(**(load_ensemble_config(profile)["ensemble"] if params is None else params))
+
+
+def build_vectorizer(params=None, profile=None):
+    """The TF-IDF vectorizer; ``params`` and ``profile`` as for build_ensemble."""
+    params = dict(load_ensemble_config(profile)["vectorizer"] if params is None else params)
+    if "ngram_range" in params:
+        params["ngram_range"] = tuple(params["ngram_range"])     # JSON has no tuples
+    return TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True).set_params(**params)
 
-def build_ensemble():
-    """Build the ensemble classifier with soft voting."""
-    rf = RandomForestClassifier(n_estimators=300, max_depth=None, min_samples_split=2, random_state=42, n_jobs=-1)
-    svm = SVC(kernel="rbf", C=10, gamma="scale", probability=True, random_state=42)
-    gb = GradientBoostingClassifier(n_estimators=200, learning_rate=0.1, max_depth=5, random_state=42)
-    ensemble = VotingClassifier(estimators=[("rf", rf), ("svm", svm), ("gb", gb)], voting="soft", weights=[2, 3, 2])
-    return ensemble
 
+def _plain_params(estimator):
+    """get_params(deep=True) with nested estimators reduced to their class names
+    (their own parameters are listed under their prefixes)."""
+    def plain(value):
+        if hasattr(value, "get_params"):
+            return type(value).__name__
+        if callable(value):     # e.g. score_func=chi2: its repr holds a memory address
+            return f"{value.__module__}.{value.__qualname__}"
+        if isinstance(value, (list, tuple)):
+            return [plain(v) for v in value]
+        return value
+    return {name: plain(value) for name, value in estimator.get_params(deep=True).items()}
 
-def train_model():
-    """Train the full pipeline with confidence calibration and save artifacts."""
-    from dataset import get_training_data
-    texts_raw, labels = get_training_data()
-    texts = [preprocess_text(t) for t in texts_raw]
 
-    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True)
-    X = vectorizer.fit_transform(texts)
-    y = np.array(labels)
+def training_fingerprint(source=None, profile=None, stamped=None, config=None):
+    """Everything a trained version depends on, per component: the training data
+    (default dataset.open_source()), the preprocessing, the vectorizer and
+    ensemble hyperparameters, the training pipeline and the library versions.
+    ``profile`` defaults to ENSEMBLE_PROFILE and ``config`` (the hyperparameter
+    overrides) to load_ensemble_config(profile). train_model stamps it into
+    metrics["fingerprint"]. "dataset_state" records the source's cheap state
+    (a file's size and mtime); while it equals that of a ``stamped``
+    fingerprint, the stamped dataset hash is reused instead of re-reading the
+    training data."""
+    from dataset import open_source
+    source = source or open_source()
+    config = config or load_ensemble_config(profile)
+    state = source.state()
+    if stamped and state is not None and stamped.get("dataset_state") == state:
+        dataset = stamped["dataset"]
+    else:
+        dataset = source.fingerprint()[:24]
+    return {
+        "dataset": dataset,
+        "dataset_state": state,
+        "preprocessing": digest(preprocessing_fingerprint()),
+        "vectorizer": digest(build_vectorizer(config["vectorizer"], profile).get_params()),
+        "ensemble": digest(_plain_params(build_ensemble(config["ensemble"], profile))),
+        "pipeline": TRAINING_PIPELINE_VERSION,
+        "libraries": {
+            "python": platform.python_version(),
+            "sklearn": sklearn.__version__,
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "joblib": joblib.__version__,
+        },
+    }
+
+
+def check_fingerprint(stamped, source=None, profile=None):
+    """Compare a version's stamped training fingerprint with the current one.
+    "changed" lists the differing components (libraries by name; "unstamped"
+    for versions trained before fingerprints); the version is "stale" when any
+    of them is not in VERIFIED_AT_LOAD. A stale check also reports what a
+    retrain could reuse from the feature cache ("rebuild": features, tokens,
+    miss or off). When the training data cannot be read (a serving host
+    without the TRAINING_DATA corpus) the status is "unknown", with the reason
+    in "error"."""
+    from dataset import open_source
+    started = time.perf_counter()
+    source = source or open_source()
+    config = load_ensemble_config(profile)
+    try:
+        expected = training_fingerprint(source, profile, stamped, config)
+    except OSError as exc:
+        return {"status": "unknown", "changed": [], "error": f"training data unavailable: {exc}",
+                "check_seconds": round(time.perf_counter() - started, 3)}
+    if not stamped:
+        changed = ["unstamped"]
+    else:
+        changed = [name for name, value in expected.items()
+                   if name not in ("libraries", "dataset_state") and stamped.get(name) != value]
+        changed += [name for name, version in expected["libraries"].items()
+                    if stamped.get("libraries", {}).get(name) != version]
+    stale = any(name not in VERIFIED_AT_LOAD for name in changed)
+    result = {"status": "stale" if stale else "current", "changed": changed}
+    if stale:
+        result["rebuild"] = (cache_state(source, build_vectorizer(config["vectorizer"], profile),
+                                         preprocessing_fingerprint(), FeatureCache())
+                             if FEATURE_CACHE else "off")
+    result["check_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def train_model(n_jobs=None, source=None, evaluation=None, profile=None):
+    """Train the full pipeline with confidence calibration and save artifacts.
+    The evaluation and production ensembles are fitted concurrently on up to
+    ``n_jobs`` cores (default TRAIN_N_JOBS); results do not depend on n_jobs.
+    Every stage is timed and memory-profiled into metrics["training_profile"].
+    The corpus is streamed in chunks from ``source`` (default
+    dataset.open_source(): TRAINING_DATA, else the built-in vignettes) and its
+    preprocessed rows, vectorizer and matrix are reused from the feature
+    cache when neither the data nor the preprocessing or vectorizer settings
+    changed; see corpus.load. With evaluation="cv" (default EVALUATION_MODE)
+    the holdout metrics are complemented by repeated stratified k-fold with
+    bootstrap confidence intervals in metrics["cross_validation"]. ``profile``
+    (default ENSEMBLE_PROFILE) names the ensemble; see build_ensemble."""
+    from dataset import get_disease_info, open_source
+    profiler = StageProfiler()
+    source = source or open_source()
+    profile = profile or ENSEMBLE_PROFILE
+    # Read ENSEMBLE_CONFIG once: a search.py --apply during training must not make the
+    # fitted models, the stamped fingerprint and the recorded hyperparameters disagree
+    config = load_ensemble_config(profile)
+    with profiler.stage("training fingerprint"):
+        fingerprint = training_fingerprint(source, profile, config=config)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    vectorizer = build_vectorizer(config["vectorizer"], profile)
+    X, y, vectorizer, corpus_stats = load_corpus(
+        source, vectorizer, preprocess_text, preprocessing_fingerprint(),
+        cache=FeatureCache() if FEATURE_CACHE else None, stage=profiler.stage,
+    )
 
-    # Build and train ensemble
-    base_model = build_ensemble()
-    base_model.fit(X_train, y_train)
+    with profiler.stage("train_test_split"):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    # Build and train the evaluation (80% split) and production (full data) ensembles
+    # together: all six base estimators are independent fits in one process pool
+    fit_started = time.perf_counter()
+    with profiler.stage("ensemble_fit (pool wall)"):
+        (base_model, model_full), fit_timings = fit_ensembles(
+            build_ensemble(config["ensemble"], profile), [(X_train, y_train), (X, y)], n_jobs=n_jobs,
+        )
 
     # Confidence Calibration using CalibratedClassifierCV
-    if HAS_FROZEN:
-        # scikit-learn >= 1.8: cv='prefit' removed, use FrozenEstimator
-        calibrated_model = CalibratedClassifierCV(FrozenEstimator(base_model), method="sigmoid")
-    else:
-        # scikit-learn < 1.8: use cv='prefit'
-        calibrated_model = CalibratedClassifierCV(base_model, cv="prefit", method="sigmoid")
-    calibrated_model.fit(X_train, y_train)
+    with profiler.stage("calibration (pool wall)"):
+        (calibrated_model, calibrated_full), calibration_timings = calibrate_all(
+            [(base_model, X_train, y_train), (model_full, X, y)], n_jobs=n_jobs,
+        )
+    fit_wall = time.perf_counter() - fit_started
+    fit_serial = sum(t["seconds"] for t in fit_timings + calibration_timings)
+
+    for t in fit_timings:
+        name = {"svm": "svm (incl. probability CV)"}.get(t["estimator"], t["estimator"])
+        profiler.add(f"{('eval', 'full')[t['ensemble']]}/{name}", t["seconds"], t["peak_bytes"], where="worker")
+    for split, t in zip(("eval", "full"), calibration_timings):
+        profiler.add(f"{split}/sigmoid_calibration", t["seconds"], t["peak_bytes"], where="worker")
 
     # Evaluate with calibrated model
-    y_pred = calibrated_model.predict(X_test)
-    y_pred_proba = calibrated_model.predict_proba(X_test)
-    m1_accuracy = accuracy_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred, average="weighted")
-    precision = precision_score(y_test, y_pred, average="weighted", zero_division=0)
-    recall = recall_score(y_test, y_pred, average="weighted", zero_division=0)
-
-    # Compute NDCG
-    ndcg = compute_ndcg(y_test, y_pred_proba, calibrated_model.classes_, k=5)
-
-    # Bias analysis: per-category accuracy
-    from dataset import get_disease_info
-    disease_info = get_disease_info()
-    category_stats = defaultdict(lambda: {"correct": 0, "total": 0})
-    for true, pred in zip(y_test, y_pred):
-        cat = disease_info.get(true, {}).get("category", "Other")
-        category_stats[cat]["total"] += 1
-        if true == pred:
-            category_stats[cat]["correct"] += 1
-
-    bias_report = {}
-    for cat, stats in category_stats.items():
-        acc = stats["correct"] / stats["total"] if stats["total"] > 0 else 0
-        bias_report[cat] = {"accuracy": round(acc, 4), "samples": stats["total"]}
+    with profiler.stage("evaluate"):
+        y_pred = calibrated_model.predict(X_test)
+        y_pred_proba = calibrated_model.predict_proba(X_test)
+        m1_accuracy = accuracy_score(y_test, y_pred)
+        f1 = f1_score(y_test, y_pred, average="weighted")
+        precision = precision_score(y_test, y_pred, average="weighted", zero_division=0)
+        recall = recall_score(y_test, y_pred, average="weighted", zero_division=0)
+
+        # Compute NDCG (plus top-5 accuracy and MRR from the same ranks)
+        ranking = ranking_metrics(y_test, y_pred_proba, calibrated_model.classes_, k=5)
+        ndcg = ranking["ndcg"]
+
+        # Bias analysis: per-category accuracy
+        disease_info = get_disease_info()
+        category_stats = defaultdict(lambda: {"correct": 0, "total": 0})
+        for true, pred in zip(y_test, y_pred):
+            cat = disease_info.get(true, {}).get("category", "Other")
+            category_stats[cat]["total"] += 1
+            if true == pred:
+                category_stats[cat]["correct"] += 1
+
+        bias_report = {}
+        for cat, stats in category_stats.items():
+            acc = stats["correct"] / stats["total"] if stats["total"] > 0 else 0
+            bias_report[cat] = {"accuracy": round(acc, 4), "samples": stats["total"]}
+
+    evaluation = evaluation or EVALUATION_MODE
+    cross_validation = None
+    if evaluation == "cv":
+        with profiler.stage("cross_validation (pool wall)"):
+            categories = {disease: info.get("category", "Other") for disease, info in disease_info.items()}
+            cross_validation, _ = cross_validate(build_ensemble(config["ensemble"], profile), X, y, categories,
+                                                 n_jobs=n_jobs)
+
+    # Distill the calibrated ensemble into a single linear model for mode='fast':
+    # judged against the evaluation teacher on the held-out split, shipped from the full teacher
+    with profiler.stage("distillation"):
+        student = distill(calibrated_model, X_train)
+        student_proba = student.predict_proba(X_test)
+        top1_agreement, top5_agreement = agreement(y_pred_proba, student_proba, k=5)
+        student_ranking = ranking_metrics(y_test, student_proba, student.classes_, k=5)
+        student_m1 = accuracy_score(y_test, student.classes_[student_proba.argmax(axis=1)])
+        teacher_ms = single_row_latency_ms(calibrated_model, X_test[:20], repeat=1)
+        student_ms = single_row_latency_ms(student, X_test)
+        distilled_full = distill(calibrated_full, X)
 
     print(f"\n{'='*50}")
-    print(f"  Model Training Complete (Calibrated)")
+    print(f"  Model Training Complete (Calibrated, {profile} profile)")
     print(f"{'='*50}")
+    print(f"  Corpus           : {corpus_stats['records']} records from {corpus_stats['source']} "
+          f"({corpus_stats['skipped_label']} unknown labels, {corpus_stats['skipped_empty']} empty skipped; "
+          f"{corpus_stats['records_per_second']:.0f} records/s; feature cache: {corpus_stats['cache']})")
     print(f"  Training samples : {len(y_train)}")
     print(f"  Test samples     : {len(y_test)}")
     print(f"  M1 Accuracy      : {m1_accuracy:.4f} ({m1_accuracy*100:.1f}%)")
@@ -205,63 +515,626 @@ def train_model():
     print(f"  Precision (wt)   : {precision:.4f}")
     print(f"  Recall (wt)      : {recall:.4f}")
     print(f"  NDCG@5           : {ndcg:.4f}")
+    print(f"  Top-5 Accuracy   : {ranking['top_k_accuracy']:.4f}")
+    print(f"  MRR              : {ranking['mrr']:.4f}")
     print(f"  Bias by category : {dict(bias_report)}")
+    print(f"  Distilled model  : top-1 agreement {top1_agreement:.3f}, top-5 overlap {top5_agreement:.3f}, "
+          f"M1 {student_m1:.3f}, {teacher_ms / student_ms:.0f}x faster ({student_ms:.2f} vs {teacher_ms:.1f} ms)")
+    print(f"  Fit wall-clock   : {fit_wall:.1f}s on {n_jobs or TRAIN_N_JOBS} core(s) "
+          f"(serial sum {fit_serial:.1f}s, {fit_serial / fit_wall:.2f}x)")
+    if cross_validation:
+        cv = cross_validation
+        print(f"  Cross-validation : {cv['folds']}-fold x {cv['repeats']}, {cv['fits']} fits in "
+              f"{cv['fit_wall_seconds']:.1f}s ({cv['speedup']:.2f}x); fold mean ± std, "
+              f"{cv['confidence']:.0%} bootstrap CI of the pooled value:")
+        for name, m in cv["metrics"].items():
+            print(f"    {name:<15}: {m['mean']:.4f} ± {m['std']:.4f}  [{m['ci'][0]:.4f}, {m['ci'][1]:.4f}]")
     print(f"{'='*50}\n")
 
-    # Retrain on full dataset for production
-    model_full = build_ensemble()
-    model_full.fit(X, y)
-    if HAS_FROZEN:
-        calibrated_full = CalibratedClassifierCV(FrozenEstimator(model_full), method="sigmoid")
-    else:
-        calibrated_full = CalibratedClassifierCV(model_full, cv="prefit", method="sigmoid")
-    calibrated_full.fit(X, y)
-
     metrics = {
         "m1_accuracy": round(m1_accuracy, 4),
         "f1_score": round(f1, 4),
         "precision": round(precision, 4),
         "recall": round(recall, 4),
         "ndcg": round(ndcg, 4),
+        "top5_accuracy": round(ranking["top_k_accuracy"], 4),
+        "mrr": round(ranking["mrr"], 4),
         "train_size": len(y_train),
         "test_size": len(y_test),
         "bias_report": bias_report,
+        "evaluation": evaluation,
+        "cross_validation": cross_validation,
+        "ensemble_profile": profile,
+        "hyperparameters": config,
+        "preprocessing_backend": PREPROCESSING_BACKEND,
+        "fingerprint": fingerprint,
+        "corpus": corpus_stats,
+        "distillation": {
+            "top1_agreement": round(top1_agreement, 4),
+            "top5_agreement": round(top5_agreement, 4),
+            "m1_accuracy": round(student_m1, 4),
+            "ndcg": round(student_ranking["ndcg"], 4),
+            "teacher_latency_ms": round(teacher_ms, 3),
+            "student_latency_ms": round(student_ms, 3),
+            "latency_ratio": round(teacher_ms / student_ms, 1),
+        },
+        "training_parallelism": {
+            "n_jobs": n_jobs or TRAIN_N_JOBS,
+            "fit_wall_seconds": round(fit_wall, 3),
+            "fit_serial_seconds": round(fit_serial, 3),
+        },
     }
 
-    joblib.dump(calibrated_full, MODEL_PATH)
-    joblib.dump(vectorizer, VECTORIZER_PATH)
-    joblib.dump(metrics, METRICS_PATH)
-    print(f"  Model saved to: {MODEL_PATH}")
+    # Each run writes a fresh version directory; publishing the manifest makes it
+    # live, so servers never see a partial artifact set
+    version = new_version()
+    metrics["version"] = version
+    paths = artifact_paths(version)
+    with profiler.stage("save_artifacts"):
+        os.makedirs(version_dir(version), exist_ok=True)
+        dump_atomic(vectorizer, paths["vectorizer"])
+        dump_atomic(distilled_full, paths["distilled"])
+        try:
+            dump_atomic(compile_model(calibrated_full), paths["compiled"])
+        except UnsupportedModel as exc:
+            print(f"  Compiled export skipped: {exc}")
+        dump_atomic(calibrated_full, paths["model"])
+    metrics["training_profile"] = profiler.finish()
+    dump_atomic(metrics, paths["metrics"])
+    publish(version, {"m1_accuracy": metrics["m1_accuracy"], "ndcg": metrics["ndcg"],
+                      "dataset": fingerprint["dataset"]})
+    print(f"  Model saved to: {version_dir(version)} (active version {version})")
     return metrics
 
 
+def dump_atomic(obj, path):
+    """joblib.dump via a temp file + rename so readers never see a partial artifact."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def artifacts_exist():
+    return active_version() is not None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _training_in_progress():
+    """True while a live process holds the training lock."""
+    try:
+        with open(TRAINING_LOCK_PATH) as f:
+            return _pid_alive(int(f.read().strip()))
+    except (OSError, ValueError):
+        return False
+
+
+def _acquire_training_lock():
+    """Let only one process (e.g. one of several gunicorn workers) train at a time."""
+    try:
+        fd = os.open(TRAINING_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if _training_in_progress():
+            return False
+        os.remove(TRAINING_LOCK_PATH)     # stale lock left by a dead trainer
+        return _acquire_training_lock()
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def _train_with_lock(profile=None):
+    """Background-process entry point: train unless another process already is."""
+    if not _acquire_training_lock():
+        return
+    try:
+        train_model(profile=profile)
+    finally:
+        os.remove(TRAINING_LOCK_PATH)
+
+
 # ─── Stage 4: Prediction / Ranked Differential Diagnosis ────────────────────
 
+class LoadedModel:
+    """One immutable artifact version as served: everything a prediction reads.
+    SymptomClassifier swaps whole LoadedModels, so a request never mixes the
+    vectorizer of one version with the model of another."""
+
+    def __init__(self, version, model, vectorizer, transformer, fast_model, metrics,
+                 inference="sklearn", compiled_parity=None, load_seconds=None, freshness=None,
+                 sklearn_model=None):
+        self.version = version
+        self.model = model
+        self.sklearn_model = sklearn_model      # kept next to a compiled model for large batches
+        self.vectorizer = vectorizer
+        self.transformer = transformer
+        self.fast_model = fast_model
+        self.classes = model.classes_
+        self.metrics = metrics
+        self.inference = inference
+        self.compiled_parity = compiled_parity
+        self.load_seconds = load_seconds
+        self.freshness = freshness
+        self.loaded_at = time.time()
+
+    def ensemble_for(self, rows):
+        """The ensemble to score ``rows`` rows at once: the compiled model unless the
+        batch exceeds COMPILED_BATCH_MAX_ROWS."""
+        if self.sklearn_model is not None and rows > COMPILED_BATCH_MAX_ROWS:
+            return self.sklearn_model
+        return self.model
+
+
 class SymptomClassifier:
     """Loads a trained calibrated model and produces ranked differential diagnoses."""
 
-    def __init__(self):
-        if not os.path.exists(MODEL_PATH) or not os.path.exists(VECTORIZER_PATH):
+    ARTIFACT_POLL_SECONDS = 2.0
+
+    def __init__(self, background_training=False, watch_seconds=MODEL_WATCH_SECONDS):
+        """With background_training=True and no artifacts on disk, start serving
+        immediately from a SimilarityEngine while train_model runs in a separate
+        process; the ensemble is swapped in once its artifacts exist. With
+        watch_seconds > 0 a newly published artifact version is hot-reloaded.
+        Existing artifacts are loaded as they are; when their training
+        fingerprint is stale, MODEL_STALE_POLICY decides whether a new version
+        is trained in the background (reusing what the feature cache holds)."""
+        self.cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_PATH)
+        self.stage_seconds = HistogramVec(
+            "symptom_classifier_stage_seconds",
+            "Time spent in each ensemble predict stage; call=batch observes once per predict_batch group.",
+            ("stage", "mode", "call"), STAGE_BUCKETS_SECONDS,
+        )
+        self.fallback = None
+        self.active = None             # the LoadedModel answering ensemble predictions
+        self.startup_seconds = None
+        self.stale_retrain = None      # trainer subprocess started for a stale version
+        self.watch_seconds = watch_seconds
+        self.reloads = 0
+        self.last_reload_error = None
+        self._start_watcher()
+        # Threads do not survive fork (gunicorn preload_app): each worker watches for itself
+        os.register_at_fork(after_in_child=self._start_watcher)
+
+        started = time.perf_counter()
+        if not artifacts_exist():
+            if background_training:
+                self._start_background_training()
+                return
             print("No trained model found. Training now...")
             train_model()
 
-        self.model = joblib.load(MODEL_PATH)
-        self.vectorizer = joblib.load(VECTORIZER_PATH)
-        self.classes = self.model.classes_
-        self.metrics = joblib.load(METRICS_PATH) if os.path.exists(METRICS_PATH) else {}
+        loaded = self.load()
+        self.startup_seconds = round(time.perf_counter() - started, 3)
+        freshness = loaded.freshness
+        if freshness["status"] == "current":
+            print(f"Model version {loaded.version} loaded in {self.startup_seconds:.2f}s; training fingerprint "
+                  f"matches (checked in {freshness['check_seconds'] * 1000:.0f} ms"
+                  + (f"; verified at load: {', '.join(freshness['changed'])})" if freshness["changed"] else ")"))
+            return
+        if freshness["status"] == "unknown":
+            print(f"WARNING: could not check the training fingerprint of model version {loaded.version} "
+                  f"({freshness['error']}); loaded in {self.startup_seconds:.2f}s and served as is")
+            return
+        print(f"WARNING: model version {loaded.version} is stale ({', '.join(freshness['changed'])} changed "
+              f"since it was trained); loaded in {self.startup_seconds:.2f}s, policy {STALE_MODEL_POLICY}")
+        if STALE_MODEL_POLICY != "retrain":
+            return
+        needs_corpus = [name for name in freshness["changed"] if name in RETRAIN_NEEDS_CORPUS]
+        if needs_corpus:
+            print(f"Not retraining automatically ({', '.join(needs_corpus)} changed): retrain where the "
+                  f"training corpus lives with python model.py")
+            return
+        self._retrain_stale(freshness, loaded.metrics.get("ensemble_profile", "full"))
+
+    # Read-only views of the active version (None/empty while the similarity engine serves)
+    model = property(lambda self: self.active and self.active.model)
+    vectorizer = property(lambda self: self.active and self.active.vectorizer)
+    transformer = property(lambda self: self.active and self.active.transformer)
+    fast_model = property(lambda self: self.active and self.active.fast_model)
+    inference = property(lambda self: self.active and self.active.inference)
+    compiled_parity = property(lambda self: self.active and self.active.compiled_parity)
+    version = property(lambda self: self.active and self.active.version)
+    metrics = property(lambda self: self.active.metrics if self.active else {})
+
+    @property
+    def classes(self):
+        active = self.active
+        return active.classes if active is not None else self.fallback.classes
+
+    @property
+    def engine(self):
+        """Which engine answers predictions right now: 'ensemble' or 'similarity'."""
+        return "similarity" if self.fallback is not None else "ensemble"
+
+    def _start_background_training(self):
+        from dataset import get_training_data
+        from similarity import SimilarityEngine
+
+        texts, labels = get_training_data()
+        self.fallback = SimilarityEngine(texts, labels, preprocess_text)
+
+        print("No trained model found. Serving from the similarity engine while training in the background...")
+        process = self._spawn_trainer()
+        self._trainer_pid = process.pid
+        threading.Thread(target=self._swap_in_ensemble, args=(lambda: process.poll() is None,),
+                         daemon=True).start()
+        os.register_at_fork(after_in_child=self._watch_after_fork)
+
+    @staticmethod
+    def _spawn_trainer(profile=None):
+        # A fresh interpreter rather than fork/spawn: the parent may be running request
+        # threads, and spawn would re-execute the server's __main__ module.
+        return subprocess.Popen(
+            [sys.executable, "-c", f"from model import _train_with_lock; _train_with_lock({profile!r})"],
+            cwd=MODEL_DIR,
+        )
+
+    def _retrain_stale(self, freshness, profile):
+        """Keep serving the stale version while a new one of the same ``profile`` trains
+        in a separate process, then hot-reload it. Only the parts whose inputs changed
+        are rebuilt: the feature cache supplies the matrix (ensemble/pipeline change) or
+        the preprocessed text (vectorizer change)."""
+        if _training_in_progress():
+            print("A training run is already in progress; its version will be hot-reloaded when published")
+            return
+        print(f"Retraining the {profile} profile in the background (feature cache: {freshness['rebuild']})...")
+        self.stale_retrain = self._spawn_trainer(profile)
+        threading.Thread(target=self._reload_after, args=(self.stale_retrain,), daemon=True).start()
+
+    def _reload_after(self, process):
+        started = time.perf_counter()
+        process.wait()
+        status = self.reload(wait=True)
+        print(f"Background retrain finished after {time.perf_counter() - started:.1f}s "
+              f"(exit code {process.returncode}); reload: {status}")
+
+    def _watch_after_fork(self):
+        # A forked worker (gunicorn preload_app) is not the trainer's parent: it can only
+        # poll the pid. The trainer may still be importing and not hold the lock yet.
+        if self.fallback is not None:
+            pid = self._trainer_pid
+            threading.Thread(target=self._swap_in_ensemble, args=(lambda: _pid_alive(pid),),
+                             daemon=True).start()
+
+    def _swap_in_ensemble(self, trainer_alive):
+        """Wait for a complete artifact set (ours or another worker's), then go live with it.
+        ``trainer_alive()`` tells whether the background trainer subprocess still runs."""
+        started = time.perf_counter()
+        while not artifacts_exist() or _training_in_progress():
+            if not trainer_alive() and not _training_in_progress() and not artifacts_exist():
+                print("WARNING: background training exited without artifacts; still serving the similarity engine")
+                return
+            time.sleep(self.ARTIFACT_POLL_SECONDS)
+        if self._leave_fallback():
+            print(f"Ensemble model ready after {time.perf_counter() - started:.1f}s; switched from similarity engine")
+
+    def _leave_fallback(self):
+        """Load the active version and stop serving from the similarity engine. The swap
+        thread and the manifest watcher may both get here; only the first one loads."""
+        with self._reload_lock:
+            if self.fallback is None:
+                return False
+            self.load()
+            self.fallback = None    # single attribute write: predictions switch to the ensemble atomically
+            return True
+
+    # ─── Hot reload ──────────────────────────────────────────────────────────
+
+    def load(self, version=None):
+        """Load an artifact version (default: the manifest's active one), warm it up
+        and swap it in. Requests already running finish on the version they started
+        with; cached predictions belong to the previous version and are invalidated."""
+        loaded = self._load_version(version or active_version())
+        self.active = loaded    # single attribute write: the swap is atomic for readers
+        self.cache.clear(namespace=loaded.version)
+        return loaded
+
+    def reload(self, wait=False):
+        """Hot-reload the manifest's active version unless it is already live.
+        Returns 'started' (or 'reloaded'/'failed' with wait=True), 'current'
+        when there is nothing new, or 'busy' when a reload (or the swap from the
+        similarity engine) is already under way."""
+        if self.fallback is not None or not self._reload_lock.acquire(blocking=False):
+            return "busy"
+        target = active_version()
+        if target is None or target == self.version:
+            self._reload_lock.release()
+            return "current"
+        if not wait:
+            threading.Thread(target=self._reload_locked, args=(target,), name="model-reload", daemon=True).start()
+            return "started"
+        return "reloaded" if self._reload_locked(target) else "failed"
 
-    def predict(self, symptom_text: str, top_k: int = 5, age=None, sex=None, medical_history=None):
-        """Stage 4 — Return ranked differential diagnoses with calibrated probabilities."""
+    def _reload_locked(self, version):
+        started = time.perf_counter()
+        try:
+            previous = self.version
+            self.load(version)
+            self.reloads += 1
+            self.last_reload_error = None
+            print(f"Hot-reloaded model version {version} (was {previous}) in {time.perf_counter() - started:.1f}s")
+            return True
+        except Exception as exc:
+            self.last_reload_error = f"{version}: {exc}"
+            print(f"WARNING: reload of model version {version} failed, still serving {self.version}: {exc}")
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def _start_watcher(self):
+        self._reload_lock = threading.Lock()    # fresh per process: a fork may copy it held
+        if self.watch_seconds > 0:
+            threading.Thread(target=self._watch_manifest, name="model-watcher", daemon=True).start()
+
+    def _watch_manifest(self):
+        """Poll the manifest's mtime and reload when a new version is published; the
+        first published version also ends serving from the similarity engine."""
+        seen = manifest_mtime()
+        while True:
+            time.sleep(self.watch_seconds)
+            mtime = manifest_mtime()
+            if mtime == seen:
+                continue
+            if self.fallback is not None and not _training_in_progress():
+                seen = mtime
+                try:
+                    if self._leave_fallback():
+                        print("Ensemble model published; switched from similarity engine")
+                except Exception as exc:
+                    self.last_reload_error = f"{active_version()}: {exc}"
+                    print(f"WARNING: could not load the published model, still serving the similarity engine: {exc}")
+            elif self.active is not None:
+                seen = mtime
+                self.reload()
+
+    def version_info(self):
+        active = self.active
+        return {
+            "active": active.version if active else None,
+            "published": active_version(),
+            "loaded_at": active.loaded_at if active else None,
+            "load_seconds": active.load_seconds if active else None,
+            "reloads": self.reloads,
+            "last_reload_error": self.last_reload_error,
+            "watch_seconds": self.watch_seconds,
+            "startup_seconds": self.startup_seconds,
+            "fingerprint": active.freshness if active else None,
+            "stale_retrain": (None if self.stale_retrain is None
+                              else "running" if self.stale_retrain.poll() is None
+                              else f"exited {self.stale_retrain.returncode}"),
+        }
+
+    def _load_version(self, version):
+        """Build a LoadedModel for one artifact version without touching the live one."""
+        started = time.perf_counter()
+        paths = artifact_paths(version)
+        mmap_mode = "r" if ARTIFACT_MMAP else None
+        metrics = joblib.load(paths["metrics"]) if os.path.exists(paths["metrics"]) else {}
+        self._check_preprocessing_backend(metrics)
+        freshness = self._check_freshness(version, metrics)
+        model = joblib.load(paths["model"], mmap_mode=mmap_mode)
+        vectorizer = joblib.load(paths["vectorizer"], mmap_mode=mmap_mode)
+        fast_model = joblib.load(paths["distilled"], mmap_mode=mmap_mode) if os.path.exists(paths["distilled"]) else None
+
+        from dataset import get_training_data
+        probe = [preprocess_text(t) for t in get_training_data()[0]]
+        transformer = self._direct_tfidf(vectorizer, probe) if DIRECT_TFIDF else vectorizer
+        inference, compiled_parity, sklearn_model = "sklearn", None, None
+        if COMPILED_INFERENCE:
+            compiled, compiled_parity = self._compiled(model, paths["compiled"], mmap_mode, vectorizer.transform(probe))
+            if compiled is not None:
+                if COMPILED_BATCH_MAX_ROWS > 0:
+                    sklearn_model = model
+                model, inference = compiled, "compiled"
+
+        # Warm-up: the first calls through each model page in mmapped arrays and allocate
+        # scratch buffers before the version takes live traffic
+        X = transformer.transform(probe[:WARMUP_ROWS])
+        for served in (model, sklearn_model, fast_model):
+            if served is not None:
+                served.predict_proba(X[:1])
+                served.predict_proba(X)
+        return LoadedModel(version, model, vectorizer, transformer, fast_model, metrics, inference,
+                           compiled_parity, load_seconds=round(time.perf_counter() - started, 3),
+                           freshness=freshness, sklearn_model=sklearn_model)
+
+    @staticmethod
+    def _direct_tfidf(vectorizer, probe_texts):
+        """DirectTfidf if it reproduces the fitted vectorizer bit for bit on the
+        preprocessed training corpus, else the vectorizer itself."""
+        try:
+            direct = DirectTfidf(vectorizer)
+        except ValueError as exc:
+            print(f"Direct TF-IDF unavailable ({exc}); using TfidfVectorizer.transform.")
+            return vectorizer
+        if identical(direct.transform(probe_texts), vectorizer.transform(probe_texts)):
+            return direct
+        print("WARNING: direct TF-IDF output differs from TfidfVectorizer; using TfidfVectorizer.transform.")
+        return vectorizer
+
+    @staticmethod
+    def _compiled(model, compiled_path, mmap_mode, probe):
+        """The compiled numpy export of the ensemble and its parity, if the two agree
+        within PARITY_TOLERANCE on the training corpus; (None, None) otherwise. A
+        missing or stale export is recompiled from the loaded model."""
+        sources = [("recompiled", lambda: compile_model(model))]
+        if os.path.exists(compiled_path):
+            sources.insert(0, ("exported", lambda: joblib.load(compiled_path, mmap_mode=mmap_mode)))
+        for source, build in sources:
+            try:
+                compiled = build()
+                diff = parity(compiled, model, probe)
+            except UnsupportedModel as exc:
+                print(f"Compiled inference unavailable ({exc}); serving with sklearn.")
+                return None, None
+            except Exception as exc:
+                print(f"WARNING: could not use the {source} compiled model: {exc}")
+                continue
+            if diff <= PARITY_TOLERANCE:
+                return compiled, diff
+            print(f"WARNING: {source} compiled model differs from sklearn by {diff:.2e}")
+        print("Compiled inference disabled; serving with sklearn.")
+        return None, None
+
+    @staticmethod
+    def _check_preprocessing_backend(metrics):
+        """Warn (or refuse, per PREPROCESSING_MISMATCH) when the model was trained
+        with a different tokenizer/stopword backend than the one available now."""
+        trained_with = metrics.get("preprocessing_backend")
+        if trained_with is None or trained_with == PREPROCESSING_BACKEND:
+            return
+        message = (f"Model was trained with the '{trained_with}' preprocessing backend "
+                   f"but this process uses '{PREPROCESSING_BACKEND}'; predictions may degrade.")
+        if BACKEND_MISMATCH_POLICY == "refuse":
+            raise RuntimeError(message + " Retrain or provision the matching NLTK resources.")
+        print(f"WARNING: {message}")
+
+    @staticmethod
+    def _check_freshness(version, metrics):
+        """check_fingerprint for a version's stamp, under the ensemble profile it was
+        trained with (a deliberately trained lite version is not stale on a server
+        whose ENSEMBLE_PROFILE is full); refuses a stale one under MODEL_STALE_POLICY=refuse."""
+        freshness = check_fingerprint(metrics.get("fingerprint"), profile=metrics.get("ensemble_profile", "full"))
+        if freshness["status"] == "stale" and STALE_MODEL_POLICY == "refuse":
+            raise RuntimeError(f"Model version {version} is stale ({', '.join(freshness['changed'])} changed "
+                               f"since it was trained); retrain with python model.py.")
+        return freshness
+
+    # ─── Prediction ──────────────────────────────────────────────────────────
+
+    def resolve_mode(self, mode, active=None):
+        """'fast' uses the distilled student when one was trained; everything else the ensemble."""
+        active = active or self.active
+        return "fast" if mode == "fast" and active is not None and active.fast_model is not None else "accurate"
+
+    def predict(self, symptom_text: str, top_k: int = 5, age=None, sex=None, medical_history=None,
+                mode: str = "accurate", with_mode=False):
+        """Stage 4 — Return ranked differential diagnoses with calibrated probabilities.
+        mode='fast' answers from the distilled linear model instead of the ensemble.
+        with_mode=True returns (predictions, mode used): 'fast' or 'accurate', None
+        while the similarity engine answers."""
+        fallback = self.fallback
+        if fallback is not None:
+            results = fallback.predict(symptom_text, top_k=top_k, age=age, sex=sex, medical_history=medical_history)
+            return (results, None) if with_mode else results
+
+        active = self.active    # one version for the whole request, even across a hot reload
+        mode = self.resolve_mode(mode, active)
+        stage = self.stage_seconds.labels
+        t0 = time.perf_counter()
         processed = preprocess_text(symptom_text, age=age, sex=sex, medical_history=medical_history)
-        X = self.vectorizer.transform([processed])
-        probas = self.model.predict_proba(X)[0]
+        t1 = time.perf_counter()
+        stage("preprocess", mode, "single").observe(t1 - t0)
+        key = (active.version, processed, top_k, mode)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (cached, mode) if with_mode else cached
+
+        model = active.fast_model if mode == "fast" else active.model
+        t1 = time.perf_counter()
+        X = active.transformer.transform([processed])
+        t2 = time.perf_counter()
+        probas = model.predict_proba(X)[0]
+        t3 = time.perf_counter()
+        results = self._rank(probas, top_k, active.classes)
+        t4 = time.perf_counter()
+        stage("vectorize", mode, "single").observe(t2 - t1)
+        stage("predict_proba", mode, "single").observe(t3 - t2)
+        stage("top_k", mode, "single").observe(t4 - t3)
+        self.cache.put(key, results)
+        return (results, mode) if with_mode else results
+
+    def predict_batch(self, records, top_k: int = 5):
+        """Stage 4 (batched) — Rank diagnoses for many records with one predict_proba call
+        per mode.
+
+        Each record is a dict with ``symptoms`` and optional ``age``, ``sex``,
+        ``medical_history``, ``top_k`` and ``mode``. Returns one entry per record, in
+        input order: ``{"predictions": [...], "mode": ...}`` on success (the mode
+        used, as for predict(with_mode=True)) or ``{"error": "..."}`` if that record
+        could not be processed. A bad record never fails the whole batch.
+        Records already in the prediction cache skip the model entirely."""
+        fallback = self.fallback
+        if fallback is not None:
+            return [self._predict_one_fallback(fallback, record, top_k) for record in records]
+
+        active = self.active
+        stage = self.stage_seconds.labels
+        results = [None] * len(records)
+        pending = defaultdict(list)    # mode -> [(record index, processed text)]
+        for i, record in enumerate(records):
+            mode = self.resolve_mode(record.get("mode", "accurate"), active)
+            t0 = time.perf_counter()
+            try:
+                text = preprocess_text(
+                    record["symptoms"], age=record.get("age"), sex=record.get("sex"),
+                    medical_history=record.get("medical_history"),
+                )
+            except Exception as exc:
+                results[i] = {"error": f"Preprocessing failed: {exc}"}
+                continue
+            stage("preprocess", mode, "batch").observe(time.perf_counter() - t0)
+            cached = self.cache.get((active.version, text, record.get("top_k", top_k), mode))
+            if cached is not None:
+                results[i] = {"predictions": cached, "mode": mode}
+            else:
+                pending[mode].append((i, text))
+
+        for mode, items in pending.items():
+            model = active.fast_model if mode == "fast" else active.ensemble_for(len(items))
+            texts = [text for _, text in items]
+            try:
+                t1 = time.perf_counter()
+                X = active.transformer.transform(texts)
+                t2 = time.perf_counter()
+                probas = model.predict_proba(X)
+                t3 = time.perf_counter()
+                stage("vectorize", mode, "batch").observe(t2 - t1)
+                stage("predict_proba", mode, "batch").observe(t3 - t2)
+            except Exception:
+                # Isolate the offending rows instead of failing every record
+                probas = [None] * len(items)
+                for j, text in enumerate(texts):
+                    try:
+                        probas[j] = model.predict_proba(active.transformer.transform([text]))[0]
+                    except Exception as exc:
+                        results[items[j][0]] = {"error": f"Prediction failed: {exc}"}
+            t3 = time.perf_counter()
+            for (i, text), row in zip(items, probas):
+                if row is not None:
+                    k = records[i].get("top_k", top_k)
+                    ranked = self._rank(row, k, active.classes)
+                    self.cache.put((active.version, text, k, mode), ranked)
+                    results[i] = {"predictions": ranked, "mode": mode}
+            stage("top_k", mode, "batch").observe(time.perf_counter() - t3)
+        return results
+
+    @staticmethod
+    def _predict_one_fallback(fallback, record, top_k):
+        try:
+            return {"predictions": fallback.predict(
+                record["symptoms"], top_k=record.get("top_k", top_k), age=record.get("age"),
+                sex=record.get("sex"), medical_history=record.get("medical_history"),
+            ), "mode": None}
+        except Exception as exc:
+            return {"error": f"Prediction failed: {exc}"}
+
+    @staticmethod
+    def _rank(probas, top_k, classes):
+        """Turn one row of class probabilities into the top-k ranked diagnoses."""
         top_indices = np.argsort(probas)[::-1][:top_k]
 
         results = []
         for idx in top_indices:
             confidence = float(probas[idx])
             if confidence > 0.001:
-                results.append({"disease": self.classes[idx], "confidence": round(confidence, 4)})
+                results.append({"disease": classes[idx], "confidence": round(confidence, 4)})
         return results
 
     def get_all_diseases(self):
@@ -273,14 +1146,41 @@ class SymptomClassifier:
     def get_bias_report(self):
         return self.metrics.get("bias_report", {})
 
+    def get_cache_stats(self):
+        return self.cache.stats()
+
 
 if __name__ == "__main__":
-    # Force retrain
-    if os.path.exists(MODEL_PATH): os.remove(MODEL_PATH)
-    if os.path.exists(VECTORIZER_PATH): os.remove(VECTORIZER_PATH)
-    if os.path.exists(METRICS_PATH): os.remove(METRICS_PATH)
-    metrics = train_model()
-    print(f"\nMetrics: {metrics}")
+    import argparse
+    parser = argparse.ArgumentParser(description="Train and publish a new model version.")
+    parser.add_argument("--if-stale", action="store_true",
+                        help="skip training when the active version's training fingerprint is current")
+    parser.add_argument("--profile", choices=tuple(ENSEMBLE_PROFILES), default=ENSEMBLE_PROFILE,
+                        help="ensemble to train (servers check a version under the profile it was trained with)")
+    parser.add_argument("--evaluation", choices=("holdout", "cv"), default=EVALUATION_MODE,
+                        help="cv adds repeated stratified k-fold with bootstrap CIs (CV_FOLDS, CV_REPEATS)")
+    args = parser.parse_args()
+
+    freshness, version = None, active_version()
+    if args.if_stale and version is not None:
+        metrics_path = artifact_paths(version)["metrics"]
+        freshness = check_fingerprint(joblib.load(metrics_path).get("fingerprint")
+                                      if os.path.exists(metrics_path) else None, profile=args.profile)
+    if freshness is not None and freshness["status"] == "current":
+        print(f"Active version {version} is current (fingerprint checked in "
+              f"{freshness['check_seconds']:.2f}s); not retraining.")
+    else:
+        if freshness is not None and freshness["status"] == "unknown":
+            print(f"Could not check active version {version} ({freshness['error']}); retraining.")
+        elif freshness is not None:
+            print(f"Active version {version} is stale: {', '.join(freshness['changed'])} changed; "
+                  f"retraining (feature cache: {freshness['rebuild']}).")
+        # Retrain: publishes a new artifact version (servers with the watcher pick it up)
+        metrics = train_model(evaluation=args.evaluation, profile=args.profile)
+        profile = metrics.pop("training_profile")
+        print(f"\nMetrics: {metrics}")
+        print("\nTraining profile:")
+        print(format_profile(profile))
 
     classifier = SymptomClassifier()
     test_cases = [
@@ -0,0 +1,91 @@
+"""
+Per-stage timing and peak-memory instrumentation for train_model.
+
+Stages run in the training process are wrapped in StageProfiler.stage();
+fits that run inside pool workers are measured there with measure() and
+added afterwards. Peak memory is the process's peak resident set size during
+the stage: on Linux the kernel high-water mark (VmHWM) is reset at the start
+of every stage through /proc/self/clear_refs, so native allocations made by
+sklearn's Cython code count too and nothing is traced on the hot path.
+Elsewhere the lifetime ru_maxrss is reported, which only ever grows.
+"""
+
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_bytes():
+    """Peak RSS since the last reset (Linux) or since process start (elsewhere)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024   # bytes on macOS, KiB on Linux
+
+
+def measure(fn, *args):
+    """Run fn(*args) and return (result, seconds, peak_rss_bytes). Used inside pool workers."""
+    _reset_peak_rss()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start, peak_rss_bytes()
+
+
+class StageProfiler:
+    """Collects an ordered list of {stage, seconds, peak_rss_mb, where} records."""
+
+    def __init__(self):
+        self.stages = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, peak_rss_bytes())
+
+    def add(self, name, seconds, peak_bytes=None, where="main"):
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 4),
+            "peak_rss_mb": None if peak_bytes is None else round(peak_bytes / 2**20, 1),
+            "where": where,
+        })
+
+    def finish(self):
+        """Return the JSON-friendly profile stored in training_metrics."""
+        return {
+            "stages": self.stages,
+            "total_seconds": round(time.perf_counter() - self._started, 3),
+        }
+
+
+def format_profile(profile):
+    """Render a stored training profile as a fixed-width table. Worker rows overlap
+    the pool wall-clock rows above them, so percentages do not sum to 100."""
+    total = profile["total_seconds"] or 1.0
+    lines = [f"  {'Stage':<36}{'Seconds':>10}{'% total':>9}{'Peak RSS MB':>13}  Where",
+             f"  {'-' * 36}{'-' * 9:>10}{'-' * 8:>9}{'-' * 12:>13}  ------"]
+    for s in profile["stages"]:
+        peak = "-" if s["peak_rss_mb"] is None else f"{s['peak_rss_mb']:.1f}"
+        name = s["stage"] if s["where"] == "main" else f"  {s['stage']}"   # pool tasks nest under the pool wall
+        lines.append(f"  {name:<36}{s['seconds']:>10.2f}{100 * s['seconds'] / total:>8.1f}%{peak:>13}  {s['where']}")
+    lines.append(f"  {'total (wall)':<36}{profile['total_seconds']:>10.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,104 @@
+"""
+Pre-rendered, pre-compressed responses.
+
+A RenderedResponse holds one body plus its gzip and brotli encodings, each
+with a strong ETag: a content hash with a "-gz"/"-br" suffix for the
+compressed representations.
+Requests carrying a matching If-None-Match get 304 Not Modified without a
+body; everything else is a copy of precomputed bytes in the best encoding the
+client accepts.
+
+ResponseCache uses them for API endpoints whose content only changes with
+the model: each body is rendered once per model generation. Their
+Cache-Control: no-cache makes polling clients revalidate every time, which
+then costs one hash comparison. static_assets.py uses them for the frontend.
+"""
+
+import gzip
+import hashlib
+import threading
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:     # in requirements.txt; a server without it offers only gzip
+    brotli = None
+
+COMPRESS_MIN_BYTES = 256    # smaller bodies are not worth a Content-Encoding header
+ENCODINGS = ("br", "gzip", "identity")      # server preference when the client's q-values tie
+
+
+class RenderedResponse:
+    """One body with its compressed variants, serialized and compressed ahead of time."""
+
+    def __init__(self, body, content_type="application/json", cache_control="no-cache"):
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = digest
+        self.variants = {"identity": (body, digest)}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = (data, f"{digest}-{'gz' if encoding == 'gzip' else encoding}")
+        self.etags = [etag for _, etag in self.variants.values()]
+
+    def merged(self, extra):
+        """The identity body, a JSON object, with the members of the serialized JSON
+        object ``extra`` appended: a pre-rendered payload plus a small part rendered
+        per request, without serializing the whole payload again."""
+        head = self.body.rstrip()
+        if extra.strip() in (b"{}", b""):
+            return head
+        return head[:-1] + b"," + extra.strip()[1:]
+
+    def size(self, encoding="identity"):
+        return len(self.variants.get(encoding, self.variants["identity"])[0])
+
+    def serve(self, request):
+        offered = [e for e in ENCODINGS if e in self.variants]
+        encoding = request.accept_encodings.best_match(offered[:-1]) or "identity"
+        data, etag = self.variants[encoding]
+        if any(request.if_none_match.contains_weak(tag) for tag in self.etags):
+            response = Response(status=304)
+        else:
+            response = Response(data, content_type=self.content_type)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = self.cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class ResponseCache:
+    """Renders every registered endpoint once per generation key (e.g. the loaded
+    model) and re-renders all of them as soon as the key changes."""
+
+    def __init__(self, render, generation):
+        self.render = render                # payload -> JSON bytes
+        self.generation = generation        # () -> key; compared with ==
+        self.builders = {}
+        self.renders = 0
+        self._state = (None, {})            # (generation key, name -> RenderedResponse), swapped as one
+        self._lock = threading.Lock()
+
+    def register(self, name, build):
+        self.builders[name] = build
+
+    def get(self, name):
+        key = self.generation()
+        state = self._state
+        if state[0] != key:
+            with self._lock:
+                state = self._state
+                if state[0] != key:
+                    state = (key, {n: RenderedResponse(self.render(build())) for n, build in self.builders.items()})
+                    self._state = state
+                    self.renders += 1
+        return state[1][name]
@@ -0,0 +1,272 @@
+"""
+Hyperparameter search over build_ensemble and the TF-IDF vectorizer.
+
+Successive halving with validation splits as the resource: every candidate
+(the built-in defaults as the baseline, the persisted settings and random
+draws from SEARCH_SPACE) is fitted and calibrated the way train_model fits its
+evaluation model on one stratified 80/20 split; the best 1/eta are refitted on eta times as many
+splits, and so on until at most eta remain. All (candidate, split) fits of a
+rung run in one process pool. The baseline always advances, so the final rung
+can be compared against it.
+
+Each fit is scored on NDCG@5 and M1 accuracy, on the single-row latency of
+the model as served (the compiled export when it supports the ensemble) and
+on the size of the pickled calibrated model. Survivors are chosen by Pareto
+rank over (NDCG, latency, size), then NDCG, so cheap configurations with
+slightly lower scores are not dropped by accuracy alone. The search space is
+that of the "full" ensemble profile (model.ENSEMBLE_PROFILES). The selected
+config is the fastest one on the final rung's Pareto front whose NDCG is within
+--tolerance of the baseline's. The baseline is always the built-in defaults,
+not the last applied config, so repeated searches cannot drift NDCG down by
+one tolerance per cycle. --apply persists it to ENSEMBLE_CONFIG, which
+build_ensemble/build_vectorizer (and so train_model and the training
+fingerprint) read.
+
+    python search.py [--candidates 27] [--eta 3] [--jobs 4] [--apply]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedShuffleSplit
+
+from compiled import UnsupportedModel, compile_model
+from corpus import load as load_corpus
+from dataset import open_source
+from distill import single_row_latency_ms
+from feature_cache import FEATURE_CACHE, FeatureCache
+from model import (ENSEMBLE_CONFIG_PATH, build_ensemble, build_vectorizer, load_ensemble_config,
+                   preprocess_text, preprocessing_fingerprint)
+from ranking import ranking_metrics
+from training import TRAIN_N_JOBS, calibrate
+
+SEARCH_SPACE = {
+    "ensemble": {
+        "rf__n_estimators": [50, 100, 200, 300],
+        "svm__C": [1, 3, 10, 30],
+        "gb__n_estimators": [50, 100, 200],
+        "gb__max_depth": [3, 5],
+        "weights": [[2, 3, 2], [1, 1, 1], [1, 2, 1], [2, 3, 1], [1, 3, 1]],
+    },
+    "vectorizer": {
+        "max_features": [1000, 2500, 5000],
+        "ngram_range": [[1, 1], [1, 2]],
+    },
+}
+PROFILE = "full"
+NDCG_TOLERANCE = 0.005
+LATENCY_ROWS = 30
+OBJECTIVES = (("ndcg", 1), ("latency_ms", -1), ("size_mb", -1))     # 1 = maximise
+
+
+def sample_candidates(n, seed=42):
+    """The built-in defaults (the baseline), the persisted settings when they differ,
+    then distinct random draws from SEARCH_SPACE up to n candidates."""
+    rng = random.Random(seed)
+    candidates, seen = [], set()
+    for candidate in ({"vectorizer": {}, "ensemble": {}}, load_ensemble_config(PROFILE)):
+        key = json.dumps(candidate, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(candidate)
+    space = [(part, name, values) for part, params in SEARCH_SPACE.items() for name, values in params.items()]
+    in_space = sum(all(c[part].get(name) in values for part, name, values in space)
+                   and len(c["vectorizer"]) + len(c["ensemble"]) == len(space) for c in candidates)
+    limit = np.prod([len(values) for _, _, values in space]) + len(candidates) - in_space
+    while len(candidates) < min(n, limit):
+        candidate = {"vectorizer": {}, "ensemble": {}}
+        for part, name, values in space:
+            candidate[part][name] = rng.choice(values)
+        key = json.dumps(candidate, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(candidate)
+    return candidates
+
+
+def _evaluate(ensemble_params, X, y, train, test):
+    """Runs in a pool worker: fit + calibrate one candidate on one split and score it."""
+    started = time.perf_counter()
+    ensemble = build_ensemble(ensemble_params, PROFILE).set_params(rf__n_jobs=1)
+    ensemble.fit(X[train], y[train])
+    model = calibrate(ensemble, X[train], y[train])
+    fit_seconds = time.perf_counter() - started
+
+    proba = model.predict_proba(X[test])
+    ranking = ranking_metrics(y[test], proba, model.classes_, k=5)
+    try:
+        served = compile_model(model)
+    except UnsupportedModel:
+        served = model
+    return {
+        "ndcg": ranking["ndcg"],
+        "m1_accuracy": accuracy_score(y[test], model.classes_[proba.argmax(axis=1)]),
+        "latency_ms": single_row_latency_ms(served, X[test][:LATENCY_ROWS]),
+        "size_mb": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20,
+        "fit_seconds": fit_seconds,
+    }
+
+
+def _summarize(evaluations):
+    return {
+        "ndcg": float(np.mean([e["ndcg"] for e in evaluations])),
+        "m1_accuracy": float(np.mean([e["m1_accuracy"] for e in evaluations])),
+        "latency_ms": float(np.median([e["latency_ms"] for e in evaluations])),
+        "size_mb": float(np.median([e["size_mb"] for e in evaluations])),
+        "fit_seconds": float(np.mean([e["fit_seconds"] for e in evaluations])),
+        "splits": len(evaluations),
+    }
+
+
+def dominates(a, b):
+    better_or_equal = all(sign * a[name] >= sign * b[name] for name, sign in OBJECTIVES)
+    return better_or_equal and any(sign * a[name] > sign * b[name] for name, sign in OBJECTIVES)
+
+
+def pareto_ranks(scores):
+    """Non-dominated sorting: 0 for the Pareto front, 1 for the front without it, ..."""
+    ranks, remaining, rank = {}, set(range(len(scores))), 0
+    while remaining:
+        front = {i for i in remaining if not any(dominates(scores[j], scores[i]) for j in remaining if j != i)}
+        for i in front:
+            ranks[i] = rank
+        remaining -= front
+        rank += 1
+    return [ranks[i] for i in range(len(scores))]
+
+
+def successive_halving(candidates, n_jobs=None, eta=3, min_splits=1, seed=42, log=print):
+    """Run the search; returns (scores, rungs) with one summary per candidate
+    (at the largest budget it reached) and the candidate indices of each rung."""
+    n_jobs = n_jobs or TRAIN_N_JOBS
+    source = open_source()
+    cache = FeatureCache() if FEATURE_CACHE else None
+    matrices = {}
+    for candidate in candidates:
+        key = json.dumps(candidate["vectorizer"], sort_keys=True)
+        if key not in matrices:
+            X, y, _, _ = load_corpus(source, build_vectorizer(candidate["vectorizer"], PROFILE), preprocess_text,
+                                     preprocessing_fingerprint(), cache=cache)
+            matrices[key] = X, y
+    y = next(iter(matrices.values()))[1]
+
+    n_rungs, remaining = 1, len(candidates)       # halve until at most eta remain
+    while remaining > eta:
+        remaining //= eta
+        n_rungs += 1
+    max_splits = min_splits * eta ** (n_rungs - 1)
+    splits = list(StratifiedShuffleSplit(n_splits=max_splits, test_size=0.2, random_state=seed)
+                  .split(np.zeros(len(y)), y))
+
+    evaluations = {i: [] for i in range(len(candidates))}
+    alive, rungs, scores = list(range(len(candidates))), [], {}
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for rung in range(n_rungs):
+            budget = min_splits * eta ** rung
+            tasks = [(i, s) for i in alive for s in range(len(evaluations[i]), budget)]
+            started = time.perf_counter()
+            results = parallel(
+                delayed(_evaluate)(candidates[i]["ensemble"],
+                                   *matrices[json.dumps(candidates[i]["vectorizer"], sort_keys=True)], *splits[s])
+                for i, s in tasks
+            )
+            for (i, _), result in zip(tasks, results):
+                evaluations[i].append(result)
+            for i in alive:
+                scores[i] = _summarize(evaluations[i])
+            rungs.append(list(alive))
+            log(f"rung {rung}: {len(alive)} candidates x {budget} split(s), {len(tasks)} fits "
+                f"in {time.perf_counter() - started:.1f}s")
+            if rung == n_rungs - 1:
+                break
+            ranks = pareto_ranks([scores[i] for i in alive])
+            order = sorted(range(len(alive)), key=lambda k: (ranks[k], -scores[alive[k]]["ndcg"]))
+            keep = [alive[k] for k in order[:max(1, len(alive) // eta)]]
+            alive = ([0] if 0 not in keep else []) + keep        # the baseline always advances
+    return [scores[i] for i in range(len(candidates))], rungs
+
+
+def final_front(scores, final):
+    """Pareto front of the final rung. Earlier rungs are scored on fewer splits,
+    so their noisier estimates are not compared against it."""
+    ranks = pareto_ranks([scores[i] for i in final])
+    return [i for i, rank in zip(final, ranks) if rank == 0]
+
+
+def select(scores, final, tolerance=NDCG_TOLERANCE):
+    """Index of the fastest final-rung Pareto candidate within tolerance of the baseline's NDCG."""
+    front = final_front(scores, final)
+    eligible = [i for i in front if scores[i]["ndcg"] >= scores[0]["ndcg"] - tolerance] or [0]
+    return min(eligible, key=lambda i: (scores[i]["latency_ms"], scores[i]["size_mb"]))
+
+
+def save_config(candidate, report, path=ENSEMBLE_CONFIG_PATH):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"profile": PROFILE, **candidate, "search": report}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def describe(candidate):
+    params = {**candidate["vectorizer"], **candidate["ensemble"]}
+    return ", ".join(f"{name}={json.dumps(value)}" for name, value in sorted(params.items())) or "built-in defaults"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min-splits", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=TRAIN_N_JOBS)
+    parser.add_argument("--tolerance", type=float, default=NDCG_TOLERANCE,
+                        help="NDCG@5 the selected config may lose against the baseline")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--apply", action="store_true", help=f"persist the selected config to {ENSEMBLE_CONFIG_PATH}")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    candidates = sample_candidates(args.candidates, args.seed)
+    scores, rungs = successive_halving(candidates, args.jobs, args.eta, args.min_splits, args.seed)
+    seconds = time.perf_counter() - started
+
+    final = rungs[-1]
+    front = sorted(final_front(scores, final), key=lambda i: -scores[i]["ndcg"])
+    chosen = select(scores, final, args.tolerance)
+    splits = scores[final[0]]["splits"]
+    print(f"\nPareto front of the final rung ({len(final)} of {len(candidates)} candidates, {splits} split(s) each; "
+          f"{seconds:.0f}s, {args.jobs} job(s)); > = selected, 0 = baseline")
+    print(f"{'':>3}{'#':>3}{'NDCG@5':>8}{'M1':>7}{'ms/row':>8}{'MB':>7}{'fit s':>7}{'splits':>7}  settings")
+    for i in sorted(set(front) | {0, chosen}, key=lambda i: -scores[i]["ndcg"]):
+        s = scores[i]
+        mark = ">" if i == chosen else ""
+        print(f"{mark:>3}{i:>3}{s['ndcg']:>8.4f}{s['m1_accuracy']:>7.3f}{s['latency_ms']:>8.3f}{s['size_mb']:>7.2f}"
+              f"{s['fit_seconds']:>7.1f}{s['splits']:>7}  {describe(candidates[i])}")
+
+    base, best = scores[0], scores[chosen]
+    print(f"\nselected #{chosen}: NDCG {best['ndcg'] - base['ndcg']:+.4f}, "
+          f"{base['latency_ms'] / best['latency_ms']:.1f}x faster, {base['size_mb'] / best['size_mb']:.1f}x smaller "
+          f"than the baseline")
+    if args.apply:
+        report = {
+            "searched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "candidates": len(candidates), "eta": args.eta, "tolerance": args.tolerance, "seconds": round(seconds, 1),
+            "selected": {**scores[chosen], "candidate": chosen},
+            "baseline": scores[0],
+            "front": [{**scores[i], **candidates[i], "candidate": i} for i in front],     # final rung only
+        }
+        save_config({"vectorizer": candidates[chosen]["vectorizer"], "ensemble": candidates[chosen]["ensemble"]},
+                    report)
+        print(f"Saved to {ENSEMBLE_CONFIG_PATH}; the next train_model uses it (running servers see a stale "
+              f"fingerprint and retrain per MODEL_STALE_POLICY).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Lightweight TF-IDF cosine-similarity engine used while the ensemble trains.
+
+Mirrors the client-side engine in ml-engine.js: every training vignette is a
+TF-IDF vector, a query is scored against all of them, each disease takes the
+mean of its top-3 similarities, and the top-k scores are turned into
+confidences with a temperature-scaled softmax. Building it takes well under a
+second, so a fresh server can answer requests immediately.
+"""
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class SimilarityEngine:
+    """Nearest-vignette classifier with the same predict() contract as SymptomClassifier."""
+
+    TOP_SIMILAR = 3      # similarities averaged per disease
+    TEMPERATURE = 5.0    # softmax sharpness, as in ml-engine.js
+
+    def __init__(self, texts, labels, preprocess):
+        self.preprocess = preprocess
+        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform([preprocess(t) for t in texts])
+        labels = np.asarray(labels)
+        self.classes = np.unique(labels)
+        self._rows_by_class = [np.flatnonzero(labels == c) for c in self.classes]
+
+    def predict(self, symptom_text: str, top_k: int = 5, age=None, sex=None, medical_history=None):
+        processed = self.preprocess(symptom_text, age=age, sex=sex, medical_history=medical_history)
+        query = self.vectorizer.transform([processed])
+        similarities = (self.matrix @ query.T).toarray().ravel()   # rows are L2-normalized
+
+        scores = np.empty(len(self.classes))
+        for i, rows in enumerate(self._rows_by_class):
+            sims = np.sort(similarities[rows])[::-1][:self.TOP_SIMILAR]
+            scores[i] = sims.mean()
+
+        top = np.argsort(scores)[::-1][:top_k]
+        weights = np.exp((scores[top] - scores[top[0]]) * self.TEMPERATURE)
+        confidences = weights / weights.sum()
+        return [
+            {"disease": self.classes[idx], "confidence": round(float(conf), 4)}
+            for idx, conf in zip(top, confidences)
+        ]
@@ -0,0 +1,88 @@
+"""
+Static frontend assets, prepared once at boot.
+
+Only the files in ASSET_FILES are served; anything else in the working
+directory (models, source, requests) is a 404. Each asset gets a
+content-hashed name (script.<hash>.js) served with an immutable, year-long
+Cache-Control, and references between assets (index.html -> style.css,
+script.js, ml-engine.js; ml-engine.js -> data.json) are rewritten to those
+names in the served bytes, so a deploy changes the URLs of exactly the files
+that changed. The plain names stay available with Cache-Control: no-cache, so
+index.html (the entry point) and old links revalidate through their ETags.
+Bodies are pre-compressed (gzip and brotli) and negotiated
+on Accept-Encoding by responses.RenderedResponse. The files on disk are left
+untouched: the same directory still works as a plain static site.
+"""
+
+import copy
+import hashlib
+import mimetypes
+import os
+import re
+import time
+
+from responses import RenderedResponse, brotli
+
+STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
+# Served files, in dependency order: references to earlier files are rewritten
+# to their hashed names before a file is hashed itself
+ASSET_FILES = ("data.json", "style.css", "ml-engine.js", "script.js", "index.html")
+ENTRY_POINT = "index.html"
+HASH_LENGTH = 10
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+TEXT_TYPES = ("text/", "application/javascript", "application/json")
+
+
+def hashed_name(name, content):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def content_type_of(name):
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type == "text/javascript":
+        content_type = "application/javascript"
+    return f"{content_type}; charset=utf-8" if content_type.startswith(TEXT_TYPES) else content_type
+
+
+class AssetPipeline:
+    """Allow-listed, hashed, pre-compressed frontend files keyed by URL path."""
+
+    def __init__(self, directory=STATIC_DIR, files=ASSET_FILES):
+        started = time.perf_counter()
+        self.hashed = {}        # plain name -> hashed name
+        self.routes = {}        # URL path -> RenderedResponse
+        for name in files:
+            with open(os.path.join(directory, name), "rb") as f:
+                content = self._rewrite(f.read())
+            rendered = RenderedResponse(content, content_type_of(name), REVALIDATE)
+            self.routes[name] = rendered
+            if name != ENTRY_POINT:
+                self.hashed[name] = hashed_name(name, content)
+                immutable = copy.copy(rendered)     # same compressed bytes, different caching
+                immutable.cache_control = IMMUTABLE
+                self.routes[self.hashed[name]] = immutable
+        self.build_seconds = time.perf_counter() - started
+
+    def _rewrite(self, content):
+        """Point quoted references to already-built assets at their hashed names."""
+        for name, hashed in self.hashed.items():
+            pattern = rb"""(?<=["'])(\./)?""" + re.escape(name.encode()) + rb"""(?=["'])"""
+            content = re.sub(pattern, hashed.encode(), content)
+        return content
+
+    def serve(self, path, request):
+        """The response for an allow-listed path, or None."""
+        rendered = self.routes.get(path)
+        return rendered.serve(request) if rendered is not None else None
+
+    def summary(self):
+        files = [self.routes[name] for name in self.hashed] + [self.routes[ENTRY_POINT]]
+        return {
+            "files": len(files),
+            "identity_bytes": sum(r.size() for r in files),
+            "gzip_bytes": sum(r.size("gzip") for r in files),
+            "br_bytes": sum(r.size("br") for r in files) if brotli is not None else None,
+            "build_ms": round(self.build_seconds * 1000, 1),
+        }
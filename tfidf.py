@@ -0,0 +1,176 @@
+"""
+Direct-indexed TF-IDF transform for serving.
+
+TfidfVectorizer.transform rebuilds its analyzer on every call, joins every
+bigram into a new string just to look it up, and goes through the generic
+count -> csr -> tfidf -> normalize pipeline. DirectTfidf is built once from a
+fitted vectorizer's vocabulary_ and idf_: each token maps to an integer id,
+unigrams to a column through a list and bigrams through a dict keyed on the
+pair of ids. Sublinear tf (from a precomputed np.log table), idf weighting and
+L2 normalization perform the same floating-point operations in the same order
+as sklearn, so the output is bit-identical: row by row with Python floats for
+request-sized inputs, vectorized over the batch for large ones.
+"""
+
+import math
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+TF_TABLE_SIZE = 256         # precomputed tf weights for counts below this; larger counts are computed
+VECTORIZED_MIN_ROWS = 8    # batches this large are weighted with numpy, smaller ones row by row
+
+
+class DirectTfidf:
+    """Drop-in for a fitted word-level TfidfVectorizer's transform()."""
+
+    def __init__(self, vectorizer):
+        p = vectorizer.get_params()
+        if p["analyzer"] != "word" or p["tokenizer"] or p["preprocessor"] or p["strip_accents"]:
+            raise ValueError("only the default word analyzer is supported")
+        if p["ngram_range"] not in ((1, 1), (1, 2)) or p["norm"] not in ("l2", None) or p["binary"]:
+            raise ValueError(f"unsupported settings: ngram_range={p['ngram_range']}, norm={p['norm']}, "
+                             f"binary={p['binary']}")
+        if p["dtype"] not in (np.float64, "float64"):
+            raise ValueError("only float64 output is supported")
+
+        self.lowercase = p["lowercase"]
+        self.find_tokens = re.compile(p["token_pattern"]).findall
+        self.stop_words = vectorizer.get_stop_words() or frozenset()
+        self.bigrams = p["ngram_range"] == (1, 2)
+        self.sublinear_tf = p["sublinear_tf"]
+        self.l2 = p["norm"] == "l2"
+        self.n_features = len(vectorizer.vocabulary_)
+        self.idf = (np.asarray(vectorizer.idf_, dtype=np.float64) if p["use_idf"]
+                    else np.ones(self.n_features))
+        self.idf_list = self.idf.tolist()
+        # tf weight per raw count, from the same np.log sklearn applies to the count matrix
+        self.tf_array = np.arange(TF_TABLE_SIZE, dtype=np.float64)
+        if self.sublinear_tf:
+            with np.errstate(divide="ignore"):
+                self.tf_array = np.log(self.tf_array) + 1.0
+        self.tf_table = self.tf_array.tolist()
+
+        # token -> id, id -> unigram column (-1 if the unigram itself is not a feature),
+        # (id_a * n_tokens + id_b) -> bigram column
+        self.token_id = {}
+        for term in vectorizer.vocabulary_:
+            for token in term.split(" "):
+                self.token_id.setdefault(token, len(self.token_id))
+        self.n_tokens = len(self.token_id)
+        self.unigram_col = [-1] * self.n_tokens
+        self.bigram_col = {}
+        for term, col in vectorizer.vocabulary_.items():
+            parts = term.split(" ")
+            if len(parts) == 1:
+                self.unigram_col[self.token_id[term]] = col
+            else:
+                a, b = parts
+                self.bigram_col[self.token_id[a] * self.n_tokens + self.token_id[b]] = col
+
+    def _columns(self, text):
+        """Feature column of every unigram and bigram occurrence in one document."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.find_tokens(text)
+        if self.stop_words:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        get = self.token_id.get
+        ids = [get(t, -1) for t in tokens]
+        unigram_col = self.unigram_col
+        cols = [unigram_col[i] for i in ids if i >= 0]
+        if self.bigrams:
+            bigram_get, n_tokens = self.bigram_col.get, self.n_tokens
+            cols += [bigram_get(a * n_tokens + b, -1) for a, b in zip(ids, ids[1:]) if a >= 0 and b >= 0]
+        return [c for c in cols if c >= 0]
+
+    def _tf(self, count):
+        if count < TF_TABLE_SIZE:
+            return self.tf_table[count]
+        tf = np.array([count], dtype=np.float64)
+        if self.sublinear_tf:
+            np.log(tf, out=tf)
+            tf += 1.0
+        return float(tf[0])
+
+    def transform(self, texts):
+        """CSR matrix of TF-IDF rows, identical to vectorizer.transform(texts)."""
+        if len(texts) >= VECTORIZED_MIN_ROWS:
+            return self._transform_batch(texts)
+        return self._transform_rows(texts)
+
+    def _transform_rows(self, texts):
+        """Small inputs: each row is weighted and normalized in one pass with Python
+        floats. Every step is a single IEEE operation matching sklearn's: tf from
+        the np.log table, idf multiply, squared norm summed left to right as
+        sklearn's Cython kernel does, sqrt and divide."""
+        idf, tf, l2 = self.idf_list, self._tf, self.l2
+        data, indices, indptr = [], [], [0]
+        for text in texts:
+            row = {}
+            for c in self._columns(text):
+                row[c] = row.get(c, 0) + 1
+            cols = sorted(row)
+            weights = [tf(row[c]) * idf[c] for c in cols]
+            if l2:
+                total = 0.0
+                for w in weights:
+                    total += w * w
+                if total != 0.0:
+                    norm = math.sqrt(total)
+                    weights = [w / norm for w in weights]
+            data.extend(weights)
+            indices.extend(cols)
+            indptr.append(len(indices))
+        return self._csr(np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32),
+                         np.array(indptr, dtype=np.int32))
+
+    def _transform_batch(self, texts):
+        """Large inputs: count, weight and normalize the whole batch with numpy."""
+        hits, lengths = [], []
+        for text in texts:
+            cols = self._columns(text)
+            hits += cols
+            lengths.append(len(cols))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        keys, counts = np.unique(rows * self.n_features + np.array(hits, dtype=np.int64), return_counts=True)
+        rows, indices = np.divmod(keys, self.n_features)
+        indptr = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=len(texts)), out=indptr[1:])
+
+        if counts.size and counts.max() >= TF_TABLE_SIZE:
+            data = counts.astype(np.float64)
+            if self.sublinear_tf:
+                np.log(data, out=data)
+                data += 1.0
+        else:
+            data = self.tf_array[counts]
+        data *= self.idf[indices]
+
+        if self.l2 and data.size:
+            # Left-to-right row sums, as sklearn's Cython kernel (numpy's pairwise sum
+            # would round differently): rows laid out zero-padded and added column by
+            # column, which keeps that order since adding 0.0 is exact
+            lengths = np.diff(indptr)
+            padded = np.zeros((len(texts), lengths.max()))
+            padded[rows, np.arange(data.size) - indptr[rows]] = data * data
+            total = np.zeros(len(texts))
+            for column in padded.T:
+                total += column
+            total[total == 0.0] = 1.0
+            data /= np.sqrt(total)[rows]
+        return self._csr(data, indices.astype(np.int32), indptr)
+
+    def _csr(self, data, indices, indptr):
+        X = sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, self.n_features))
+        X.has_sorted_indices = True
+        return X
+
+
+def identical(a, b):
+    """True if two CSR matrices have the same structure and bit-for-bit equal values."""
+    return (a.shape == b.shape
+            and np.array_equal(a.indptr, b.indptr)
+            and np.array_equal(a.indices, b.indices)
+            and np.array_equal(a.data.view(np.int64), b.data.view(np.int64)))
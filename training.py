@@ -0,0 +1,104 @@
+"""
+Parallel training orchestrator for train_model.
+
+The evaluation ensemble (80% split) and the production ensemble (full data)
+are independent, and so are the RF / SVC / GB estimators inside each one.
+fit_ensembles fits all of those base estimators in one joblib process pool
+and then assembles each fitted VotingClassifier exactly as
+VotingClassifier.fit would (label-encoded targets, same clones, same seeds),
+so artifacts are identical to a serial fit. calibrate_all does the same for
+the sigmoid calibration step.
+"""
+
+import os
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import Bunch
+
+from profiling import measure
+try:
+    from sklearn.frozen import FrozenEstimator
+    HAS_FROZEN = True
+except ImportError:
+    HAS_FROZEN = False
+
+# Core budget for training; 1 keeps everything in-process and serial
+TRAIN_N_JOBS = int(os.environ.get("TRAIN_N_JOBS", os.cpu_count() or 1))
+
+
+def calibrate(base_model, X, y):
+    """Sigmoid (Platt) calibration of an already fitted model."""
+    if HAS_FROZEN:
+        # scikit-learn >= 1.8: cv='prefit' removed, use FrozenEstimator
+        calibrated = CalibratedClassifierCV(FrozenEstimator(base_model), method="sigmoid")
+    else:
+        # scikit-learn < 1.8: use cv='prefit'
+        calibrated = CalibratedClassifierCV(base_model, cv="prefit", method="sigmoid")
+    return calibrated.fit(X, y)
+
+
+def _fit_estimator(estimator, X, y):
+    return estimator.fit(X, y)
+
+
+def _with_threads(estimator, n_threads):
+    """Clone a base estimator, capping its own n_jobs so pool workers don't oversubscribe."""
+    estimator = clone(estimator)
+    if "n_jobs" in estimator.get_params():
+        estimator.set_params(n_jobs=n_threads)
+    return estimator
+
+
+def _assemble_voting(template, fitted, y):
+    """Build a fitted VotingClassifier from separately fitted base estimators."""
+    for (_, original), est in zip(template.estimators, fitted):
+        if "n_jobs" in est.get_params():
+            est.set_params(n_jobs=original.get_params()["n_jobs"])   # serve with the configured setting
+    ensemble = clone(template)
+    ensemble.le_ = LabelEncoder().fit(y)
+    ensemble.classes_ = ensemble.le_.classes_
+    ensemble.estimators_ = fitted
+    ensemble.named_estimators_ = Bunch(**{name: est for (name, _), est in zip(template.estimators, fitted)})
+    return ensemble
+
+
+def fit_ensembles(template, datasets, n_jobs=None):
+    """Fit ``template`` (an unfitted VotingClassifier) once per (X, y) in ``datasets``.
+
+    Every base estimator of every ensemble is an independent task in one process
+    pool of at most ``n_jobs`` workers. Returns (ensembles, timings), where
+    timings lists one {"ensemble", "estimator", "seconds", "peak_bytes"} dict per
+    task, measured inside the worker that ran it. The SVC entry includes
+    libsvm's internal 5-fold probability CV, which runs inside SVC.fit."""
+    n_jobs = n_jobs or TRAIN_N_JOBS
+    tasks = [(d, name, est) for d in range(len(datasets)) for name, est in template.estimators]
+    workers = max(1, min(n_jobs, len(tasks)))
+    inner_threads = max(1, n_jobs // workers)
+
+    encoded = [LabelEncoder().fit(y).transform(y) for _, y in datasets]
+    results = Parallel(n_jobs=workers)(
+        delayed(measure)(_fit_estimator, _with_threads(est, inner_threads), datasets[d][0], encoded[d])
+        for d, _, est in tasks
+    )
+
+    ensembles, timings = [], []
+    for d, (_, y) in enumerate(datasets):
+        fitted = [est for (td, _, _), (est, _, _) in zip(tasks, results) if td == d]
+        ensembles.append(_assemble_voting(template, fitted, y))
+    for (d, name, _), (_, seconds, peak) in zip(tasks, results):
+        timings.append({"ensemble": d, "estimator": name, "seconds": seconds, "peak_bytes": peak})
+    return ensembles, timings
+
+
+def calibrate_all(jobs, n_jobs=None):
+    """Calibrate several (base_model, X, y) jobs concurrently.
+    Returns (models, timings) with one {"seconds", "peak_bytes"} dict per job."""
+    n_jobs = n_jobs or TRAIN_N_JOBS
+    results = Parallel(n_jobs=max(1, min(n_jobs, len(jobs))))(
+        delayed(measure)(calibrate, model, X, y) for model, X, y in jobs
+    )
+    return ([model for model, _, _ in results],
+            [{"seconds": seconds, "peak_bytes": peak} for _, seconds, peak in results])